@@ -0,0 +1 @@
+"""Benchmarks for ChemEx, to be run with airspeed velocity (asv)."""
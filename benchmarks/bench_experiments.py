@@ -0,0 +1,85 @@
+"""Benchmarks of the calculation of the profiles of the different experiments,
+using the data from the examples.
+
+The propagator cache is cleared before each calculation, as the profiles are
+calculated repeatedly with the same parameters.
+
+"""
+import numpy as np
+
+from chemex.spindynamics import basis
+
+from . import common
+
+# Number of parameter sets of the batched calculations
+BATCH = 64
+
+
+def get_params_local(profile, params):
+    return tuple(
+        (name_s, params[name_l].value) for name_s, name_l in profile.map_names.items()
+    )
+
+
+class Profiles:
+    """Time the calculation of a single (uncached) profile of each experiment,
+    and of a batch of profiles."""
+
+    params = sorted(common.EXPERIMENTS)
+    param_names = ["experiment"]
+
+    def setup(self, experiment):
+        data, params = common.load_experiment(experiment)
+        self.profile = data[0]
+        self.params_local = get_params_local(self.profile, params)
+        self.values = np.tile(self.profile.get_params_values(params), (BATCH, 1))
+
+    def time_calculate_unscaled_profile(self, experiment):
+        basis.Liouvillian.propagator_cache.clear()
+        self.profile._calculate_unscaled_profile(self.params_local)
+
+    def time_calculate_unscaled_profiles(self, experiment):
+        basis.Liouvillian.propagator_cache.clear()
+        self.profile.calculate_unscaled_profiles(self.values)
+
+    def track_ndata(self, experiment):
+        return len(self.profile)
+
+    def track_size(self, experiment):
+        return self.profile.liouv.size
+
+
+class ProfilesModels:
+    """Time the calculation of the CEST and CPMG profiles for exchange models
+    with a larger number of states."""
+
+    params = (["cest.x_ip", "cpmg.x_ip"], ["2st.pb_kex", "3st.pb_kex", "4st.pb_kex"])
+    param_names = ["experiment", "model"]
+
+    def setup(self, experiment, model):
+        data, params = common.load_experiment(experiment, model=model)
+        self.profile = data[0]
+        self.params_local = get_params_local(self.profile, params)
+
+    def time_calculate_unscaled_profile(self, experiment, model):
+        basis.Liouvillian.propagator_cache.clear()
+        self.profile._calculate_unscaled_profile(self.params_local)
+
+
+class ProfilesB1Inhomogeneity:
+    """Time the calculation of the CEST profiles with B1 inhomogeneity."""
+
+    params = ([0.1], ["auto", 5, 11, 21])
+    param_names = ["b1_inh", "b1_inh_res"]
+
+    def setup(self, b1_inh, b1_inh_res):
+        details = {"b1_inh": b1_inh}
+        if b1_inh_res != "auto":
+            details["b1_inh_res"] = b1_inh_res
+        data, params = common.load_experiment("cest.x_ip", **details)
+        self.profile = data[0]
+        self.params_local = get_params_local(self.profile, params)
+
+    def time_calculate_unscaled_profile(self, b1_inh, b1_inh_res):
+        basis.Liouvillian.propagator_cache.clear()
+        self.profile._calculate_unscaled_profile(self.params_local)
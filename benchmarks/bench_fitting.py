@@ -0,0 +1,50 @@
+"""End-to-end benchmarks of the fits of the examples."""
+from chemex import cache
+from chemex import fitting
+from chemex.spindynamics import basis
+
+from . import common
+
+
+class Fit:
+    """Time the complete fit of some of the examples."""
+
+    params = sorted(common.FITS)
+    param_names = ["example"]
+
+    number = 1
+    repeat = 1
+    warmup_time = 0.0
+    timeout = 1800.0
+
+    def setup(self, example):
+        cache.profiles.clear()
+        basis.Liouvillian.propagator_cache.clear()
+        self.data, self.params, self.method = common.load_fit(example)
+
+    def time_run_fit(self, example):
+        with common.quiet():
+            fitting.run_fit(self.method, self.params, self.data, "leastsq")
+
+
+class Residuals:
+    """Time the calculation of the residuals of the examples (with and without
+    the profile and propagator caches)."""
+
+    params = sorted(common.FITS)
+    param_names = ["example"]
+
+    def setup(self, example):
+        self.data, self.params, _ = common.load_fit(example)
+        self.data.calculate_residuals(self.params, verbose=False)
+
+    def time_calculate_residuals(self, example):
+        cache.profiles.clear()
+        basis.Liouvillian.propagator_cache.clear()
+        self.data.calculate_residuals(self.params, verbose=False)
+
+    def time_calculate_residuals_cached(self, example):
+        self.data.calculate_residuals(self.params, verbose=False)
+
+    def track_ndata(self, example):
+        return self.data.ndata
@@ -0,0 +1,85 @@
+"""Benchmarks of the calculation of the propagators for the different sizes of
+Liouvillian (spin system and number of states)."""
+import numpy as np
+
+from chemex.spindynamics import basis
+
+SYSTEMS = ["ixyz", "ixyzsz", "ixyzsxyz"]
+# Single-state models are not supported by the Liouvillian (no exchange)
+STATE_NBS = [2, 3, 4]
+
+# Typical values of the parameters (in s-1 and ppm)
+VALUES = {"r2": 10.0, "r1": 1.5, "r2a": 12.0, "r2_mq": 15.0, "r1a": 3.0, "k": 100.0}
+
+
+def make_liouvillian(system, state_nb, w1=25.0):
+    """Build a Liouvillian with typical parameter values, an on-resonance
+    carrier and a B1 field (in Hz) applied on the spin 'i'."""
+    liouv = basis.Liouvillian(
+        system=system,
+        state_nb=state_nb,
+        atoms={"i": "n", "s": "h"},
+        h_larmor_frq=800.0,
+        equilibrium=False,
+    )
+
+    parvals = []
+
+    for name in liouv._matrices:
+        prefix = name.split("_")[0]
+        if prefix == "cs":
+            parvals.append((name, 120.0 + 2.0 * "abcd".index(name[-1])))
+        elif prefix == "j" and not name.startswith("j_eff"):
+            parvals.append((name, -93.0))
+        elif name.startswith("k"):
+            parvals.append((name, VALUES["k"]))
+        elif prefix in VALUES:
+            parvals.append((name, VALUES[prefix]))
+
+    liouv.update(parvals)
+    liouv.carrier_i = 120.0
+    liouv.w1_i = 2.0 * np.pi * w1
+
+    return liouv
+
+
+class Propagators:
+    """Time the eigendecomposition-based calculation of the propagators."""
+
+    params = (SYSTEMS, STATE_NBS)
+    param_names = ["system", "state_nb"]
+
+    def setup(self, system, state_nb):
+        liouv = make_liouvillian(system, state_nb)
+        self.l_free = liouv._l_free + liouv._l_carrier_i + liouv._l_j_eff_i
+        self.l_pulse = self.l_free + liouv._l_w1x_i
+        self.delays = np.linspace(0.0, 0.5, 16)
+        self.mag = np.ones((liouv.size, 1))
+
+    def time_delays(self, system, state_nb):
+        basis.calculate_propagators(self.l_free, self.delays)
+
+    def time_pulse(self, system, state_nb):
+        basis.calculate_propagators(self.l_pulse, 0.5)
+
+    def time_pulse_dephasing(self, system, state_nb):
+        basis.calculate_propagators(self.l_pulse, 0.5, dephasing=True)
+
+    def time_pulse_mag(self, system, state_nb):
+        basis.calculate_propagated(self.l_pulse, 0.5, self.mag)
+
+    def time_pulse_mag_dephasing(self, system, state_nb):
+        basis.calculate_propagated(self.l_pulse, 0.5, self.mag, dephasing=True)
+
+    def track_size(self, system, state_nb):
+        return self.l_free.shape[-1]
+
+
+class Liouvillian:
+    """Time the construction of the Liouvillian."""
+
+    params = (SYSTEMS, STATE_NBS)
+    param_names = ["system", "state_nb"]
+
+    def time_build(self, system, state_nb):
+        make_liouvillian(system, state_nb)
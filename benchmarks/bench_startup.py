@@ -0,0 +1,16 @@
+"""Benchmarks of the startup time of ChemEx (measured in a fresh interpreter)."""
+
+
+def timeraw_import_chemex():
+    return "from chemex import chemex"
+
+
+def timeraw_build_parser():
+    return (
+        """
+        cli.build_parser()
+        """,
+        """
+        from chemex.chemex import cli
+        """,
+    )
@@ -0,0 +1,159 @@
+"""The common module contains the code for loading the example data used by the
+benchmarks."""
+import contextlib
+import io
+import pathlib
+import tempfile
+
+from chemex import datasets
+from chemex import parameters
+from chemex import util
+
+EXAMPLES = pathlib.Path(__file__).resolve().parent.parent / "examples"
+
+# Experiment type: (example directory, experiment file, parameter file)
+EXPERIMENTS = {
+    "cest.x_ip": (
+        "CEST/N15_InPhase",
+        "Experiments/cest_n15_500ms_26Hz.cfg",
+        "Parameters/params_n15.cfg",
+    ),
+    "cest.n_ip_h_cw": (
+        "CEST/N15_HN_CW",
+        "Experiments/19Hz_500ms_2_5ppm.cfg",
+        "Parameters/par.cfg",
+    ),
+    "cpmg.ch3_mq": (
+        "CPMG/C13H1_CH3_MQ",
+        "Experiments/ch3_mq_600.cfg",
+        "Parameters/params_ch3_mq.cfg",
+    ),
+    "cpmg.ch3_h2c": (
+        "CPMG/C13_CH3_H2C",
+        "Experiments/ch3_htoc_600.cfg",
+        "Parameters/params_ch3_htoc.cfg",
+    ),
+    "cpmg.chd2_h1sq": (
+        "CPMG/H1_CHD2_SQ",
+        "Experiments/chd2_h1sq_600.cfg",
+        "Parameters/params_chd2_h1sq.cfg",
+    ),
+    "cpmg.co_ap": (
+        "CPMG/C13_CO_AntiPhase",
+        "Experiments/13co_ap_500.cfg",
+        "Parameters/params_co.cfg",
+    ),
+    "cpmg.hn_ap": (
+        "CPMG/H1_HN_AntiPhase",
+        "Experiments/h1_ap_500.cfg",
+        "Parameters/params_h1.cfg",
+    ),
+    "cpmg.n_trosy": (
+        "CPMG/N15_Trosy",
+        "Experiments/n15_trosy_500.cfg",
+        "Parameters/params_n15.cfg",
+    ),
+    "cpmg.n_trosy_0013": (
+        "CPMG/N15_Trosy_0013",
+        "Experiments/n_trosy_cpmg_800.cfg",
+        "Parameters/params_n15.cfg",
+    ),
+    "cpmg.x_ip": (
+        "CPMG/N15_CW",
+        "Experiments/n15_cw_500.cfg",
+        "Parameters/params_n15.cfg",
+    ),
+    "cpmg.x_ip_0013": (
+        "CPMG/N15_CW_0013",
+        "Experiments/n15_cw_800.cfg",
+        "Parameters/params_n15.cfg",
+    ),
+}
+
+# Example name: (example directory, experiment files, parameter file, method file)
+FITS = {
+    "cest_n15": (
+        "CEST/N15_InPhase",
+        "Experiments/cest_n15*.cfg",
+        "Parameters/params_n15.cfg",
+        "Methods/method_n15.cfg",
+    ),
+    "cpmg_n15": (
+        "CPMG/N15_CW",
+        "Experiments/*.cfg",
+        "Parameters/params_n15.cfg",
+        "Methods/method_n15.cfg",
+    ),
+}
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the output printed by chemex."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def load_experiment(experiment_type, model=None, nprofiles=1, **details):
+    """Load the first profile(s) of the example of an experiment type, along with
+    the parameters.
+
+    Additional experimental details (e.g., 'b1_inh') override the ones from the
+    experiment file.
+
+    """
+    directory, experiment, parameter = EXPERIMENTS[experiment_type]
+    directory = EXAMPLES / directory
+
+    filename = directory / experiment
+    config = util.read_cfg_file(filename)
+
+    path = util.normalize_path(
+        filename.parent,
+        pathlib.Path(config.get("extra_parameters", "path", fallback=".")),
+    )
+
+    if not config.has_section("extra_parameters"):
+        config.add_section("extra_parameters")
+
+    config.set("extra_parameters", "path", str(path))
+
+    for key, value in details.items():
+        config.set("experimental_parameters", key, str(value))
+
+    for name in config.options("data")[nprofiles:]:
+        config.remove_option("data", name)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = pathlib.Path(tmp_dir) / "experiment.cfg"
+
+        with open(filename, "w") as f:
+            config.write(f)
+
+        with quiet():
+            data = datasets.read_data([filename], model)
+
+    with quiet():
+        params = parameters.create_params(data)
+        parameters.set_params_from_config_file(params, directory / parameter)
+
+    params.update_constraints()
+
+    return data, params
+
+
+def load_fit(example):
+    """Load the data, parameters and method file of a fitting example."""
+    directory, experiments, parameter, method = FITS[example]
+    directory = EXAMPLES / directory
+
+    with quiet():
+        data = datasets.read_data(sorted(directory.glob(experiments)))
+        params = parameters.create_params(data)
+        parameters.set_params_from_config_file(params, directory / parameter)
+        params.update_constraints()
+
+        for profile in data:
+            profile.filter_points(params)
+
+    return data, params, directory / method
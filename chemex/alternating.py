@@ -0,0 +1,397 @@
+"""The alternating module contains the block-coordinate solver used by the
+'alternating' fitting method.
+
+The global parameters (shared by several residues) and the local parameters
+(specific to a residue) are fitted alternately:
+
+- with the global parameters fixed, the problem splits into independent local
+  fits (see 'find_independent_clusters'), run in parallel;
+- the global parameters are then updated with a Levenberg-Marquardt step on the
+  reduced problem, where the local parameters are projected out of the
+  Jacobian (variable projection, i.e., the Schur complement of the normal
+  equations). The local parameters follow the linearized update.
+
+The cost of a cycle grows linearly with the number of residues, instead of the
+cubic cost of the dense problem.
+
+"""
+import concurrent.futures
+import contextlib
+import copy
+import itertools
+import sys
+
+import lmfit
+import numpy as np
+
+from chemex import checkpoint as cp
+
+# Maximum number of cycles
+MAX_CYCLES = 50
+# Relative decrease of the chi-square over a cycle below which the fit stops
+TOLERANCE = 1e-6
+# Relative step of the finite differences used for the Jacobian
+EPSILON = 1e-6
+# Maximum number of trial steps of the global parameters in a cycle
+MAX_TRIALS = 10
+
+
+def find_globals(data, params):
+    """Return the varying parameters shared by the profiles of several
+    residues."""
+
+    names = {}
+
+    for profile in data:
+        for name in profile.params:
+            param = params[name]
+            if param.vary and not param.expr:
+                names.setdefault(name, set()).add(profile.name)
+
+    return [name for name, residues in names.items() if len(residues) > 1]
+
+
+def get_steps(params, names, epsilon=EPSILON):
+    """Return the steps used for the finite differences, pointing inwards when
+    a step would cross a bound."""
+
+    steps = []
+
+    for name in names:
+        param = params[name]
+        step = epsilon * abs(param.value) if param.value else epsilon
+        if param.value + step > param.max:
+            step = -step
+        steps.append(step)
+
+    return np.array(steps)
+
+
+def iter_shifted(params, names, steps):
+    """Yield the parameters, then the parameters with each of 'names' shifted
+    in turn by its step."""
+
+    yield params
+
+    for name, step in zip(names, steps):
+        value = params[name].value
+        params[name].value = value + step
+        params.update_constraints()
+        yield params
+        params[name].value = value
+
+    params.update_constraints()
+
+
+def fit_cluster(data, params, names_global, deadline=None, maxfev=None):
+    """Fit the local parameters of a cluster, with the global parameters fixed,
+    and return the contribution of the cluster to the reduced problem of the
+    global parameters. A local fit stopped by the time budget or by 'maxfev'
+    keeps the best point met."""
+
+    params = copy.deepcopy(params)
+    params.update_constraints()
+
+    names_local = [
+        name for name, param in params.items() if param.vary and not param.expr
+    ]
+    names_global = [name for name in names_global if name in params]
+    nfev = 0
+
+    if names_local:
+        tracker = cp.Checkpoint(deadline=deadline)
+        minimizer = lmfit.Minimizer(
+            data.calculate_residuals,
+            params,
+            fcn_kws={"verbose": False},
+            iter_cb=tracker.iter_cb,
+        )
+        result = minimizer.minimize(method="leastsq", max_nfev=maxfev)
+        params, nfev = result.params, result.nfev
+        if result.aborted:
+            tracker.restore_best(params)
+
+    names = names_global + names_local
+    steps = get_steps(params, names)
+    residuals = data.calculate_residuals_batch(iter_shifted(params, names, steps))
+    nfev += len(residuals)
+
+    residual = residuals[0]
+    jacobian = (residuals[1:] - residual).T / steps
+    jac_global = jacobian[:, : len(names_global)]
+    jac_local = jacobian[:, len(names_global) :]
+
+    # Projection out of the space spanned by the local parameters
+    q, r = np.linalg.qr(jac_local)
+    jac_projected = jac_global - q @ (q.T @ jac_global)
+    residual_projected = residual - q @ (q.T @ residual)
+    r_inv = np.linalg.pinv(r)
+
+    return {
+        "names_global": names_global,
+        "names_local": names_local,
+        "values": [params[name].value for name in names_local],
+        "hessian": jac_projected.T @ jac_projected,
+        "gradient": jac_projected.T @ residual_projected,
+        "coupling": np.linalg.lstsq(r, q.T @ jac_global, rcond=None)[0],
+        "offset": np.linalg.lstsq(r, q.T @ residual, rcond=None)[0],
+        "covariance": r_inv @ r_inv.T,
+        "nfev": nfev,
+    }
+
+
+def fit_clusters(clusters, names_global, executor=None, deadline=None, maxfev=None):
+    """Fit the local parameters of all the clusters, in the processes of
+    'executor' if any."""
+
+    tasks = [
+        (c_data, c_params, names_global, deadline, maxfev)
+        for _, c_data, c_params in clusters
+    ]
+
+    if executor is not None:
+        return list(executor.map(_fit_cluster, tasks))
+
+    return [_fit_cluster(task) for task in tasks]
+
+
+def run_alternating(data, params, workers=1, deadline=None, maxfev=None):
+    """Fit the parameters by alternating local fits and global steps, and
+    return an lmfit-like result.
+
+    The uncertainties of the parameters are calculated from the linearized
+    problem of the last cycle (see 'set_stderr').
+
+    Each local fit is limited to 'maxfev' evaluations, and no cycle is started
+    once 'maxfev' evaluations are done in total or the time 'deadline' is
+    passed. In the latter case, the result is marked as 'aborted'.
+
+    """
+    from chemex import fitting
+
+    params = copy.deepcopy(params)
+    names_global = find_globals(data, params)
+
+    print(f"Global parameters: {len(names_global)}")
+
+    chisqr = np.inf
+    damping = 1e-3
+    hessian = None
+    nfev = 0
+
+    # The processes are shared by the cycles
+    with contextlib.ExitStack() as stack:
+        executor = None
+
+        if workers > 1:
+            executor = stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(workers)
+            )
+
+        try:
+            for cycle in range(1, MAX_CYCLES + 1):
+                if cp.is_expired(deadline) or (maxfev is not None and nfev >= maxfev):
+                    break
+
+                params_fixed = copy.deepcopy(params)
+
+                for name in names_global:
+                    params_fixed[name].vary = False
+
+                clusters = fitting.find_independent_clusters(data, params_fixed)
+                contributions = fit_clusters(
+                    clusters, names_global, executor, deadline, maxfev
+                )
+
+                hessian = np.zeros((len(names_global), len(names_global)))
+                gradient = np.zeros(len(names_global))
+
+                for contribution in contributions:
+                    indexes = [
+                        names_global.index(name)
+                        for name in contribution["names_global"]
+                    ]
+                    hessian[np.ix_(indexes, indexes)] += contribution["hessian"]
+                    gradient[indexes] += contribution["gradient"]
+                    nfev += contribution["nfev"]
+                    for name, value in zip(
+                        contribution["names_local"], contribution["values"]
+                    ):
+                        params[name].value = value
+
+                params.update_constraints()
+                residuals = data.calculate_residuals(params, verbose=False)
+                chisqr_local = residuals.dot(residuals)
+
+                chisqr_global, damping, ntrials = step_globals(
+                    data,
+                    params,
+                    names_global,
+                    contributions,
+                    hessian,
+                    gradient,
+                    chisqr_local,
+                    damping,
+                )
+                nfev += ntrials
+
+                print(
+                    f"  * cycle {cycle:>3d}: {chisqr_global:.3e} "
+                    f"({len(clusters)} local fits)"
+                )
+
+                converged = chisqr - chisqr_global <= TOLERANCE * chisqr_global
+                chisqr = chisqr_global
+
+                if converged or not names_global:
+                    break
+
+        except KeyboardInterrupt:
+            sys.stderr.write("\n -- Keyboard Interrupt: minimization stopped\n")
+
+    result = fitting.make_result(data, params, method="alternating")
+    result.nfev = nfev
+    result.aborted = cp.is_expired(deadline)
+
+    for param in params.values():
+        param.stderr = None
+
+    if hessian is not None and result.nfree > 0:
+        set_stderr(params, names_global, contributions, hessian, result.redchi)
+
+    return result
+
+
+def set_stderr(params, names_global, contributions, hessian, redchi):
+    """Set the uncertainties of the parameters from the covariance matrix of the
+    linearized problem.
+
+    The covariance of the global parameters is the inverse of the reduced
+    Hessian. With 'C' the coupling of the local parameters of a cluster to the
+    global parameters and 'R' the triangular factor of their Jacobian, the
+    local parameters have the covariance R^-1 R^-T * redchi + C cov_g C^T,
+    which includes the uncertainty of the global parameters. The uncertainties
+    of the constrained parameters are propagated from the covariance matrix.
+
+    """
+
+    cov_global = np.linalg.pinv(hessian) * redchi
+    nglobal = len(names_global)
+
+    # Each parameter depends linearly on the global parameters ('loadings'),
+    # plus a local term independent between clusters
+    loadings = dict(zip(names_global, np.eye(nglobal)))
+    cov_local = {}
+
+    for contribution in contributions:
+        names_local = contribution["names_local"]
+        indexes = [names_global.index(name) for name in contribution["names_global"]]
+        loading = np.zeros((len(names_local), nglobal))
+        loading[:, indexes] = -contribution["coupling"]
+        covariance = contribution["covariance"] * redchi
+        for index, name in enumerate(names_local):
+            loadings[name] = loading[index]
+            cov_local[name] = dict(zip(names_local, covariance[index]))
+
+    def get_covariance(names):
+        loading = np.array([loadings[name] for name in names]).reshape(-1, nglobal)
+        covariance = loading @ cov_global @ loading.T
+        for index1, name1 in enumerate(names):
+            for index2, name2 in enumerate(names):
+                covariance[index1, index2] += cov_local.get(name1, {}).get(name2, 0.0)
+        return covariance
+
+    for name in loadings:
+        params[name].stderr = np.sqrt(get_covariance([name])[0, 0])
+
+    # Propagation to the constrained parameters, with the derivatives of their
+    # expressions calculated by finite differences
+    names_expr = [name for name, param in params.items() if param.expr]
+    names_deps = sorted(
+        {dep for name in names_expr for dep in get_dependencies(params, name)}
+        & set(loadings)
+    )
+    steps = get_steps(params, names_deps)
+    values = np.array([params[name].value for name in names_expr])
+    jacobian = np.zeros((len(names_expr), len(names_deps)))
+
+    for index, shifted in enumerate(
+        itertools.islice(iter_shifted(params, names_deps, steps), 1, None)
+    ):
+        values_shifted = [shifted[name].value for name in names_expr]
+        jacobian[:, index] = (values_shifted - values) / steps[index]
+
+    covariance = jacobian @ get_covariance(names_deps) @ jacobian.T
+
+    for name, variance in zip(names_expr, np.diag(covariance)):
+        params[name].stderr = np.sqrt(variance)
+
+
+def get_dependencies(params, name):
+    """Return the names of the parameters on which the expression of a
+    constrained parameter depends, directly or through other expressions."""
+
+    dependencies = set()
+    names = [name]
+
+    while names:
+        param = params[names.pop()]
+        if not param.expr:
+            continue
+        for dep in param._expr_deps:
+            if dep in params and dep not in dependencies:
+                dependencies.add(dep)
+                names.append(dep)
+
+    return dependencies
+
+
+def step_globals(
+    data, params, names_global, contributions, hessian, gradient, chisqr, damping
+):
+    """Update the global parameters with a Levenberg-Marquardt step on the
+    reduced problem, and the local parameters with the linearized update.
+    Return the new chi-square and damping factor, and the number of trial
+    steps."""
+
+    if not names_global:
+        return chisqr, damping, 0
+
+    values = {name: param.value for name, param in params.items() if not param.expr}
+    diagonal = np.diag(np.maximum(np.diag(hessian), np.finfo(float).tiny))
+
+    for trial in range(1, MAX_TRIALS + 1):
+        delta = np.linalg.lstsq(hessian + damping * diagonal, -gradient, rcond=None)[0]
+
+        for name, a_delta in zip(names_global, delta):
+            params[name].value = values[name] + a_delta
+
+        for contribution in contributions:
+            indexes = [
+                names_global.index(name) for name in contribution["names_global"]
+            ]
+            delta_local = -(
+                contribution["offset"] + contribution["coupling"] @ delta[indexes]
+            )
+            for name, a_delta in zip(contribution["names_local"], delta_local):
+                params[name].value = values[name] + a_delta
+
+        params.update_constraints()
+        residuals = data.calculate_residuals(params, verbose=False)
+        chisqr_new = residuals.dot(residuals)
+
+        if chisqr_new < chisqr:
+            return chisqr_new, damping / 10.0, trial
+
+        damping *= 10.0
+
+    for name, value in values.items():
+        params[name].value = value
+
+    params.update_constraints()
+
+    return chisqr, damping, MAX_TRIALS
+
+
+def _fit_cluster(task):
+    return fit_cluster(*task)
@@ -0,0 +1,206 @@
+"""The api module contains the functions for running ChemEx from Python, without
+the command-line interface.
+
+The data and parameters can be read from the usual files or created from
+dictionaries and arrays, and the results of the fits are returned in memory:
+nothing is written to disk. The errors raise 'ChemexError' instead of exiting,
+and the progress messages are only printed with 'verbose=True'.
+
+Example:
+
+    data = api.create_data(
+        [({"experiment": {"type": "cpmg.x_ip"}, ...}, {"10N-HN": array})]
+    )
+    params = api.create_params(data, [{"global": {"pb": 0.05}}])
+    result = api.fit(data, params, method={"step 1": {"pb": "fit"}})
+    result.params["..."], result.chisqr, result.profiles
+
+Note that the messages are silenced by redirecting 'sys.stdout', which is not
+thread-safe.
+
+"""
+import contextlib
+import copy
+import io
+
+import numpy as np
+
+from chemex import datasets
+from chemex import fitting
+from chemex import parameters
+from chemex import scanning
+
+
+class ChemexError(Exception):
+    """Error raised by the functions of this module instead of exiting."""
+
+
+class FitResult:
+    """Result of a fit: the parameters, the statistics and the experimental and
+    calculated profiles."""
+
+    def __init__(self, result, data):
+        self.params = result.params
+        self.method = result.method
+        self.chisqr = result.chisqr
+        self.redchi = result.redchi
+        self.ndata = result.ndata
+        self.nvarys = result.nvarys
+        self.nfree = result.nfree
+        self.nfev = result.nfev
+        self.aic = result.aic
+        self.bic = result.bic
+        self.minima = getattr(result, "minima", None)
+        self.profiles = get_profiles(data, result.params)
+
+    def __repr__(self):
+        return (
+            f"<FitResult method={self.method!r} chisqr={self.chisqr:.5e} "
+            f"redchi={self.redchi:.5e} nvarys={self.nvarys}>"
+        )
+
+
+@contextlib.contextmanager
+def _library_mode(verbose=False):
+    """Raise 'ChemexError' instead of exiting and silence the messages."""
+
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+        try:
+            yield
+        except SystemExit as error:
+            raise ChemexError(str(error.code).strip()) from None
+
+
+def read_data(filenames, model=None, verbose=False):
+    """Read the experimental setup and data from experiment files."""
+
+    with _library_mode(verbose):
+        return datasets.read_data(filenames, model)
+
+
+def create_data(experiments, model=None, verbose=False):
+    """Create the dataset from (config, arrays) pairs, one per experiment.
+
+    'config' is a dictionary of sections, as in the experiment files (e.g.,
+    {"experiment": {"type": "cest.x_ip"}, "experimental_parameters": {...}}),
+    and 'arrays' a dictionary of arrays with the columns of the data files
+    (e.g., offsets, intensities and errors), indexed by the profile names.
+
+    """
+
+    data = datasets.DataSet()
+
+    with _library_mode(verbose):
+        for config, arrays in experiments:
+            data.add_dataset_from_arrays(config, arrays, model)
+
+        if not data.datasets:
+            raise ChemexError("No data to fit!")
+
+    return data
+
+
+def create_params(data, configs=(), verbose=False):
+    """Create the parameters of the dataset and set their values from
+    parameter files or dictionaries of sections (e.g., {"global": {"pb":
+    "0.05 [0.0, 0.2]"}, "dw_ab": {"10N": 2.5}})."""
+
+    with _library_mode(verbose):
+        params = parameters.create_params(data)
+
+    return update_params(data, params, configs, verbose)
+
+
+def update_params(data, params, configs=(), verbose=False):
+    """Set the values of the parameters from parameter files or dictionaries of
+    sections (see 'create_params'), and update the constrained parameters."""
+
+    with _library_mode(verbose):
+        for config in configs:
+            parameters.set_params_from_config_file(params, config)
+
+        params.update_constraints()
+
+        # Filter datapoints out if necessary (e.g., on-resonance filter CEST)
+        for profile in data:
+            profile.filter_points(params)
+
+    return params
+
+
+def fit(
+    data,
+    params,
+    method=None,
+    fitmethod="leastsq",
+    workers=1,
+    seed=None,
+    verbose=False,
+):
+    """Fit the data and return a 'FitResult'.
+
+    'method' is a fitting method file or a dictionary of sections (e.g.,
+    {"step 1": {"pb": "fix", "dw_ab": "fit"}, "step 2": {"pb": "fit"}}), and
+    'fitmethod' the default minimization method of the sections. 'params' is
+    not modified.
+
+    """
+
+    if not data.datasets:
+        raise ChemexError("No data to fit!")
+
+    params = copy.deepcopy(params)
+
+    if method is None:
+        method = {}
+
+    with _library_mode(verbose):
+        result = fitting.run_fit(method, params, data, fitmethod, None, workers, seed)
+        return FitResult(result, data)
+
+
+def scan(data, params, scans, workers=1, fixed=False, verbose=False):
+    """Scan the chi-square along one or two parameters (see 'chemex scan').
+
+    'scans' is a list of (name, lower bound, upper bound, number of points).
+    Return the values of the scanned parameters on the grid, the chi-square at
+    each grid point and the parameters at the best grid point.
+
+    """
+
+    with _library_mode(verbose):
+        return scanning.run_scan(data, params, scans, workers, fixed)
+
+
+def calculate(data, params, verbose=False):
+    """Calculate the profiles and the statistics for the parameters, without
+    fitting."""
+
+    with _library_mode(verbose):
+        result = fitting.make_result(data, copy.deepcopy(params), method="none")
+        return FitResult(result, data)
+
+
+def get_profiles(data, params):
+    """Return the experimental data of the profiles with the calculated
+    intensities ('intensity_calc') and the mask of the fitted points ('mask'),
+    indexed by (experiment name, profile name)."""
+
+    profiles = {}
+
+    for profile in data:
+        dtype = profile.data.dtype.descr + [("intensity_calc", "f8"), ("mask", "?")]
+        values = np.zeros(len(profile.data), dtype=dtype)
+
+        for name in profile.data.dtype.names:
+            values[name] = profile.data[name]
+
+        values["intensity_calc"] = profile.calculate_profile(params)
+        values["mask"] = profile.mask
+
+        profiles[(profile.experiment_name, profile.name)] = values
+
+    return profiles
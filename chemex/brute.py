@@ -0,0 +1,243 @@
+"""The brute module contains the grid search engine used by the 'brute' fitting
+method.
+
+The grid is evaluated in chunks, possibly in several worker processes, and
+only the best candidates and the 1-D and 2-D minima of the chi-square along
+the grid axes (used for plotting) are kept, so that the memory used does not
+depend on the number of grid points.
+
+"""
+import concurrent.futures
+import copy
+import heapq
+import itertools
+import sys
+
+import lmfit
+import numpy as np
+
+from chemex import checkpoint as cp
+
+# Number of grid points evaluated per chunk
+CHUNK_SIZE = 256
+# Number of grid points used for the parameters with no step size
+NS = 20
+# Number of best grid points kept as candidates
+KEEP = 50
+
+_evaluator = None
+
+
+class GridEvaluator:
+    """Calculate the chi-square at some points of the grid."""
+
+    def __init__(self, data, params, names, axes):
+        self.data = data
+        self.params = params
+        self.names = names
+        self.axes = axes
+        self.shape = tuple(axis.size for axis in axes)
+
+    def __call__(self, chunk):
+        """Return the chi-square at the grid points of the chunk of flat indexes
+        [start, stop), all the points of the chunk being calculated at once."""
+
+        residuals = self.data.calculate_residuals_batch(self.iter_params(chunk))
+
+        with np.errstate(invalid="ignore", over="ignore"):
+            chisqs = np.einsum("ij,ij->i", residuals, residuals)
+
+        chisqs[~np.isfinite(chisqs)] = np.inf
+
+        return chisqs
+
+    def iter_params(self, chunk):
+        """Set the parameters to each grid point of the chunk in turn."""
+
+        coordinates = np.unravel_index(np.arange(*chunk), self.shape)
+
+        for point in zip(*coordinates):
+            for name, axis, coordinate in zip(self.names, self.axes, point):
+                self.params[name].value = axis[coordinate]
+
+            self.params.update_constraints()
+
+            yield self.params
+
+
+class GridMinima:
+    """Keep track of the best points of the grid and of the minima of the
+    chi-square along one and two axes of the grid."""
+
+    def __init__(self, shape, keep=KEEP):
+        self.shape = shape
+        self.keep = keep
+        self.best = []
+        self.nfev = 0
+        self.minima = {
+            pair: np.full([shape[index] for index in pair], np.inf)
+            for size in (1, 2)
+            for pair in itertools.combinations(range(len(shape)), size)
+        }
+
+    def update(self, chunk, chisqs):
+        indexes = np.arange(*chunk)
+        coordinates = np.unravel_index(indexes, self.shape)
+
+        for pair, minima in self.minima.items():
+            np.minimum.at(minima, tuple(coordinates[index] for index in pair), chisqs)
+
+        self.best = heapq.nsmallest(
+            self.keep,
+            itertools.chain(self.best, zip(chisqs.tolist(), indexes.tolist())),
+        )
+        self.nfev += indexes.size
+
+
+def get_axes(params, names):
+    """Return the values of each varying parameter on the grid, following the
+    conventions of lmfit (bounds and/or 'brute_step')."""
+
+    axes = []
+
+    for name in names:
+        param = params[name]
+        lower, upper, step = param.min, param.max, param.brute_step
+
+        if np.isfinite(lower) and np.isfinite(upper):
+            if step:
+                axis = np.arange(lower, upper, step)
+            else:
+                axis = np.linspace(lower, upper, NS)
+        elif np.isfinite(lower) and step:
+            axis = np.arange(lower, lower + NS * step, step)
+        elif np.isfinite(upper) and step:
+            axis = np.arange(upper - NS * step, upper, step)
+        elif np.isfinite(param.value) and step:
+            axis = np.arange(
+                param.value - (NS // 2) * step, param.value + (NS // 2) * step, step
+            )
+        else:
+            sys.exit(
+                f"\nERROR: Not enough information for the grid search of '{name}'. "
+                f"Please specify bounds or an initial value and a step size.\n"
+            )
+
+        axes.append(axis)
+
+    return axes
+
+
+def run_brute(
+    data,
+    params,
+    workers=1,
+    chunk_size=CHUNK_SIZE,
+    keep=KEEP,
+    deadline=None,
+    maxfev=None,
+):
+    """Evaluate the chi-square on the grid of the varying parameters and return
+    an lmfit-like result for the best grid point. The 'keep' best grid points
+    are kept as candidates.
+
+    Only the first 'maxfev' grid points are evaluated. The search stops once
+    the time 'deadline' is passed, the result being then marked as 'aborted'
+    (with the best grid point so far).
+
+    The result has the additional attributes 'brute_axes' (values of each
+    parameter on the grid) and 'brute_minima' (minima of the chi-square along
+    one and two axes, indexed by the tuples of the indexes of the axes).
+
+    """
+
+    names = [name for name, param in params.items() if param.vary and not param.expr]
+    axes = get_axes(params, names)
+    evaluator = GridEvaluator(data, copy.deepcopy(params), names, axes)
+    minima = GridMinima(evaluator.shape, keep)
+
+    npoints = int(np.prod(evaluator.shape))
+    chunks = [
+        (start, min(start + chunk_size, npoints))
+        for start in range(0, npoints, chunk_size)
+    ]
+
+    if maxfev is not None:
+        chunks = [
+            (start, min(stop, maxfev)) for start, stop in chunks if start < maxfev
+        ]
+
+    print(f"Grid points: {npoints} ({' x '.join(map(str, evaluator.shape))})")
+
+    aborted = False
+
+    try:
+        if workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=_set_evaluator, initargs=(evaluator,)
+            ) as executor:
+                # The chunks are submitted in waves, so that the time budget is
+                # checked while the grid is evaluated
+                for start in range(0, len(chunks), workers):
+                    if cp.is_expired(deadline):
+                        aborted = True
+                        break
+                    wave = chunks[start : start + workers]
+                    for chunk, chisqs in zip(wave, executor.map(_evaluate, wave)):
+                        minima.update(chunk, chisqs)
+        else:
+            for chunk in chunks:
+                if cp.is_expired(deadline):
+                    aborted = True
+                    break
+                minima.update(chunk, evaluator(chunk))
+
+    except KeyboardInterrupt:
+        sys.stderr.write("\n -- Keyboard Interrupt: grid search stopped\n")
+
+    if minima.nfev < npoints:
+        print(f"Grid points evaluated: {minima.nfev}/{npoints}")
+
+    result = make_result(data, params, names, axes, minima)
+    result.aborted = aborted
+
+    return result
+
+
+def make_result(data, params, names, axes, minima):
+    """Create the result of the grid search, with the parameters of the best
+    grid point."""
+    from chemex import fitting
+
+    candidates = []
+
+    for chisq, index in minima.best:
+        params_ = copy.deepcopy(params)
+        point = np.unravel_index(index, minima.shape)
+        for name, axis, coordinate in zip(names, axes, point):
+            params_[name].value = axis[coordinate]
+        params_.update_constraints()
+        candidates.append(lmfit.minimizer.Candidate(params=params_, score=chisq))
+
+    if candidates:
+        params = candidates[0].params
+
+    result = fitting.make_result(data, params, method="brute")
+    result.var_names = names
+    result.nfev = minima.nfev
+    result.candidates = candidates
+    result.brute_axes = axes
+    result.brute_minima = minima.minima
+    result.brute_x0 = np.array([params[name].value for name in names])
+    result.brute_fval = result.chisqr
+
+    return result
+
+
+def _set_evaluator(evaluator):
+    global _evaluator
+    _evaluator = evaluator
+
+
+def _evaluate(chunk):
+    return _evaluator(chunk)
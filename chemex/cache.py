@@ -0,0 +1,118 @@
+"""The cache module contains a memory-bounded cache for the results of costly
+calculations (e.g., propagators), indexed by a hash of their inputs."""
+import collections
+import hashlib
+
+import numpy as np
+
+# Default memory budget of the cache of the calculated profiles (in MB)
+PROFILES_CACHE_MB = 256
+
+
+class Cache:
+    """Least-recently-used cache with a memory budget (in bytes).
+
+    The values are numpy arrays (or dictionaries of arrays) that are made
+    read-only, as they are shared between all the users of the cache. When the
+    budget is exceeded, the least recently used entries are evicted.
+
+    """
+
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Return the value stored for 'key' and mark it as recently used."""
+
+        try:
+            value, _ = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return value
+
+    def put(self, key, value):
+        """Store 'value' for 'key', evicting the least recently used entries if
+        needed. Values larger than the budget are not stored."""
+
+        nbytes = get_nbytes(value) + len(key)
+
+        if key in self._entries or nbytes > self.maxbytes:
+            return value
+
+        for array in get_arrays(value):
+            array.flags.writeable = False
+
+        self._entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        self._evict()
+
+        return value
+
+    def resize(self, maxbytes):
+        """Change the memory budget, evicting entries if needed."""
+        self.maxbytes = maxbytes
+        self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _evict(self):
+        while self.nbytes > self.maxbytes:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= nbytes
+
+    @property
+    def stats(self):
+        """Number of hits and misses, number of entries and memory used."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self),
+            "nbytes": self.nbytes,
+        }
+
+
+# Cache shared by all the profiles for their calculated (unscaled) values
+profiles = Cache(PROFILES_CACHE_MB * 2 ** 20)
+
+
+def make_key(*items):
+    """Hash the content of arrays, numbers and strings into a key."""
+
+    hasher = hashlib.blake2b(digest_size=16)
+
+    for item in items:
+        if isinstance(item, str):
+            hasher.update(item.encode())
+        else:
+            array = np.ascontiguousarray(item)
+            hasher.update(f"{array.dtype.str}{array.shape}".encode())
+            hasher.update(array.tobytes())
+
+    return hasher.digest()
+
+
+def get_arrays(value):
+    if isinstance(value, dict):
+        return list(value.values())
+    return [value]
+
+
+def get_nbytes(value):
+    return sum(array.nbytes for array in get_arrays(value))
@@ -0,0 +1,168 @@
+"""The checkpoint module contains the code for saving the progress of a fit, so
+that an interrupted run can be resumed, and for limiting its duration.
+
+The values and uncertainties of the parameters are saved to 'checkpoint.json'
+in the output directory after each fitted cluster and each section of the
+fitting method, and the run is marked as done once the results are written.
+With '--resume', the finished sections and clusters are skipped and their
+parameters restored. The MC and bootstrap replicates have their own output
+directories, hence their own checkpoints, and the seed of the replicates is
+saved in the checkpoint of the main fit, so that a resumed run generates the
+same replicates.
+
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+FILENAME = "checkpoint.json"
+
+
+class Checkpoint:
+    """Save and restore the progress of a fit, and keep track of the time
+    budget ('max_time', in seconds, shared by all the fits of a run)."""
+
+    def __init__(self, path=None, resume=False, deadline=None):
+        self.filename = path / FILENAME if path is not None else None
+        self.deadline = deadline
+        self.state = {"sections": {}, "clusters": {}, "done": False}
+        self.stopped = False
+        self.best = (float("inf"), {})
+
+        if resume and self.filename is not None and self.filename.exists():
+            with self.filename.open() as file_:
+                self.state.update(json.load(file_))
+
+    @property
+    def done(self):
+        return self.state["done"]
+
+    def expired(self):
+        """Check whether the time budget is used up."""
+        return is_expired(self.deadline)
+
+    def stop(self):
+        """Record that some clusters were not fitted to completion."""
+        self.stopped = True
+
+    def iter_cb(self, params, iteration, residuals, *args, **kwargs):
+        """Callback of the lmfit minimizers, keeping track of the best values of
+        the parameters and aborting the fit once the time budget is used up."""
+
+        chisqr = residuals.dot(residuals)
+
+        if chisqr < self.best[0]:
+            values = {name: param.value for name, param in params.items()}
+            self.best = (chisqr, values)
+
+        return self.expired()
+
+    def reset_best(self):
+        self.best = (float("inf"), {})
+
+    def restore_best(self, params):
+        """Set the parameters to the best values met by the minimizer, as the
+        last values of an aborted fit are not necessarily the best ones."""
+
+        for name, value in self.best[1].items():
+            if name in params and not params[name].expr:
+                params[name].value = value
+
+        params.update_constraints()
+
+    def get_section(self, section):
+        return self.state["sections"].get(section)
+
+    def set_section(self, section, params):
+        self.state["sections"][section] = dump_params(params)
+        self.state["clusters"].pop(section, None)
+        self.save()
+
+    def get_cluster(self, section, cluster):
+        return self.state["clusters"].get(section, {}).get(cluster)
+
+    def set_cluster(self, section, cluster, params):
+        clusters = self.state["clusters"].setdefault(section, {})
+        clusters[cluster] = dump_params(params)
+        self.save()
+
+    def get_seed(self, seed=None, resume=False):
+        """Return the seed of the MC and bootstrap replicates: the seed saved in
+        the checkpoint when resuming, else 'seed' or a new random seed. The
+        seed is saved in the checkpoint."""
+
+        saved = self.state.get("seed") if resume else None
+
+        if seed is None:
+            seed = saved
+        elif saved is not None and seed != saved:
+            sys.exit(
+                f"\nERROR: The replicates to resume were generated with the seed "
+                f"{saved}, not {seed}. Please use the same seed or no '--seed'.\n"
+            )
+
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy)
+
+        self.state["seed"] = seed
+        self.save()
+
+        return seed
+
+    def get_result(self):
+        """Return the final parameters and the fitting method of a finished
+        run."""
+        return self.state["params"], self.state["method"]
+
+    def set_done(self, result):
+        self.state["done"] = True
+        self.state["params"] = dump_params(result.params)
+        self.state["method"] = result.method
+        self.save()
+
+    def save(self):
+        """Write the checkpoint, through a temporary file so that the checkpoint
+        is never left half-written."""
+
+        if self.filename is None:
+            return
+
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        filename_tmp = self.filename.with_suffix(".tmp")
+
+        with filename_tmp.open("w") as file_:
+            json.dump(self.state, file_)
+
+        os.replace(filename_tmp, self.filename)
+
+
+def get_deadline(max_time=None):
+    """Return the time (of 'time.monotonic') at which the run should stop."""
+    if max_time is None:
+        return None
+    return time.monotonic() + max_time
+
+
+def is_expired(deadline=None):
+    return deadline is not None and time.monotonic() > deadline
+
+
+def dump_params(params):
+    """Return the values and uncertainties of the parameters."""
+    return {name: [param.value, param.stderr] for name, param in params.items()}
+
+
+def load_params(params, values):
+    """Restore the values and uncertainties of the parameters, the values of
+    the constrained parameters being calculated from their expression."""
+
+    for name, (value, stderr) in values.items():
+        if name in params:
+            if not params[name].expr:
+                params[name].value = value
+            params[name].stderr = stderr
+
+    params.update_constraints()
@@ -5,10 +5,14 @@ import shutil
 import numpy as np
 
 from chemex import __version__
+from chemex import cache
+from chemex import checkpoint as cp
 from chemex import cli
 from chemex import datasets
 from chemex import fitting
 from chemex import parameters
+from chemex import scanning
+from chemex import timings as tm
 from chemex import util
 
 LOGO = r"""
@@ -43,61 +47,218 @@ def main():
 
 
 def fit(args):
+    """Fit the experimental data and write the results."""
+    timings = tm.Timings(args.profile, args.cprofile)
+    cache.profiles.resize(args.cache_mb * 2 ** 20)
+
+    with timings.profile():
+        data, params = read_data_and_params(args, timings)
+        output_dir = get_output_dir(args)
+
+        deadline = cp.get_deadline(args.max_time)
+
+        result = fit_write_plot(args, params, data, output_dir, timings, deadline)
+
+        if args.bs or args.mc:
+            if args.bs:
+                nmb = args.bs
+            else:
+                nmb = args.mc
+
+            formatter_output_dir = "".join(["{:0", str(int(np.log10(nmb)) + 1), "d}"])
+
+            # The seed is saved so that a resumed run fits the same replicates
+            checkpoint = cp.Checkpoint(output_dir, resume=True)
+            seed = checkpoint.get_seed(args.seed, args.resume)
+
+            # The data of the replicates are generated lazily, in batches
+            if args.bs:
+                replicates = data.iter_bs_datasets(nmb, seed)
+            else:
+                replicates = data.iter_mc_datasets(result.params, nmb, seed)
+
+            for index, data_index in enumerate(replicates, 1):
+                name_index = formatter_output_dir.format(index)
+
+                if cp.is_expired(deadline):
+                    print("\nThe time budget is used up: simulations stopped")
+                    break
+
+                with timings.stage(f"replicate {name_index}"):
+                    output_dir_ = output_dir / name_index
+
+                    params_mc = copy.deepcopy(result.params)
+
+                    fit_write_plot(
+                        args, params_mc, data_index, output_dir_, timings, deadline
+                    )
+
+    if timings.enabled:
+        util.header1("Writing Timings")
+        print("\nFile(s):")
+        timings.write(output_dir)
+
+
+def plot(args):
+    """Write the output files and plot the results for a set of parameter values
+    (e.g., from a previous 'parameters.fit' file), without fitting."""
+    data, params = read_data_and_params(args)
+    output_dir = get_output_dir(args)
+
+    set_method_status(params, args.method)
+
+    util.header1("Calculating Profiles")
+
+    result = fitting.make_result(data, params, method="none")
+
+    print(f"Chi2        : {result.chisqr:.3e}")
+    print(f"Reduced Chi2: {result.redchi:.3e}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    util.header1("Writing Results")
+
+    print("\nFile(s):")
+
+    data.write_to(result.params, path=output_dir)
+    fitting.write_statistics(result, path=output_dir)
+    data.write_costs(path=output_dir)
+
+    if not args.noplot:
+        plot_results(result, data, output_dir)
+
+
+def scan(args):
+    """Scan the chi-square along one or two parameters, refitting the other
+    parameters at each grid point, and write and plot the chi-square surface."""
+    data, params = read_data_and_params(args)
+    output_dir = get_output_dir(args)
+
+    set_method_status(params, args.method)
+
+    util.header1("Scanning")
+
+    axes, chisqrs, best = scanning.run_scan(
+        data, params, args.scans, args.workers, args.fixed
+    )
+
+    if len(axes) == 1 and np.isfinite(chisqrs).any():
+        for delta in scanning.DELTA_CHISQR[1]:
+            lower, upper = scanning.get_intervals(axes[0], chisqrs, delta)
+            lower = "<" if lower is None else f"{lower:.4g}"
+            upper = ">" if upper is None else f"{upper:.4g}"
+            print(f"Delta chi2 <= {delta}: [{lower}, {upper}]")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    util.header1("Writing Results")
+
+    print("\nFile(s):")
+
+    parameters.write_par(best, path=output_dir)
+    scanning.write_scan(args.scans, axes, chisqrs, path=output_dir)
+
+    if not args.noplot and np.isfinite(chisqrs).any():
+        from chemex.experiments.base import plotting
+
+        outfile = output_dir / "scan.pdf"
+        labels = [scan[0].upper() for scan in args.scans]
+        levels = scanning.DELTA_CHISQR[len(axes)]
+        plotting.plot_scan(axes, chisqrs, labels, levels, output=outfile)
+        print(f"  * {outfile}")
+
+
+def set_method_status(params, method):
+    """Apply the constraints and fitting status of the method, if any."""
+    if method:
+        method_config = util.read_cfg_file(method)
+        for section in method_config.sections():
+            parameters.set_param_status(params, method_config.items(section))
+
+
+def read_data_and_params(args, timings=None):
+    """Read the experimental data and set the initial values of the parameters."""
+    if timings is None:
+        timings = tm.Timings(enabled=False)
+
     # Read experimental setup and data
-    data = datasets.read_data(args.experiments, args.model)
-    data.filter(args.res_incl, args.res_excl)
+    with timings.stage("reading"):
+        data = datasets.read_data(args.experiments, args.model)
+        data.filter(args.res_incl, args.res_excl)
 
     # Create and update initial values of fitting/fixed parameters
     util.header1("Reading Default Parameters")
-    params = parameters.create_params(data)
 
-    for name in args.parameters:
-        parameters.set_params_from_config_file(params, name)
+    with timings.stage("create_params"):
+        params = parameters.create_params(data)
+
+    with timings.stage("set_params_from_config_file"):
+        for name in args.parameters:
+            parameters.set_params_from_config_file(params, name)
 
     # Filter datapoints out if necessary (e.g., on-resonance filter CEST)
-    for profile in data:
-        profile.filter_points(params)
+    with timings.stage("filter_points"):
+        for profile in data:
+            profile.filter_points(params)
+
+    return data, params
+
 
-    # Customize the output directory
+def get_output_dir(args):
+    """Customize the output directory."""
     output_dir = args.out_dir
 
     if args.res_incl and len(args.res_incl) == 1:
         output_dir = output_dir / args.res_incl.pop().upper()
 
-    result = fit_write_plot(args, params, data, output_dir)
-
-    if args.bs or args.mc:
-        if args.bs:
-            nmb = args.bs
-        else:
-            nmb = args.mc
-
-        formatter_output_dir = "".join(["{:0", str(int(np.log10(nmb)) + 1), "d}"])
-
-        for index in range(1, nmb + 1):
-            if args.bs:
-                data_index = data.make_bs_dataset()
-            else:
-                data_index = data.make_mc_dataset(result.params)
-
-            output_dir_ = output_dir / formatter_output_dir.format(index)
-
-            params_mc = copy.deepcopy(result.params)
+    return output_dir
 
-            fit_write_plot(args, params_mc, data_index, output_dir_)
 
+def fit_write_plot(args, params, data, output_dir, timings=None, deadline=None):
+    """Perform the fit, write the output files and plot the results.
 
-def fit_write_plot(args, params, data, output_dir):
-    """Perform the fit, write the output files and plot the results."""
+    The progress is saved in the output directory and, with '--resume', the
+    work already done is skipped. The results are written even if the fit is
+    stopped by the time budget ('deadline').
 
-    result = fitting.run_fit(args.method, params, data, args.fitmethod)
+    """
+    if timings is None:
+        timings = tm.Timings(enabled=False)
+
+    checkpoint = cp.Checkpoint(output_dir, args.resume, deadline)
+
+    if checkpoint.done:
+        print(f"\nSkipped: the results in '{output_dir}' are complete")
+        values, method = checkpoint.get_result()
+        cp.load_params(params, values)
+        return fitting.make_result(data, params, method)
+
+    with timings.stage("fit"):
+        result = fitting.run_fit(
+            args.method,
+            params,
+            data,
+            args.fitmethod,
+            timings,
+            args.workers,
+            args.seed,
+            checkpoint,
+        )
 
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    write_results(result, data, args.method, output_dir)
+    with timings.stage("writing"):
+        write_results(result, data, args.method, output_dir)
+
+    if checkpoint.stopped:
+        print("\nWarning: the time budget was used up before the end of the fit.")
+        print("         Run the same command with '--resume' to continue it.")
+    else:
+        checkpoint.set_done(result)
 
     if not args.noplot:
-        plot_results(result, data, output_dir)
+        with timings.stage("plotting"):
+            plot_results(result, data, output_dir)
 
     return result
 
@@ -110,6 +271,8 @@ def write_results(result, data, method, output_dir):
       - contstraints.fit: expression used for constraining parameters
       - *.dat: experimental and fitted data
       - statistics.fit: statistics for the fit
+      - costs.fit: cost of the calculations of the profiles
+      - minima.fit: distinct minima found by the 'multistart' method
 
     """
     util.header1("Writing Results")
@@ -123,6 +286,10 @@ def write_results(result, data, method, output_dir):
     parameters.write_constraints(result.params, path=output_dir)
     data.write_to(result.params, path=output_dir)
     fitting.write_statistics(result, path=output_dir)
+    data.write_costs(path=output_dir)
+
+    if hasattr(result, "minima"):
+        fitting.write_minima(result.minima, path=output_dir)
 
 
 def plot_results(result, data, path):
@@ -141,11 +308,13 @@ def plot_results(result, data, path):
     except KeyboardInterrupt:
         print(" - Plotting cancelled")
 
-    if result.method == "brute":
+    if result.method == "brute" and not hasattr(result, "brute_axes"):
+        print("  * No grid search to plot: several clusters or restored fit")
+
+    elif result.method == "brute":
         labels = [
             parameters.ParamName.from_fname(var).name.upper()
             for var in result.var_names
         ]
         outfile = path / "results_brute.pdf"
         plotting.plot_results_brute(result, varlabels=labels, output=outfile)
-        print((f"  * {outfile}"))
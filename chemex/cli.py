@@ -5,11 +5,14 @@ import pathlib
 import sys
 
 from chemex import __version__
+from chemex import cache
 from chemex import chemex
 from chemex import experiments
 from chemex import util
+from chemex.tools import guess_cest
 from chemex.tools import pick_cest
 from chemex.tools import plot_param
+from chemex.tools import screen
 
 FITMETHODS = {
     "cobyla",
@@ -27,6 +30,8 @@ FITMETHODS = {
     "brute",
     "basinhopping",
     "ampgo",
+    "multistart",
+    "alternating",
 }
 
 
@@ -48,7 +53,7 @@ def build_parser():
         "dispersion and Chemical Exchange Saturation Transfer."
     )
 
-    parser = MyParser(description=description, prog="chemex")
+    parser = MyParser(description=description, prog="chemex", fromfile_prefix_chars="@")
 
     parser.add_argument(
         "--version", action="version", version=f"{parser.prog} {__version__}"
@@ -80,78 +85,92 @@ def build_parser():
 
     fit_parser.set_defaults(func=chemex.fit)
 
+    add_data_arguments(fit_parser)
+
     fit_parser.add_argument(
-        "-e",
-        dest="experiments",
+        "-m",
+        dest="method",
         type=pathlib.Path,
         metavar="FILE",
-        nargs="+",
-        required=True,
-        help="Input files containing experimental setup and data location",
+        help="Input file containing the fitting method",
     )
 
     fit_parser.add_argument(
-        "-d",
-        dest="model",
-        metavar="MODEL",
-        default="2st.pb_kex",
-        help="Exchange model used to fit the data",
+        "--noplot", action="store_true", help="No plots of the fits"
     )
 
     fit_parser.add_argument(
-        "-p",
-        dest="parameters",
-        type=pathlib.Path,
-        metavar="FILE",
-        nargs="+",
-        required=True,
-        help="Input file containing the initial values of fitting parameters",
+        "-f",
+        dest="fitmethod",
+        metavar="FITMETHOD",
+        default="leastsq",
+        choices=sorted(FITMETHODS),
+        help="Specify the fitting method",
     )
 
     fit_parser.add_argument(
-        "-m",
-        dest="method",
-        type=pathlib.Path,
-        metavar="FILE",
-        help="Input file containing the fitting method",
+        "--profile",
+        action="store_true",
+        help="Record the time spent in each stage of the fit in 'timings.json'",
     )
 
     fit_parser.add_argument(
-        "-o",
-        dest="out_dir",
-        type=pathlib.Path,
-        metavar="DIR",
-        default="./Output",
-        help="Directory for output files",
+        "--cprofile",
+        action="store_true",
+        help="Same as '--profile', with cProfile statistics in 'timings.prof'",
     )
 
     fit_parser.add_argument(
-        "--noplot", action="store_true", help="No plots of the fits"
+        "--workers",
+        metavar="N",
+        type=int,
+        default=1,
+        help=(
+            "Number of processes used for the grid search of the 'brute' method, "
+            "the local refinements of the 'multistart' method and the local fits "
+            "of the 'alternating' method"
+        ),
     )
 
     fit_parser.add_argument(
-        "-f",
-        dest="fitmethod",
-        metavar="FITMETHOD",
-        default="leastsq",
-        choices=sorted(FITMETHODS),
-        help="Specify the fitting method",
+        "--cache-mb",
+        metavar="MB",
+        type=float,
+        default=cache.PROFILES_CACHE_MB,
+        help=(
+            "Memory budget of the cache of the calculated profiles in MB "
+            f"(default: {cache.PROFILES_CACHE_MB})"
+        ),
     )
 
-    selection = fit_parser.add_mutually_exclusive_group()
-    selection.add_argument(
-        "+r",
-        dest="res_incl",
-        metavar="ID",
-        nargs="+",
-        help="residue(s) to include in the fit",
+    fit_parser.add_argument(
+        "--seed",
+        metavar="SEED",
+        type=int,
+        help=(
+            "Seed of the random numbers of the MC and Bootstrap simulations "
+            "(the replicates are reproducible for a given seed) and of the "
+            "starting points of the 'multistart' method"
+        ),
     )
-    selection.add_argument(
-        "-r",
-        dest="res_excl",
-        metavar="ID",
-        nargs="+",
-        help="residue(s) to exclude from the fit",
+
+    fit_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Resume an interrupted run from the checkpoints saved in the output "
+            "directory, skipping the sections, clusters and simulations already done"
+        ),
+    )
+
+    fit_parser.add_argument(
+        "--max-time",
+        metavar="SECONDS",
+        type=float,
+        help=(
+            "Time budget of the run: the fit is stopped once it is used up, the "
+            "results being written as usual (and the run can be resumed)"
+        ),
     )
 
     simulation = fit_parser.add_mutually_exclusive_group()
@@ -162,6 +181,125 @@ def build_parser():
         "--bs", metavar="N", type=int, help="Run N Bootstrap simulations"
     )
 
+    # parser for the positional argument "plot"
+    plot_parser = commands.add_parser(
+        "plot",
+        help="Write and plot the profiles calculated from a set of parameters",
+        description=(
+            "Calculate the profiles from the given parameter values (e.g., a "
+            "'parameters.fit' file from a previous fit) and write the output files "
+            "and plots, without fitting."
+        ),
+        prefix_chars="+-",
+    )
+
+    plot_parser.set_defaults(func=chemex.plot)
+
+    add_data_arguments(plot_parser)
+
+    plot_parser.add_argument(
+        "-m",
+        dest="method",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="Input file containing the fitting method, used for the constraints",
+    )
+
+    plot_parser.add_argument(
+        "--noplot", action="store_true", help="Only write the output files"
+    )
+
+    # parser for the positional argument "scan"
+    scan_parser = commands.add_parser(
+        "scan",
+        help="Scan the chi-square along one or two parameters",
+        description=(
+            "Fix one or two parameters (e.g., 'pb' and 'kex_ab') at the points of "
+            "a grid and refit the other parameters at each point (profile "
+            "likelihood). The refits are warm-started from the neighbouring "
+            "points. The chi-square surface is written to 'scan.dat' and plotted."
+        ),
+        prefix_chars="+-",
+    )
+
+    scan_parser.set_defaults(func=chemex.scan)
+
+    add_data_arguments(scan_parser)
+
+    scan_parser.add_argument(
+        "-m",
+        dest="method",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="Input file containing the fitting method, used for the fitting status",
+    )
+
+    scan_parser.add_argument(
+        "-s",
+        dest="scans",
+        nargs=4,
+        action="append",
+        required=True,
+        metavar=("NAME", "MIN", "MAX", "N"),
+        help="Parameter to scan, with the range and number of grid points",
+    )
+
+    scan_parser.add_argument(
+        "--fixed",
+        action="store_true",
+        help=(
+            "Only calculate the chi-square, the other parameters being fixed "
+            "(faster, all the grid points are calculated in batches)"
+        ),
+    )
+
+    scan_parser.add_argument(
+        "--workers",
+        metavar="N",
+        type=int,
+        default=1,
+        help="Number of processes used for the refits of the rows of the grid",
+    )
+
+    scan_parser.add_argument(
+        "--noplot", action="store_true", help="Only write the output files"
+    )
+
+    # parser for the positional argument "serve"
+    from chemex import server  # imported here, as it depends on this module
+
+    serve_parser = commands.add_parser(
+        "serve",
+        help="Keep datasets in memory and run fit, scan or plot jobs",
+        description=(
+            "Run a server keeping the datasets, their Liouvillians and the cache "
+            "of the calculated profiles in memory. The jobs are sent as JSON "
+            "requests over a Unix socket, and their progress is streamed back "
+            "(see the documentation of the 'chemex.server' module)."
+        ),
+    )
+
+    serve_parser.set_defaults(func=server.serve)
+
+    serve_parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        type=pathlib.Path,
+        default=server.SOCKET,
+        help=f"Path of the Unix socket (default: {server.SOCKET})",
+    )
+
+    serve_parser.add_argument(
+        "--workers",
+        metavar="N",
+        type=int,
+        default=1,
+        help=(
+            "Default number of processes used by the 'brute', 'multistart' and "
+            "'alternating' methods and by the scans"
+        ),
+    )
+
     # parser for the positional argument "pick_cest"
     pick_cest_parser = commands.add_parser(
         "pick_cest", help="Plot CEST profiles for dip picking"
@@ -188,6 +326,80 @@ def build_parser():
         help="Directory for output files",
     )
 
+    # parser for the positional argument "guess"
+    guess_parser = commands.add_parser(
+        "guess",
+        help="Estimate 'cs_a' and 'dw_ab' from CEST profiles",
+        description=(
+            "Detect the major and minor dips of the CEST profiles and write "
+            "them as initial values of 'cs_a' and 'dw_ab' to a parameter file "
+            "('guess.cfg')."
+        ),
+    )
+
+    guess_parser.set_defaults(func=guess_cest.guess_cest)
+
+    guess_parser.add_argument(
+        "-e",
+        dest="experiments",
+        type=pathlib.Path,
+        metavar="FILE",
+        nargs="+",
+        required=True,
+        help="Input files containing experimental setup and data location",
+    )
+
+    guess_parser.add_argument(
+        "-o",
+        dest="out_dir",
+        type=pathlib.Path,
+        metavar="DIR",
+        default="./Output",
+        help="Directory for output files",
+    )
+
+    # parser for the positional argument "screen"
+    screen_parser = commands.add_parser(
+        "screen",
+        help="Screen CPMG and CEST profiles for measurable exchange",
+        description=(
+            "Test the CPMG profiles for a non-flat dispersion and the CEST "
+            "profiles for a minor dip, and write the names of the included and "
+            "excluded profiles to 'include.txt' and 'exclude.txt'. These files "
+            "can be used as residue filters of the other commands, e.g., "
+            "'chemex fit ... @Output/include.txt'."
+        ),
+    )
+
+    screen_parser.set_defaults(func=screen.screen)
+
+    screen_parser.add_argument(
+        "-e",
+        dest="experiments",
+        type=pathlib.Path,
+        metavar="FILE",
+        nargs="+",
+        required=True,
+        help="Input files containing experimental setup and data location",
+    )
+
+    screen_parser.add_argument(
+        "-o",
+        dest="out_dir",
+        type=pathlib.Path,
+        metavar="DIR",
+        default="./Output",
+        help="Directory for output files",
+    )
+
+    screen_parser.add_argument(
+        "--nsigma",
+        metavar="N",
+        type=float,
+        default=guess_cest.NSIGMA,
+        help="Significance (in standard deviations) above which exchange is detected",
+    )
+
     # parser for the positional argument "pick_cest"
     plot_param_parser = commands.add_parser(
         "plot_param", help="Plot one selected parameter from a 'parameters.fit' file"
@@ -215,6 +427,63 @@ def build_parser():
     return parser
 
 
+def add_data_arguments(parser):
+    """Add the arguments defining the data, model, parameters and output."""
+
+    parser.add_argument(
+        "-e",
+        dest="experiments",
+        type=pathlib.Path,
+        metavar="FILE",
+        nargs="+",
+        required=True,
+        help="Input files containing experimental setup and data location",
+    )
+
+    parser.add_argument(
+        "-d",
+        dest="model",
+        metavar="MODEL",
+        default="2st.pb_kex",
+        help="Exchange model used to fit the data",
+    )
+
+    parser.add_argument(
+        "-p",
+        dest="parameters",
+        type=pathlib.Path,
+        metavar="FILE",
+        nargs="+",
+        required=True,
+        help="Input file containing the initial values of fitting parameters",
+    )
+
+    parser.add_argument(
+        "-o",
+        dest="out_dir",
+        type=pathlib.Path,
+        metavar="DIR",
+        default="./Output",
+        help="Directory for output files",
+    )
+
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument(
+        "+r",
+        dest="res_incl",
+        metavar="ID",
+        nargs="+",
+        help="residue(s) to include in the fit",
+    )
+    selection.add_argument(
+        "-r",
+        dest="res_excl",
+        metavar="ID",
+        nargs="+",
+        help="residue(s) to exclude from the fit",
+    )
+
+
 def get_description_from_doc(doc):
     return doc.strip().splitlines()[0]
 
@@ -1,6 +1,5 @@
 """The dataset module contains the code for handling the experimental data."""
 import configparser
-import copy
 import importlib
 import operator
 import pathlib
@@ -8,8 +7,13 @@ import sys
 
 import numpy as np
 
+from chemex import cache
 from chemex import util
 from chemex.experiments.base import base_profile
+from chemex.spindynamics import basis
+
+# Number of MC or bootstrap replicates whose data are drawn at once
+REPLICATE_BATCH = 64
 
 
 class DataSet:
@@ -18,9 +22,11 @@ class DataSet:
     def __init__(self, other=None):
         self.datasets = []
         self.chisq_ref = 1e32
+        self.seed = None
+        self._columns = None
 
         if isinstance(other, DataSet):
-            self.datasets = copy.deepcopy(other.datasets)
+            self.datasets = [profile.make_replica() for profile in other.datasets]
 
         elif isinstance(other, base_profile.BaseProfile):
             self.datasets.append(other)
@@ -57,15 +63,28 @@ class DataSet:
             raise TypeError
         self.datasets.append(profile)
 
+    @property
+    def columns(self):
+        """Columnar store of the data of the profiles, built again when the
+        profiles, their data or their masks change."""
+
+        if self._columns is None or not self._columns.is_current(self.datasets):
+            self._columns = Columns(self.datasets)
+
+        return self._columns
+
     def calculate_residuals(self, params, verbose=True, threshold=1e-3):
         """Calculate the residuals."""
 
-        residuals = np.concatenate(
-            [profile.calculate_residuals(params) for profile in self.datasets]
-        )
+        columns = self.columns
+
+        for profile, a_slice in zip(self.datasets, columns.slices):
+            columns.values[a_slice] = profile.calculate_unscaled_values(params)
+
+        residuals = columns.calculate_residuals()
 
         if verbose:
-            chisq = sum(residuals ** 2)
+            chisq = residuals.dot(residuals)
 
             change = (chisq - self.chisq_ref) / self.chisq_ref
 
@@ -77,7 +96,33 @@ class DataSet:
 
                 self.chisq_ref = chisq
 
-        return residuals
+        # The minimizers keep the residuals of the previous steps, so the buffer
+        # itself can not be returned
+        return residuals.copy()
+
+    def calculate_residuals_batch(self, params_iter):
+        """Calculate the residuals for a batch of parameters.
+
+        'params_iter' is an iterable of parameters, possibly the same object
+        updated between the iterations (e.g., the points of a grid). The profiles
+        are calculated for all the parameters at once (see
+        'calculate_unscaled_profiles'). Returns a (G x nresiduals) array.
+
+        """
+
+        values = [[] for _ in self.datasets]
+
+        for params in params_iter:
+            for a_values, profile in zip(values, self.datasets):
+                a_values.append(profile.get_params_values(params))
+
+        columns = self.columns
+        batch = np.zeros((len(values[0]), columns.ndata))
+
+        for profile, a_slice, a_values in zip(self.datasets, columns.slices, values):
+            batch[:, a_slice] = profile.calculate_unscaled_profiles(a_values)
+
+        return columns.calculate_residuals_batch(batch)
 
     def write_to(self, params, path):
         """Write experimental and fitted profiles to a file."""
@@ -98,74 +143,120 @@ class DataSet:
                 for profile in sorted(data, key=operator.attrgetter("peak")):
                     f.write(profile.print_profile(params=params))
 
-    def add_dataset_from_file(self, filename, model=None):
-        """Add profiles from a file to the dataset."""
+    @property
+    def costs(self):
+        """Cost of the calculations of each profile (see BaseProfile.cost)."""
+        return [profile.cost for profile in self.datasets]
 
-        if model is None:
-            model = "2st.pb_kex"
+    def write_costs(self, path):
+        """Write the cost of the calculations of the profiles to a file.
 
-        print("{:<45s} ".format(str(filename)), end="")
+        Profiles are sorted by decreasing time spent calculating them, after a
+        summary of the cost per experiment. The use of the caches of the profiles
+        and propagators is given at the end.
 
-        # Parse the experiment configuration file
-        config = util.read_cfg_file(filename)
+        """
+        filename = path / "costs.fit"
 
-        try:
-            # Read the experiment information
-            details = dict(config.items("experiment"))
-            experiment_type = details["type"]
-            experiment_class = experiment_type.split(".")[0]
-
-            # Read the experimental parameters
-            details.update(
-                {
-                    key.lower(): val
-                    for key, val in config.items("experimental_parameters")
-                }
-            )
+        print(f"  * {filename}")
 
-            # Read the profile information (name, filename)
-            filenames = {key.lower(): val for key, val in config.items("data")}
+        costs = self.costs
+        summary = {}
 
-        except configparser.NoSectionError as error:
-            sys.exit(f"    Reading aborted: {error}")
+        for cost in costs:
+            total = summary.setdefault(
+                cost["experiment"],
+                {"profiles": 0, "size": cost["size"], "misses": 0, "time": 0.0},
+            )
+            total["profiles"] += 1
+            total["misses"] += cost["misses"]
+            total["time"] += cost["time"]
+
+        with open(filename, "w") as f:
+            f.write(
+                f"# {'EXPERIMENT':<40s} {'PROFILES':>8s} {'SIZE':>5s} "
+                f"{'MISSES':>8s} {'TIME (S)':>12s}\n"
+            )
 
-        except KeyError as error:
-            sys.exit(
-                "\nIn the section 'experiment' of {}, '{}' must be provided!".format(
-                    filename, error
+            for name, total in sorted(
+                summary.items(), key=lambda item: -item[1]["time"]
+            ):
+                f.write(
+                    f"  {name:<40s} {total['profiles']:8d} {total['size']:5d} "
+                    f"{total['misses']:8d} {total['time']:12.5e}\n"
                 )
+
+            f.write("\n")
+            f.write(
+                f"# {'EXPERIMENT':<40s} {'PROFILE':<15s} {'NDATA':>5s} "
+                f"{'SIZE':>5s} {'CALLS':>8s} {'HITS':>8s} {'MISSES':>8s} "
+                f"{'PROPAGATORS':>12s} {'TIME (S)':>12s} {'TIME/MISS (S)':>13s}\n"
             )
 
-        try:
-            # Read (optional) additional parameters
-            details.update(
-                {key.lower(): val for key, val in config.items("extra_parameters")}
+            for cost in sorted(costs, key=lambda item: -item["time"]):
+                time_per_miss = cost["time"] / max(cost["misses"], 1)
+                f.write(
+                    f"  {cost['experiment']:<40s} {cost['name'].upper():<15s} "
+                    f"{cost['ndata']:5d} {cost['size']:5d} {cost['calls']:8d} "
+                    f"{cost['hits']:8d} {cost['misses']:8d} "
+                    f"{cost['propagators']:12d} {cost['time']:12.5e} "
+                    f"{time_per_miss:13.5e}\n"
+                )
+
+            f.write("\n")
+            f.write(
+                f"# {'CACHE':<40s} {'HITS':>8s} {'MISSES':>8s} {'ENTRIES':>8s} "
+                f"{'MEMORY (MB)':>12s} {'BUDGET (MB)':>12s}\n"
             )
 
-        except configparser.NoSectionError:
-            pass
+            caches = {
+                "profiles": cache.profiles,
+                "propagators": basis.Liouvillian.propagator_cache,
+            }
+
+            for name, a_cache in caches.items():
+                f.write(
+                    f"  {name:<40s} {a_cache.hits:8d} {a_cache.misses:8d} "
+                    f"{len(a_cache):8d} {a_cache.nbytes / 2 ** 20:12.3f} "
+                    f"{a_cache.maxbytes / 2 ** 20:12.3f}\n"
+                )
+
+    def add_dataset_from_file(self, filename, model=None):
+        """Add profiles from a file to the dataset."""
+
+        print("{:<45s} ".format(str(filename)), end="")
+
+        # Parse the experiment configuration file
+        config = util.read_cfg_file(filename)
+        details, filenames = read_details(config, filename)
 
         working_dir = filename.parent
         path = pathlib.Path(details.get("path", "."))
         path = util.normalize_path(working_dir, path)
 
-        try:
-            reading = importlib.import_module(
-                ".".join(["chemex.experiments", experiment_class, "reading"])
-            )
+        reading = get_reading_module(details["type"], filename)
+        profiles = reading.read_profiles(path, filenames, details, get_model(model))
 
-        except ImportError:
-            sys.exit(
-                "The experiment '{}', referred in '{}' is not implemented.".format(
-                    experiment_type, filename
-                )
-            )
+        self.datasets.extend(profiles)
 
-        profiles = reading.read_profiles(path, filenames, details, model)
+        print("{:<25s} {:<25d}".format(details["type"], len(profiles)))
 
-        self.datasets.extend(profiles)
+        return profiles
+
+    def add_dataset_from_arrays(self, config, arrays, model=None):
+        """Add profiles to the dataset from the experiment configuration (a
+        dictionary of sections, as in the experiment files) and the data of the
+        profiles (a dictionary of arrays with the columns of the data files,
+        indexed by the profile names), without reading any file."""
+
+        config = util.read_cfg_file(config)
+        details, _ = read_details(config, "the experiment configuration", False)
+        arrays = {name.lower(): values for name, values in arrays.items()}
 
-        print("{:<25s} {:<25d}".format(experiment_type, len(profiles)))
+        reading = get_reading_module(details["type"], "the experiment configuration")
+        profiles = reading.create_profiles(arrays, details, get_model(model))
+
+        self.datasets.extend(profiles)
 
         return profiles
 
@@ -192,25 +283,256 @@ class DataSet:
 
         self.datasets = datasets_new
 
-    def make_bs_dataset(self):
+    def make_bs_dataset(self, seed=None):
         """Create a new dataset to run a bootstrap simulation."""
+        return next(self.iter_bs_datasets(1, seed))
 
-        data_bs = DataSet()
+    def make_mc_dataset(self, params, seed=None):
+        """Create a new dataset to run a Monte-Carlo simulation."""
+        return next(self.iter_mc_datasets(params, 1, seed))
 
-        for profile in self.datasets:
-            data_bs.append(profile.make_bs_profile())
+    def iter_mc_datasets(self, params, nreplicates, seed=None):
+        """Generate lazily the datasets of 'nreplicates' Monte-Carlo simulations.
 
-        return data_bs
+        The profiles calculated with 'params' are calculated once. The noise of
+        the replicates is drawn in batches over the whole dataset from a numpy
+        Generator seeded with 'seed'. The replicate of index 'i' only depends on
+        'seed' and 'i'.
 
-    def make_mc_dataset(self, params):
-        """Create a new dataset to run a Monte-Carlo simulation."""
+        """
+
+        columns = self.columns
+        generator = np.random.default_rng(seed)
 
-        data_mc = DataSet()
+        calculated = np.zeros(columns.ndata)
+        for profile, a_slice in zip(self.datasets, columns.slices):
+            calculated[a_slice] = profile.calculate_profile(params)
+
+        for start in range(0, nreplicates, REPLICATE_BATCH):
+            size = min(REPLICATE_BATCH, nreplicates - start)
+            noise = generator.standard_normal((size, columns.ndata)) * columns.error
+            intensities = calculated + noise
+
+            for index, intensity in enumerate(intensities, start):
+                data_mc = DataSet()
+                data_mc.seed = (seed, index)
+
+                for profile, a_slice in zip(self.datasets, columns.slices):
+                    data_mc.append(
+                        profile.make_mc_replica(intensity[a_slice], data_mc.seed)
+                    )
+
+                yield data_mc
+
+    def iter_bs_datasets(self, nreplicates, seed=None):
+        """Generate lazily the datasets of 'nreplicates' bootstrap simulations.
+
+        The indexes of the resampled points are drawn in batches over the whole
+        dataset from a numpy Generator seeded with 'seed'. The replicate of
+        index 'i' only depends on 'seed' and 'i'.
+
+        """
+
+        columns = self.columns
+        generator = np.random.default_rng(seed)
+
+        # Each point is drawn from the pool (reference or other points of the
+        # same profile) it belongs to
+        pools = [
+            pool + a_slice.start
+            for profile, a_slice in zip(self.datasets, columns.slices)
+            for pool in profile.get_bs_pools()
+        ]
+        members = np.concatenate(pools) if pools else np.zeros(0, dtype=int)
+        sizes = np.array([pool.size for pool in pools], dtype=int)
+        starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        sizes = np.repeat(sizes, sizes)
+
+        for start in range(0, nreplicates, REPLICATE_BATCH):
+            size = min(REPLICATE_BATCH, nreplicates - start)
+            draws = generator.integers(sizes, size=(size, sizes.size))
+            bs_indexes = np.sort(members[starts + draws], axis=1)
+
+            for index, a_bs_indexes in enumerate(bs_indexes, start):
+                data_bs = DataSet()
+                data_bs.seed = (seed, index)
+
+                for profile, a_slice in zip(self.datasets, columns.slices):
+                    data_bs.append(
+                        profile.make_bs_replica(
+                            a_bs_indexes[a_slice] - a_slice.start, data_bs.seed
+                        )
+                    )
+
+                yield data_bs
+
+
+class Columns:
+    """Columnar store of the data of a list of profiles.
+
+    The intensities, errors and masks of all the profiles are stored in
+    contiguous arrays, with one slice per profile. The profiles use views into
+    these arrays for their weights, and the scaling factors and residuals of
+    all the profiles are calculated at once from the unscaled values, which
+    are stored in 'values'.
+
+    """
+
+    def __init__(self, profiles):
+        self._refs = [(profile.data, profile.mask) for profile in profiles]
+
+        sizes = [len(profile) for profile in profiles]
+        ends = np.cumsum(sizes, dtype=int)
+        self.ndata = int(sum(sizes))
+        self.slices = [
+            slice(end - size, end) for size, end in zip(sizes, ends.tolist())
+        ]
+        self.labels = np.repeat(np.arange(len(profiles)), sizes)
+
+        self.intensity = np.zeros(self.ndata)
+        self.error = np.ones(self.ndata)
+        self.mask = np.zeros(self.ndata, dtype=bool)
+
+        for profile, a_slice in zip(profiles, self.slices):
+            self.intensity[a_slice] = profile.data["intensity"]
+            self.error[a_slice] = profile.data["error"]
+            self.mask[a_slice] = profile.mask
+
+        self.weights = 1.0 / self.error
+        self.intensities = self.intensity * self.weights
+        self.indexes = np.flatnonzero(self.mask)
+        self.labels_masked = self.labels[self.indexes]
+        self.intensities_masked = self.intensities[self.indexes]
+
+        sizes_masked = [np.count_nonzero(profile.mask) for profile in profiles]
+        ends_masked = np.cumsum(sizes_masked, dtype=int).tolist()
+
+        for profile, a_slice, size, end in zip(
+            profiles, self.slices, sizes_masked, ends_masked
+        ):
+            profile.set_weights(
+                self.weights[a_slice],
+                self.intensities[a_slice],
+                self.intensities_masked[end - size : end],
+            )
+
+        self.values = np.zeros(self.ndata)
+        self.residuals = np.zeros(self.indexes.size)
+
+    def is_current(self, profiles):
+        """Check that the store was built from the given profiles."""
+        return len(profiles) == len(self._refs) and all(
+            profile.data is data and profile.mask is mask
+            for profile, (data, mask) in zip(profiles, self._refs)
+        )
+
+    def calculate_scales(self):
+        """Calculate the scaling factors minimizing the chi2 of each profile."""
+
+        weighted = self.values * self.weights
+        nprofiles = len(self.slices)
+        norms = np.bincount(self.labels, weighted * weighted, nprofiles)
+        dots = np.bincount(self.labels, weighted * self.intensities, nprofiles)
+        scales = np.divide(dots, norms, out=np.zeros(nprofiles), where=norms != 0)
+
+        return scales, weighted
+
+    def calculate_residuals(self):
+        """Calculate the residuals of all the profiles from 'values'."""
+
+        scales, weighted = self.calculate_scales()
+
+        residuals = np.multiply(
+            scales[self.labels_masked], weighted[self.indexes], out=self.residuals
+        )
+        np.subtract(self.intensities_masked, residuals, out=residuals)
+
+        return residuals
+
+    def calculate_residuals_batch(self, values):
+        """Calculate the residuals of all the profiles for a batch of unscaled
+        values (G x ndata)."""
+
+        weighted = values * self.weights
+        nprofiles = len(self.slices)
+        size = len(values) * nprofiles
+        labels = (np.arange(0, size, nprofiles)[:, np.newaxis] + self.labels).ravel()
+        norms = np.bincount(labels, (weighted * weighted).ravel(), size)
+        dots = np.bincount(labels, (weighted * self.intensities).ravel(), size)
+        scales = np.divide(dots, norms, out=np.zeros(size), where=norms != 0)
+        scales = scales.reshape(len(values), nprofiles)
+
+        residuals = scales[:, self.labels_masked] * weighted[:, self.indexes]
+
+        return self.intensities_masked - residuals
 
-        for profile in self.datasets:
-            data_mc.append(profile.make_mc_profile(params=params))
 
-        return data_mc
+def get_model(model=None):
+    if model is None:
+        model = "2st.pb_kex"
+    return model
+
+
+def read_details(config, filename, with_data=True):
+    """Return the experiment details and the file names of the profiles from an
+    experiment configuration."""
+
+    try:
+        # Read the experiment information
+        details = dict(config.items("experiment"))
+
+        if "type" not in details:
+            raise KeyError("type")
+
+        # Read the experimental parameters
+        details.update(
+            {key.lower(): val for key, val in config.items("experimental_parameters")}
+        )
+
+        # Read the profile information (name, filename)
+        if with_data:
+            filenames = {key.lower(): val for key, val in config.items("data")}
+        else:
+            filenames = {}
+
+    except configparser.NoSectionError as error:
+        sys.exit(f"    Reading aborted: {error}")
+
+    except KeyError as error:
+        sys.exit(
+            "\nIn the section 'experiment' of {}, '{}' must be provided!".format(
+                filename, error
+            )
+        )
+
+    try:
+        # Read (optional) additional parameters
+        details.update(
+            {key.lower(): val for key, val in config.items("extra_parameters")}
+        )
+
+    except configparser.NoSectionError:
+        pass
+
+    return details, filenames
+
+
+def get_reading_module(experiment_type, filename):
+    """Import the module reading the profiles of the experiment."""
+
+    experiment_class = experiment_type.split(".")[0]
+
+    try:
+        return importlib.import_module(
+            ".".join(["chemex.experiments", experiment_class, "reading"])
+        )
+
+    except ImportError:
+        sys.exit(
+            "The experiment '{}', referred in '{}' is not implemented.".format(
+                experiment_type, filename
+            )
+        )
 
 
 def read_data(filenames=None, model=None):
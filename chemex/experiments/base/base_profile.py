@@ -1,11 +1,13 @@
 """TODO: module docstring."""
 import abc
 import copy
-from functools import lru_cache
+import time
+import uuid
 
 import numpy as np
 from numpy.lib import recfunctions as rfn
 
+from chemex import cache
 from chemex import peaks
 from chemex.spindynamics import basis
 from chemex.spindynamics import default
@@ -25,6 +27,8 @@ class BaseProfile(metaclass=abc.ABCMeta):
     SPIN_SYSTEM = None
     CONSTRAINTS = None
     EQUILIBRIUM = False
+    # Whether '_calculate_unscaled_profile' accepts arrays of parameter values
+    BATCHED = False
     DTYPE = [("par", "f8"), ("intensity", "f8"), ("error", "f8")]
 
     def __init__(self, name=None, data=None, exp_details=None, model=None):
@@ -63,9 +67,11 @@ class BaseProfile(metaclass=abc.ABCMeta):
             constraints=self.CONSTRAINTS,
         )
 
-        self.calculate_unscaled_profile = lru_cache(256)(
-            self._calculate_unscaled_profile
-        )
+        self.counters = make_counters()
+        self.seed = None
+
+        # Identifies the profile in the cache of the calculated profiles
+        self.cache_key = uuid.uuid4().bytes
 
     def __len__(self):
         return self.data.size
@@ -75,35 +81,167 @@ class BaseProfile(metaclass=abc.ABCMeta):
     def reference(self):
         pass
 
-    def calculate_residuals(self, params):
-        """Calculate the residuals between the experimental and back-calculated
-        values."""
+    @property
+    def data(self):
+        return self._data
 
-        values = self.calculate_profile(params)
-        residuals = (self.data["intensity"] - values) / self.data["error"]
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._weights = None
 
-        return residuals[self.mask]
+    @property
+    def mask(self):
+        return self._mask
+
+    @mask.setter
+    def mask(self, value):
+        self._mask = value
+        self._weights = None
+
+    def _get_weights(self):
+        """Return the inverse errors, the weighted intensities and the indexes
+        of the points that are not masked. They are calculated on first use and
+        reset when the data or the mask are set."""
+
+        if self._weights is None:
+            weights = 1.0 / self.data["error"]
+            intensities = self.data["intensity"] * weights
+            indexes = np.flatnonzero(self.mask)
+            self._weights = {
+                "weights": weights,
+                "intensities": intensities,
+                "indexes": indexes,
+                "intensities_masked": intensities[indexes],
+            }
+
+        return self._weights
+
+    def set_weights(self, weights, intensities, intensities_masked):
+        """Use the given inverse errors and weighted intensities (e.g., views into
+        the columns of a dataset) instead of calculating them."""
+        self._weights = {
+            "weights": weights,
+            "intensities": intensities,
+            "indexes": np.flatnonzero(self.mask),
+            "intensities_masked": intensities_masked,
+        }
 
     def calculate_profile(self, params=None, **kwargs):
         """Calculate the CEST profile."""
-        params_local = tuple(
+
+        values = self.calculate_unscaled_values(params)
+        scale = self._calculate_scale(values * self._get_weights()["weights"])
+
+        if kwargs:
+            values = self._calculate_unscaled_profile(
+                self._get_params_local(params), **kwargs
+            )
+
+        return values * scale
+
+    def _get_params_local(self, params):
+        return tuple(
             (name_s, params[name_l].value) for name_s, name_l in self.map_names.items()
         )
 
-        values = self.calculate_unscaled_profile(params_local)
+    def get_params_values(self, params):
+        """Return the values of the parameters of the profile, in the order of
+        'map_names'."""
+        return np.array([params[name_l].value for name_l in self.map_names.values()])
 
-        try:
-            scale = sum(
-                values * self.data["intensity"] / self.data["error"] ** 2
-            ) / sum((values / self.data["error"]) ** 2)
+    def calculate_unscaled_values(self, params):
+        """Calculate the unscaled profile for the parameters 'params'."""
+        self.counters["calls"] += 1
+        return self.calculate_unscaled_profile(self._get_params_local(params))
 
-        except ZeroDivisionError:
-            scale = 0.0
+    def _calculate_scale(self, values):
+        """Calculate the scaling factor minimizing the chi2, 'values' being the
+        unscaled profile divided by the errors."""
+        norm = values.dot(values)
 
-        if kwargs:
-            values = self._calculate_unscaled_profile(params_local, **kwargs)
+        if not norm:
+            return 0.0
 
-        return values * scale
+        return values.dot(self._get_weights()["intensities"]) / norm
+
+    def calculate_unscaled_profile(self, params_local):
+        """Calculate the unscaled profile, or get it from the cache shared by all
+        the profiles."""
+        key = cache.make_key(
+            self.cache_key, np.array([value for _, value in params_local])
+        )
+        values = cache.profiles.get(key)
+
+        if values is None:
+            values = self._compute_unscaled_profile(params_local)
+            cache.profiles.put(key, values)
+
+        return values
+
+    def calculate_unscaled_profiles(self, values):
+        """Calculate the unscaled profiles for a batch of G sets of parameter
+        values.
+
+        'values' is a (G x P) array with the values of the parameters in the order
+        of 'map_names' (see 'get_params_values'). Returns a (G x n) array. The
+        experiments with 'BATCHED' set calculate all the profiles at once, with a
+        stack of G Liouvillians; the others calculate them one at a time.
+
+        """
+        names = list(self.map_names)
+        values = np.asarray(values, dtype=float).reshape(-1, len(names))
+        self.counters["calls"] += len(values)
+
+        if not self.BATCHED:
+            profiles = [
+                self.calculate_unscaled_profile(tuple(zip(names, row)))
+                for row in values
+            ]
+            return np.asarray(profiles).reshape(len(values), -1)
+
+        profiles = self._compute_unscaled_profile(tuple(zip(names, values.T)))
+        self.counters["misses"] += len(values) - 1
+
+        return profiles.reshape(-1, len(values)).T
+
+    def _compute_unscaled_profile(self, params_local):
+        """Calculate the unscaled profile and keep track of the cost of the
+        calculation."""
+        propagator_count = self.liouv.propagator_count
+        start = time.perf_counter()
+
+        values = self._calculate_unscaled_profile(params_local)
+
+        self.counters["time"] += time.perf_counter() - start
+        self.counters["misses"] += 1
+        self.counters["propagators"] += self.liouv.propagator_count - propagator_count
+
+        return values
+
+    @property
+    def cost(self):
+        """Cost of the calculations of the profile.
+
+        - calls: number of profile calculations
+        - hits/misses: number of calculations taken from/added to the cache
+        - time: cumulative time spent calculating the profile (in seconds)
+        - size: dimension of the Liouvillian
+        - propagators: number of propagators calculated
+
+        """
+        counters = self.counters
+        return {
+            "experiment": self.experiment_name,
+            "name": self.name,
+            "ndata": len(self),
+            "size": self.liouv.size,
+            "calls": counters["calls"],
+            "hits": counters["calls"] - counters["misses"],
+            "misses": counters["misses"],
+            "time": counters["time"],
+            "propagators": counters["propagators"],
+        }
 
     @abc.abstractmethod
     def _calculate_unscaled_profile(self, params_local, **kwargs):
@@ -120,38 +258,84 @@ class BaseProfile(metaclass=abc.ABCMeta):
         """TODO: method docstring."""
         pass
 
-    def make_mc_profile(self, params):
-        """Make a profile for MC analysis."""
+    def make_replica(self, data=None, mask=None, cache_key=None, seed=None):
+        """Make a lightweight copy of the profile (e.g., for MC and bootstrap
+        analyses).
 
-        profile = copy.copy(self)
-        profile.data["intensity"] = (
-            self.calculate_profile(params)
-            + np.random.randn(len(self.data["intensity"])) * self.data["error"]
-        )
+        The replica shares the Liouvillian, the parameters and the data of the
+        profile. The data and the mask of a profile are never modified in place,
+        only replaced, so the replica gets its own arrays only when 'data' or
+        'mask' are given. 'seed' is the seed used to generate the data of the
+        replica, if any.
+
+        """
+
+        replica = copy.copy(self)
+        replica.counters = make_counters()
+        replica.seed = seed
+
+        if data is not None:
+            replica.data = data
+
+        if mask is not None:
+            replica.mask = mask
 
-        return profile
+        if cache_key is not None:
+            replica.cache_key = cache_key
 
-    def make_bs_profile(self):
+        return replica
+
+    def make_mc_profile(self, params, noise=None, seed=None):
+        """Make a profile for MC analysis. If not provided, the noise added to the
+        calculated profile is drawn from the errors."""
+
+        if noise is None:
+            generator = np.random.default_rng(seed)
+            noise = generator.standard_normal(len(self)) * self.data["error"]
+
+        return self.make_mc_replica(self.calculate_profile(params) + noise, seed)
+
+    def make_mc_replica(self, intensity, seed=None):
+        """Make a replica of the profile with the intensities 'intensity'."""
+
+        data = self.data.copy()
+        data["intensity"] = intensity
+
+        return self.make_replica(data=data, seed=seed)
+
+    def make_bs_profile(self, seed=None):
         """Make a profile for boostrap analysis."""
 
-        indexes = np.array(range(len(self.data["intensity"])))
-        pool1 = indexes[self.reference]
-        pool2 = indexes[~self.reference]
+        generator = np.random.default_rng(seed)
 
         bs_indexes = []
-        if pool1.size:
-            bs_indexes.extend(np.random.choice(pool1, len(pool1)))
-        bs_indexes.extend(np.random.choice(pool2, len(pool2)))
+        for pool in self.get_bs_pools():
+            bs_indexes.extend(generator.choice(pool, len(pool)))
+
+        return self.make_bs_replica(np.sort(np.array(bs_indexes, dtype=int)), seed)
 
-        bs_indexes = sorted(bs_indexes)
+    def make_bs_replica(self, bs_indexes, seed=None):
+        """Make a replica of the profile with the points 'bs_indexes'."""
 
-        profile = copy.copy(self)
-        profile.data = self.data[bs_indexes]
-        profile.calculate_unscaled_profile = lru_cache(256)(
-            profile._calculate_unscaled_profile
+        return self.make_replica(
+            data=self.data[bs_indexes],
+            mask=self.mask[bs_indexes],
+            cache_key=cache.make_key(self.cache_key, bs_indexes),
+            seed=seed,
         )
 
-        return profile
+    def get_bs_pools(self):
+        """Return the indexes of the points among which the points of a
+        bootstrap profile are drawn (reference and other points are resampled
+        separately)."""
+
+        indexes = np.arange(len(self))
+
+        return [
+            pool
+            for pool in (indexes[self.reference], indexes[~self.reference])
+            if pool.size
+        ]
 
     def normalize_profile(self, params=None):
 
@@ -221,3 +405,8 @@ class BaseProfile(metaclass=abc.ABCMeta):
             raise ValueError("Not a boolean: %s" % value)
 
         return BOOLEAN_STATES[value.lower()]
+
+
+def make_counters():
+    """Create the counters used to keep track of the cost of the calculations."""
+    return {"calls": 0, "misses": 0, "time": 0.0, "propagators": 0}
@@ -74,14 +74,24 @@ def plot_results_brute(result, best_vals=True, varlabels=None, output="results_b
     """Visualize the result of the brute force grid search.
 
     The output file will display the chi-square value per parameter and contour
-    plots for all combination of two parameters.
+    plots for all combination of two parameters. The values shown are the
+    minima of the chi-square over the other parameters, as recorded by the grid
+    search ('result.brute_minima'). Nothing is plotted when no grid point has
+    a finite chi-square.
 
     Inspired by the `corner` package (https://github.com/dfm/corner.py).
 
     """
+    if not any(np.isfinite(minima).any() for minima in result.brute_minima.values()):
+        print("  * No finite chi-square on the grid: the grid search is not plotted")
+        return
+
     npars = len(result.var_names)
     _, axes = plt.subplots(npars, npars)
 
+    grid = result.brute_axes
+    minima = result.brute_minima
+
     if not varlabels:
         varlabels = result.var_names
     if best_vals and isinstance(best_vals, bool):
@@ -92,7 +102,7 @@ def plot_results_brute(result, best_vals=True, varlabels=None, output="results_b
 
             # parameter vs chi2 in case of only one parameter
             if npars == 1:
-                axes.plot(result.brute_grid, result.brute_Jout, "o", ms=3)
+                axes.plot(grid[i], minima[(i,)], "o", ms=3)
                 axes.set_ylabel(r"$\chi^{2}$")
                 axes.set_xlabel(varlabels[i])
                 if best_vals:
@@ -103,13 +113,7 @@ def plot_results_brute(result, best_vals=True, varlabels=None, output="results_b
                 if i == 0:
                     axes[0, 0].axis("off")
                 axis = axes[i, j + 1]
-                red_axis = tuple([a for a in range(npars) if a != i])
-                axis.plot(
-                    np.unique(result.brute_grid[i]),
-                    np.minimum.reduce(result.brute_Jout, axis=red_axis),
-                    "o",
-                    ms=3,
-                )
+                axis.plot(grid[i], minima[(i,)], "o", ms=3)
                 axis.set_ylabel(r"$\chi^{2}$")
                 axis.yaxis.set_label_position("right")
                 axis.yaxis.set_ticks_position("right")
@@ -120,13 +124,7 @@ def plot_results_brute(result, best_vals=True, varlabels=None, output="results_b
             # parameter vs chi2 profile on the left
             elif j == 0 and i > 0:
                 axis = axes[i, j]
-                red_axis = tuple([a for a in range(npars) if a != i])
-                axis.plot(
-                    np.minimum.reduce(result.brute_Jout, axis=red_axis),
-                    np.unique(result.brute_grid[i]),
-                    "o",
-                    ms=3,
-                )
+                axis.plot(minima[(i,)], grid[i], "o", ms=3)
                 axis.invert_xaxis()
                 axis.set_ylabel(varlabels[i])
                 if i != npars - 1:
@@ -139,30 +137,14 @@ def plot_results_brute(result, best_vals=True, varlabels=None, output="results_b
             # contour plots for all combinations of two parameters
             elif j > i:
                 axis = axes[j, i + 1]
-                red_axis = tuple([a for a in range(npars) if a != i and a != j])
-                X, Y = np.meshgrid(
-                    np.unique(result.brute_grid[i]), np.unique(result.brute_grid[j])
-                )
-                lvls1 = np.linspace(
-                    result.brute_Jout.min(),
-                    np.median(result.brute_Jout) / 2.0,
-                    7,
-                    dtype="int",
-                )
-                lvls2 = np.linspace(
-                    np.median(result.brute_Jout) / 2.0,
-                    np.median(result.brute_Jout),
-                    3,
-                    dtype="int",
-                )
+                surface = minima[(i, j)]
+                finite = surface[np.isfinite(surface)]
+                lowest, median = finite.min(), np.median(finite)
+                X, Y = np.meshgrid(grid[i], grid[j])
+                lvls1 = np.linspace(lowest, median / 2.0, 7, dtype="int")
+                lvls2 = np.linspace(median / 2.0, median, 3, dtype="int")
                 lvls = np.unique(np.concatenate((lvls1, lvls2)))
-                axis.contourf(
-                    X.T,
-                    Y.T,
-                    np.minimum.reduce(result.brute_Jout, axis=red_axis),
-                    lvls,
-                    norm=LogNorm(),
-                )
+                axis.contourf(X.T, Y.T, surface, lvls, norm=LogNorm())
                 axis.set_yticks([])
                 if best_vals:
                     axis.axvline(best_vals[par1].value, ls="dashed", color="r")
@@ -176,3 +158,35 @@ def plot_results_brute(result, best_vals=True, varlabels=None, output="results_b
                     axes[i, j].axis("off")
 
     plt.savefig(f"{output}")
+    print(f"  * {output}")
+
+
+def plot_scan(axes, chisqrs, labels, levels, output="scan.pdf"):
+    """Plot the increase of the chi-square along the scanned parameters, with
+    the thresholds of the confidence regions ('levels')."""
+
+    delta = chisqrs - chisqrs.min()
+    _, axis = plt.subplots()
+
+    if len(axes) == 1:
+        finite = np.isfinite(delta)
+        axis.plot(axes[0][finite], delta[finite], "o-", ms=3)
+        for level in levels:
+            axis.axhline(level, ls="dashed", color="r")
+        axis.set_xlabel(labels[0])
+        axis.set_ylabel(r"$\Delta\chi^{2}$")
+
+    else:
+        finite = delta[np.isfinite(delta)]
+        X, Y = np.meshgrid(axes[0], axes[1], indexing="ij")
+        top = max(np.median(finite), 2.0 * max(levels))
+        filled = axis.contourf(X, Y, np.minimum(delta, top), 20)
+        plt.colorbar(filled, ax=axis, label=r"$\Delta\chi^{2}$")
+        axis.contour(X, Y, delta, sorted(levels), colors="r", linestyles="dashed")
+        best = np.unravel_index(np.argmin(delta), delta.shape)
+        axis.plot(axes[0][best[0]], axes[1][best[1]], "rs", ms=3)
+        axis.set_xlabel(labels[0])
+        axis.set_ylabel(labels[1])
+
+    plt.savefig(f"{output}")
+    plt.close()
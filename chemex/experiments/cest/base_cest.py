@@ -9,6 +9,7 @@ from scipy import stats
 from chemex.experiments.base import plotting as pl
 from chemex.experiments.base.base_profile import BaseProfile
 from chemex.experiments.cest import plotting as plc
+from chemex.spindynamics import basis
 from chemex.spindynamics import constants
 
 _EXP_DETAILS = {
@@ -16,7 +17,7 @@ _EXP_DETAILS = {
     "time_t1": {"type": float},
     "b1_frq": {"type": float},
     "b1_inh": {"default": np.inf, "type": float},
-    "b1_inh_res": {"default": 11, "type": int},
+    "b1_inh_res": {"default": None, "type": int},
     "cn_label": {"default": False, "type": bool},
     "filter_offsets": {"default": 0.0, "type": float},
     "filter_bandwidths": {"default": 0.0, "type": float},
@@ -28,6 +29,7 @@ class ProfileCEST(BaseProfile):
 
     EXP_DETAILS = dict(**BaseProfile.EXP_DETAILS, **_EXP_DETAILS)
     DTYPE = [("offsets", "f8"), ("intensity", "f8"), ("error", "f8")]
+    BATCHED = True
 
     def __init__(self, name, data, exp_details, model):
         super().__init__(name, data, exp_details, model)
@@ -37,7 +39,11 @@ class ProfileCEST(BaseProfile):
 
         self.liouv.w1_i = 2 * np.pi * self.exp_details["b1_frq"]
         self.liouv.w1_i_inh = self.exp_details["b1_inh"]
-        self.liouv.w1_i_inh_res = self.exp_details["b1_inh_res"]
+        self.set_b1_inh_res(self.time_t1)
+
+        # Without B1 inhomogeneity, the magnetization components oscillating
+        # during the irradiation are considered fully dephased
+        self.dephasing = self.exp_details["b1_inh"] == np.inf
 
         self.carriers_i = self.offsets_to_ppm()
 
@@ -49,12 +55,28 @@ class ProfileCEST(BaseProfile):
             self.liouv.j_eff_i_weights = j_weights
 
         self.plot_data = plc.plot_data
-        self.dephasing = self.exp_details["b1_inh"] == np.inf
 
     @property
     def reference(self):
         return np.abs(self.data["offsets"]) >= 1.0e04
 
+    def set_b1_inh_res(self, time):
+        """Set the number of points of the B1 distribution: 'b1_inh_res' if
+        provided, else the number estimated from the spread of the nutation
+        angle over the distribution, for the B1 field 'liouv.w1_i' applied
+        during 'time'. The quadrature error of the estimate is kept in
+        'b1_inh_error' (None if 'b1_inh_res' is provided)."""
+
+        b1_inh_res = self.exp_details["b1_inh_res"]
+        self.b1_inh_error = None
+
+        if b1_inh_res is None:
+            b1_inh_res, self.b1_inh_error = basis.estimate_b1_inh_res(
+                self.liouv.w1_i, self.exp_details["b1_inh"], time
+            )
+
+        self.liouv.w1_i_inh_res = b1_inh_res
+
     def offsets_to_ppm(self, b1_offsets=None):
         """Convert B1 offset from Hz to ppm."""
 
@@ -13,6 +13,25 @@ Reference
 
 Sekhar, Rosenzweig, Bouvignies and Kay. PNAS (2016) 113:E2794-E2801
 
+
+Experimental parameters
+=======================
+  * h_larmor_frq (1H Larmor frequency, in MHz)
+  * temperature  (sample temperature, in Celsius)
+  * p_total      (optional: protein concentration, in M)
+  * l_total      (optional: ligand concentration, in M)
+  * time_t1      (CEST relaxation delay, in seconds)
+  * carrier      (position of the carrier during the CEST period, in ppm)
+  * b1_frq       (B1 radio-frequency field strength, in Hz)
+  * b1_inh       (B1 inhomogeneity expressed as a fraction of 'b1_inh'.
+                  If not set, a faster calculation takes place assuming
+                  full dephasing of the magnetization components that oscillate
+                  during the irradiation period.)
+  * b1_inh_res   (optional: number of points used to simulate B1 inhomogeneity,
+                  the larger the longer the calculation. If not set, it is
+                  chosen automatically from the B1 field, its inhomogeneity and
+                  the CEST relaxation delay.)
+
 """
 import numpy as np
 
@@ -23,7 +42,7 @@ EXP_DETAILS = {
     "time_t1": {"type": float},
     "b1_frq": {"type": float},
     "b1_inh": {"default": np.inf, "type": float},
-    "b1_inh_res": {"default": 11, "type": int},
+    "b1_inh_res": {"default": None, "type": int},
     "filter_offsets": {"default": 0.0, "type": float},
     "filter_bandwidths": {"default": 0.0, "type": float},
 }
@@ -71,17 +90,17 @@ class ProfileCESTHNAP(ProfileCEST):
         # As the CEST block is after t1 evolution, the excited state
         # magnetization is set to 0.
         mag0 = self.liouv.compute_mag_eq(params_local, term="2izsz")
-        mag0[6:] = 0.0
+        mag0[..., 6:, :] = 0.0
 
         profile = []
 
         for ref, carrier_i in zip(reference, carriers_i):
             self.liouv.carrier_i = carrier_i
             if not ref:
-                cest = self.liouv.pulse_i(self.time_t1, 0.0, self.dephasing)
+                mag = self.liouv.pulse_i_mag(mag0, self.time_t1, 0.0, self.dephasing)
             else:
-                cest = self.liouv.identity
-            mag = self.liouv.collapse(self.detect @ cest @ mag0)
+                mag = mag0
+            mag = self.liouv.collapse(self.detect @ mag)
             profile.append(mag)
 
         return np.asarray(profile)
@@ -12,6 +12,27 @@ reference:
 
 Bouvignies and Kay. J Phys Chem B (2012), 116:14311-7
 
+
+Experimental parameters
+-----------------------
+  * h_larmor_frq (1H Larmor frequency, in MHz)
+  * temperature  (sample temperature, in Celsius)
+  * p_total      (optional: protein concentration, in M)
+  * l_total      (optional: ligand concentration, in M)
+  * time_t1      (CEST relaxation delay, in seconds)
+  * carrier      (position of the carrier during the CEST period, in ppm)
+  * b1_frq       (B1 radio-frequency field strength, in Hz)
+  * carrier_dec  (position of the 1H carrier during the CEST period, in ppm)
+  * b1_frq_dec   (1H decoupling field strength, in Hz)
+  * b1_inh       (B1 inhomogeneity expressed as a fraction of 'b1_inh'.
+                  If not set, a faster calculation takes place assuming
+                  full dephasing of the magnetization components that oscillate
+                  during the irradiation period.)
+  * b1_inh_res   (optional: number of points used to simulate B1 inhomogeneity,
+                  the larger the longer the calculation. If not set, it is
+                  chosen automatically from the B1 field, its inhomogeneity and
+                  the CEST relaxation delay.)
+
 """
 import numpy as np
 
@@ -72,10 +93,12 @@ class ProfileCESTNIPHCW(ProfileCEST):
         for ref, carrier_i in zip(reference, carriers_i):
             self.liouv.carrier_i = carrier_i
             if not ref:
-                cest = self.liouv.pulse_is(self.time_t1, 0.0, 0.0, self.dephasing)
+                mag = self.liouv.pulse_is_mag(
+                    mag0, self.time_t1, 0.0, 0.0, self.dephasing
+                )
             else:
-                cest = self.liouv.identity
-            mag = self.liouv.collapse(self.detect @ cest @ mag0)
+                mag = mag0
+            mag = self.liouv.collapse(self.detect @ mag)
             profile.append(mag)
 
         return np.asarray(profile)
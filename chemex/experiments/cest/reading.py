@@ -2,22 +2,38 @@
 import numpy as np
 
 from chemex import experiments
+from chemex import util
 
 
 def read_profiles(path, filenames, details, model):
     """Read the CEST profiles."""
 
+    arrays = {
+        name: np.loadtxt(path / filename, ndmin=2)
+        for name, filename in filenames.items()
+    }
+
+    return create_profiles(arrays, details, model)
+
+
+def create_profiles(arrays, details, model):
+    """Create the CEST profiles from the arrays of their data (offsets,
+    intensities and errors)."""
+
     details["name"] = name_experiment(details)
     Profile = experiments.grab(details["type"])
-    dtype = [("offsets", "f8"), ("intensity", "f8"), ("error", "f8")]
 
     profiles = []
 
-    for name, filename in filenames.items():
-        full_path = path / filename
-        data = np.loadtxt(full_path, dtype=dtype)
+    for name, values in arrays.items():
+        data = util.to_structured(values, Profile.DTYPE)
         profiles.append(Profile(name, data, details, model))
 
+    # The B1 distribution is the same for all the profiles of the experiment
+    if profiles and profiles[0].b1_inh_error:
+        res, error = profiles[0].liouv.w1_i_inh_res, profiles[0].b1_inh_error
+        print(f"\nB1 inhomogeneity: {res} points (estimated error: {error:.1e})")
+
     error = details.get("error", "file")
 
     if error not in {"file", "scatter"}:
@@ -30,8 +30,10 @@ Experimental parameters
                   If not set, a faster calculation takes place assuming
                   full dephasing of the magnetization components that oscillate
                   during the irradiation period.)
-  * b1_inh_res   (number of points used to simulate B1 inhomogeneity, the larger
-                  the longer the calculation)
+  * b1_inh_res   (optional: number of points used to simulate B1 inhomogeneity,
+                  the larger the longer the calculation. If not set, it is
+                  chosen automatically from the B1 field, its inhomogeneity and
+                  the CEST relaxation delay.)
 
 
 Extra parameters
@@ -96,10 +98,10 @@ class ProfileCESTXIP(ProfileCEST):
         for ref, carrier_i in zip(reference, carriers_i):
             self.liouv.carrier_i = carrier_i
             if not ref:
-                cest = self.liouv.pulse_i(self.time_t1, 0.0, self.dephasing)
+                mag = self.liouv.pulse_i_mag(mag0, self.time_t1, 0.0, self.dephasing)
             else:
-                cest = self.liouv.identity
-            mag = self.liouv.collapse(self.detect @ cest @ mag0)
+                mag = mag0
+            mag = self.liouv.collapse(self.detect @ mag)
             profile.append(mag)
 
         return np.asarray(profile)
@@ -42,6 +42,9 @@ class ProfileCESTXIPDANTE(ProfileCEST):
         # Set the liouvillian
         self.liouv.w1_i = 2.0 * np.pi / (4.0 * pw90_dante)
 
+        # The B1 field is only applied during the DANTE pulses
+        self.set_b1_inh_res(self.ncyc_dante * self.pw_dante)
+
         # Set the row vector for detection
         self.detect = self.liouv.detect["iz_a"]
 
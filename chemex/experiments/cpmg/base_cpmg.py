@@ -1,12 +1,16 @@
 """The cpmg_profile module contains the code for handling CPMG profiles."""
 import numpy as np
 from matplotlib import pyplot as plt
+from scipy import stats
 
 from chemex.experiments.base import plotting as pl
 from chemex.experiments.base.base_profile import BaseProfile
 from chemex.experiments.cpmg import plotting
 
-_EXP_DETAILS1 = {"time_t2": {"type": float}}
+_EXP_DETAILS1 = {
+    "time_t2": {"type": float},
+    "r2_errors": {"default": "quantile", "type": str},
+}
 
 _EXP_DETAILS2 = {
     "carrier": {"type": float},
@@ -14,20 +18,29 @@ _EXP_DETAILS2 = {
     "time_equil": {"default": 0.0, "type": float},
 }
 
-np.random.seed(seed=0)
+R2_ERRORS = {"quantile", "delta", "mc"}
+# Number of samples of the Monte-Carlo propagation of the uncertainties, drawn
+# with a fixed seed so that the plots are reproducible
+MC_SAMPLES = 10000
+MC_SEED = 0
+
+# Quantile of the standard normal distribution matching the [15.9, 84.1]
+# percentile interval used for the uncertainties of the R2eff values
+Z_SCORE = stats.norm.ppf(0.841)
 
 
 class ProfileCPMG1(BaseProfile):
     """CPMGProfile class."""
 
-    RANDN = np.random.randn(10000, 1)
     EXP_DETAILS = dict(**BaseProfile.EXP_DETAILS, **_EXP_DETAILS1)
     DTYPE = [("ncycs", "i4"), ("intensity", "f8"), ("error", "f8")]
+    BATCHED = True
 
     def __init__(self, name, data, exp_details, model):
         super().__init__(name, data, exp_details, model)
 
         self.time_t2 = self.exp_details["time_t2"]
+        self.r2_errors = self.exp_details["r2_errors"].lower()
 
         # Set the delays
         ncycs = self.data["ncycs"][~self.reference]
@@ -229,20 +242,50 @@ class ProfileCPMG1(BaseProfile):
         profile_exp["r2"] = -np.log(ndata["intensity"]) / self.time_t2
         profile_fit["r2"] = -np.log(ndata["intensity_calc"]) / self.time_t2
 
-        # MC simulation to propagate the error
-        mag_ens = ndata["error"] * self.RANDN + ndata["intensity"]
-        r2_ens = np.empty_like(mag_ens)
-        neg_vals = mag_ens <= 0.0
-        r2_ens[~neg_vals] = -np.log(mag_ens[~neg_vals]) / self.time_t2
-        r2_ens[neg_vals] = np.inf
-        r2_ens -= profile_exp["r2"]
-        profile_exp["error"] = np.percentile(r2_ens, [15.9, 84.1], axis=0).transpose()
+        profile_exp["error"] = self._calculate_r2_errors(
+            ndata["intensity"], ndata["error"], profile_exp["r2"]
+        )
 
         profile_exp.sort(order="nu_cpmg")
         profile_fit.sort(order="nu_cpmg")
 
         return profile_exp, profile_fit
 
+    def _calculate_r2_errors(self, intensities, errors, r2s):
+        """Propagate the uncertainties of the normalized intensities to the R2eff
+        values.
+
+        Returns the lower (negative) and upper (positive) deviations from the
+        R2eff values, corresponding to the [15.9, 84.1] percentile interval.
+
+        - 'quantile': as R2eff is a monotonic function of the intensity, the
+          quantiles of R2eff are exactly the R2eff of the intensity quantiles
+        - 'delta': first-order (symmetric) propagation of the uncertainties
+        - 'mc': Monte-Carlo propagation of the uncertainties
+
+        """
+        if self.r2_errors == "mc":
+            randn = np.random.default_rng(MC_SEED).standard_normal((MC_SAMPLES, 1))
+            mag_ens = errors * randn + intensities
+            r2_ens = np.empty_like(mag_ens)
+            neg_vals = mag_ens <= 0.0
+            r2_ens[~neg_vals] = -np.log(mag_ens[~neg_vals]) / self.time_t2
+            r2_ens[neg_vals] = np.inf
+            r2_ens -= r2s
+            return np.percentile(r2_ens, [15.9, 84.1], axis=0).transpose()
+
+        if self.r2_errors == "delta":
+            r2_errors = Z_SCORE * errors / (abs(intensities) * self.time_t2)
+            return np.transpose([-r2_errors, r2_errors])
+
+        mags = intensities + Z_SCORE * np.array([[1.0], [-1.0]]) * errors
+        r2_ens = np.full_like(mags, np.inf)
+        pos_vals = mags > 0.0
+        r2_ens[pos_vals] = -np.log(mags[pos_vals]) / self.time_t2
+        r2_ens -= r2s
+
+        return r2_ens.transpose()
+
 
 class ProfileCPMG2(ProfileCPMG1):
     """CPMGProfile class."""
@@ -14,6 +14,19 @@ explicitly for analyzing the Lewis Kay pulse sequence:
 HtoC_CH3_exchange_*00_lek_ILV
 
 Journal of Biomolecular NMR (2007) 38, 79-88
+
+Extra parameters
+----------------
+
+  * path         (directory of the profiles)
+  * error        (= 'file': uncertainties are taken from the profile files
+                  = 'duplicates': uncertainties are calculated from duplicates)
+  * r2_errors    (propagation of the uncertainties to the R2eff values shown in
+                  the plots and written in the '.exp' files
+                  = 'quantile': exact transform of the intensity quantiles
+                  = 'delta': first-order (symmetric) propagation
+                  = 'mc': Monte-Carlo propagation)
+
 """
 import numpy as np
 from numpy import linalg as la
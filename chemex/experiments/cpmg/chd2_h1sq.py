@@ -20,6 +20,19 @@ Reference
 ---------
 
 Journal of the American Chemical Society (2010) 132, 10992-5
+
+Extra parameters
+----------------
+
+  * path         (directory of the profiles)
+  * error        (= 'file': uncertainties are taken from the profile files
+                  = 'duplicates': uncertainties are calculated from duplicates)
+  * r2_errors    (propagation of the uncertainties to the R2eff values shown in
+                  the plots and written in the '.exp' files
+                  = 'quantile': exact transform of the intensity quantiles
+                  = 'delta': first-order (symmetric) propagation
+                  = 'mc': Monte-Carlo propagation)
+
 """
 from chemex.experiments.cpmg import hn_ap
 
@@ -26,6 +26,18 @@ Reference
 
 Journal of Biomolecular NMR (2008) 42, 35-47
 
+Extra parameters
+----------------
+
+  * path         (directory of the profiles)
+  * error        (= 'file': uncertainties are taken from the profile files
+                  = 'duplicates': uncertainties are calculated from duplicates)
+  * r2_errors    (propagation of the uncertainties to the R2eff values shown in
+                  the plots and written in the '.exp' files
+                  = 'quantile': exact transform of the intensity quantiles
+                  = 'delta': first-order (symmetric) propagation
+                  = 'mc': Monte-Carlo propagation)
+
 """
 import numpy as np
 from numpy import linalg as la
@@ -2,21 +2,40 @@
 import numpy as np
 
 from chemex import experiments
+from chemex import util
+from chemex.experiments.cpmg import base_cpmg
 
 
 def read_profiles(path, filenames, details, model):
     """Read the CPMG profiles."""
 
+    arrays = {
+        name: np.loadtxt(path / filename, ndmin=2)
+        for name, filename in filenames.items()
+    }
+
+    return create_profiles(arrays, details, model)
+
+
+def create_profiles(arrays, details, model):
+    """Create the CPMG profiles from the arrays of their data (ncycs,
+    intensities and errors)."""
+
     details["name"] = name_experiment(details)
     Profile = experiments.grab(details["type"])
-    dtype = [("ncycs", "i4"), ("intensity", "f8"), ("error", "f8")]
+
+    r2_errors = details.get("r2_errors", "quantile").lower()
+
+    if r2_errors not in base_cpmg.R2_ERRORS:
+        print("Warning: The 'r2_errors' option should either be 'quantile', ")
+        print("'delta' or 'mc'. Using the default 'quantile' option.")
+        details["r2_errors"] = "quantile"
 
     profiles = []
 
-    for profile_name, filename in filenames.items():
-        full_path = path / filename
-        data = np.loadtxt(full_path, dtype=dtype)
-        profiles.append(Profile(profile_name, data, details, model))
+    for name, values in arrays.items():
+        data = util.to_structured(values, Profile.DTYPE)
+        profiles.append(Profile(name, data, details, model))
 
     error = details.get("error", "file")
 
@@ -1,11 +1,17 @@
 """The fitting module contains the code for fitting the experimental data."""
+import configparser
 import sys
 
 import lmfit
 from scipy import stats
 
+from chemex import alternating
+from chemex import brute
+from chemex import checkpoint as cp
 from chemex import datasets
+from chemex import multistart
 from chemex import parameters
+from chemex import timings as tm
 from chemex import util
 from chemex.cli import FITMETHODS
 
@@ -17,81 +23,245 @@ ALL_FITMETHODS.update(
         "brute": "grid search using the brute force method",
         "basinhopping": "basinhopping",
         "ampgo": "Adaptive Memory Programming for Global Optimization (AMPGO)",
+        "multistart": "local least-squares refinements from several starting points",
+        "alternating": "alternating local fits and global steps (block-coordinate)",
     }
 )
+# Methods providing the uncertainties of the parameters (the best minimum of the
+# 'multistart' method is refined with 'leastsq')
+METHODS_WITH_ERRORS = ("leastsq", "multistart", "alternating")
+# Methods run by the engines of ChemEx rather than by lmfit
+ENGINES = ("brute", "multistart", "alternating")
 ALLOWED_FITMETHODS = {
     name: desc for name, desc in ALL_FITMETHODS.items() if name in FITMETHODS
 }
 
 
-def run_fit(fit_filename, params, data, cl_fitmethod):
-    """Perform the fit."""
+def run_fit(
+    fit_filename,
+    params,
+    data,
+    cl_fitmethod,
+    timings=None,
+    workers=1,
+    seed=None,
+    checkpoint=None,
+):
+    """Perform the fit. 'workers' is the number of processes used by the
+    'brute' and 'multistart' methods, and 'seed' the seed of the starting
+    points of the 'multistart' method.
+
+    The progress is saved to 'checkpoint' after each cluster and section, and
+    the sections and clusters already finished in the checkpoint are skipped.
+    Once the time budget of 'checkpoint' is used up, the current minimization
+    is stopped and the remaining clusters and sections are skipped.
+
+    The 'maxfev' option of a section limits the number of function evaluations
+    of each cluster. With the 'brute', 'multistart' and 'alternating' methods,
+    it limits each local minimization, and no new grid chunk, starting point or
+    cycle is started once it is reached; these methods also check the time
+    budget between their steps.
+
+    """
     util.header1("Fit")
 
+    if timings is None:
+        timings = tm.Timings(enabled=False)
+
+    if checkpoint is None:
+        checkpoint = cp.Checkpoint()
+
     fit_config = util.read_cfg_file(fit_filename)
 
     if not fit_config.sections():
         fit_config.add_section("Standard Calculation")
 
-    for section in fit_config.sections():
+    minima = []
+
+    for index, section in enumerate(fit_config.sections(), 1):
         util.header2(section)
-        items = fit_config.items(section)
-        parameters.set_param_status(params, items)
-        clusters = find_independent_clusters(data, params)
-        fitmethod = fit_config.get(section, "fitmethod", fallback=cl_fitmethod)
-
-        if fitmethod not in ALLOWED_FITMETHODS.keys():
-            exit(
-                "The fitting method '{}', as specified in section ['{}'],"
-                "is invalid! Please choose from:\n  {}".format(
-                    fitmethod, section, list(sorted(ALLOWED_FITMETHODS.keys()))
+
+        section_key = f"{index}: {section.strip()}"
+
+        with timings.stage(section.strip()) as section_timings:
+            items = fit_config.items(section)
+            parameters.set_param_status(params, items)
+
+            fitmethod = fit_config.get(section, "fitmethod", fallback=cl_fitmethod)
+
+            if fitmethod not in ALLOWED_FITMETHODS.keys():
+                exit(
+                    "The fitting method '{}', as specified in section ['{}'],"
+                    "is invalid! Please choose from:\n  {}".format(
+                        fitmethod, section, list(sorted(ALLOWED_FITMETHODS.keys()))
+                    )
                 )
-            )
 
-        print("Fitting method: {}\n".format(ALLOWED_FITMETHODS[fitmethod]))
+            saved = checkpoint.get_section(section_key)
+
+            if saved is not None:
+                print("Restored from the checkpoint\n")
+                cp.load_params(params, saved)
+                result = make_result(data, params, fitmethod)
+                print(f"Final Chi2        : {result.chisqr:.3e}")
+                print(f"Final Reduced Chi2: {result.redchi:.3e}")
+                continue
+
+            with timings.stage("clustering"):
+                clusters = find_independent_clusters(data, params)
+
+            print("Fitting method: {}\n".format(ALLOWED_FITMETHODS[fitmethod]))
+
+            nstarts = fit_config.getint(section, "nstarts", fallback=multistart.NSTARTS)
+            starts = fit_config.get(section, "starts", fallback="lhs")
+            maxfev = fit_config.getint(section, "maxfev", fallback=None)
+
+            section_timings["nfev"] = 0
+            complete = True
+
+            for c_name, c_data, c_params in clusters:
+                if len(clusters) > 1:
+                    print(f"[{c_name}]")
+
+                saved = checkpoint.get_cluster(section_key, str(c_name))
+
+                if saved is not None:
+                    print("Restored from the checkpoint\n")
+                    cp.load_params(c_params, saved)
+                    c_result = make_result(c_data, c_params, fitmethod)
+                    continue
+
+                if not any(
+                    param.vary and not param.expr for param in c_params.values()
+                ):
+                    print("No parameter to fit\n")
+                    c_result = make_result(c_data, c_params, fitmethod)
+                    continue
+
+                if checkpoint.expired():
+                    print("Skipped: the time budget is used up\n")
+                    c_result = make_result(c_data, c_params, fitmethod)
+                    checkpoint.stop()
+                    complete = False
+                    continue
+
+                print("Chi2 / Reduced Chi2:")
+
+                with timings.stage(str(c_name)) as cluster_timings:
+                    c_func = c_data.calculate_residuals
+                    c_minimizer = lmfit.Minimizer(
+                        c_func, c_params, iter_cb=checkpoint.iter_cb
+                    )
+                    checkpoint.reset_best()
+
+                    budget = {"deadline": checkpoint.deadline, "maxfev": maxfev}
+
+                    try:
+                        if fitmethod == "brute":
+                            c_result = brute.run_brute(
+                                c_data, c_params, workers, **budget
+                            )
+                        elif fitmethod == "alternating":
+                            c_result = alternating.run_alternating(
+                                c_data, c_params, workers, **budget
+                            )
+                        elif fitmethod == "multistart":
+                            c_result = multistart.run_multistart(
+                                c_data,
+                                c_params,
+                                nstarts,
+                                starts,
+                                workers,
+                                seed,
+                                **budget,
+                            )
+                        else:
+                            c_result = c_minimizer.minimize(
+                                method=fitmethod, max_nfev=maxfev
+                            )
+
+                    except KeyboardInterrupt:
+                        sys.stderr.write(
+                            "\n -- Keyboard Interrupt: minimization stopped\n"
+                        )
+                        if fitmethod in ENGINES:
+                            # The custom engines have no minimizer to resume from
+                            c_result = make_result(c_data, c_params, fitmethod)
+                        else:
+                            c_result = c_minimizer.minimize(
+                                params=c_minimizer.result.params, maxfev=1
+                            )
+
+                    if getattr(c_result, "aborted", False) and checkpoint.expired():
+                        sys.stderr.write(
+                            "\n -- Time budget used up: minimization stopped\n"
+                        )
+                        checkpoint.restore_best(c_result.params)
+                        update_statistics(c_result, c_data)
+                        checkpoint.stop()
+                        complete = False
+                    else:
+                        checkpoint.set_cluster(
+                            section_key, str(c_name), c_result.params
+                        )
+
+                    cluster_timings["nfev"] = c_result.nfev
+                    cluster_timings["ndata"] = c_data.ndata
+                    section_timings["nfev"] += c_result.nfev
+
+                for name, param in c_result.params.items():
+                    params[name] = param
+
+                for minimum in getattr(c_result, "minima", []):
+                    cluster = str(c_name) if len(clusters) > 1 else ""
+                    minima.append({"cluster": cluster, **minimum})
+
+                print("")
 
-        for c_name, c_data, c_params in clusters:
             if len(clusters) > 1:
-                print(f"[{c_name}]")
+                result = make_result(data, params, fitmethod)
+            else:
+                result = c_result
 
-            print("Chi2 / Reduced Chi2:")
+            if complete:
+                checkpoint.set_section(section_key, params)
 
-            c_func = c_data.calculate_residuals
-            c_minimizer = lmfit.Minimizer(c_func, c_params)
+        print(f"Final Chi2        : {result.chisqr:.3e}")
+        print(f"Final Reduced Chi2: {result.redchi:.3e}")
 
-            try:
-                if fitmethod == "brute":
-                    c_result = c_minimizer.minimize(method=fitmethod, keep="all")
-                else:
-                    c_result = c_minimizer.minimize(method=fitmethod)
+    if minima:
+        result.minima = minima
 
-            except KeyboardInterrupt:
-                sys.stderr.write("\n -- Keyboard Interrupt: minimization stopped\n")
-                c_result = c_minimizer.minimize(
-                    params=c_minimizer.result.params, maxfev=1
-                )
+    if result.method not in METHODS_WITH_ERRORS:
+        print("\nWarning: uncertainties of fitting parameters are only calculated")
+        print(
+            f"         when using the {', '.join(METHODS_WITH_ERRORS)} fitting methods!"
+        )
+
+    return result
 
-            for name, param in c_result.params.items():
-                params[name] = param
 
-            print("")
+def make_result(data, params, method):
+    """Create a result object holding the statistics for the current values of
+    the parameters, without minimization."""
 
-        if len(clusters) > 1:
-            minimizer = lmfit.Minimizer(data.calculate_residuals, params)
-            result = minimizer.prepare_fit()
-            result.residual = data.calculate_residuals(params, verbose=False)
-            result.params = params
-            result._calculate_statistics()
-            result.method = fitmethod
-        else:
-            result = c_result
+    minimizer = lmfit.Minimizer(data.calculate_residuals, params)
+    result = minimizer.prepare_fit()
+    result.residual = data.calculate_residuals(params, verbose=False)
+    result.params = params
+    result._calculate_statistics()
+    result.method = method
 
-        print(f"Final Chi2        : {result.chisqr:.3e}")
-        print(f"Final Reduced Chi2: {result.redchi:.3e}")
+    return result
 
-    if result.method != "leastsq":
-        print("\nWarning: uncertainties and covariance of fitting parameters are only")
-        print("         calculated when using the 'leastsq' fitting method!")
+
+def update_statistics(result, data):
+    """Update the statistics of a result for the current values of its
+    parameters, keeping the other attributes set by the fitting engines."""
+
+    result.params.update_constraints()
+    result.residual = data.calculate_residuals(result.params, verbose=False)
+    result._calculate_statistics()
 
     return result
 
@@ -103,10 +273,12 @@ def find_independent_clusters(data, params):
     rate are set to 'fix', chances are that the fit can be decomposed
     residue-specifically.
 
-    TODO: Breaks when no parameter varies
+    The profiles depending on no varying parameter are gathered in a last
+    cluster, with an empty name.
 
     """
     clusters = []
+    data_fixed, pnames_fixed = datasets.DataSet(), []
 
     for profile in data:
 
@@ -115,6 +287,11 @@ def find_independent_clusters(data, params):
             name for name in pnames if params[name].vary and not params[name].expr
         }
 
+        if not pnames_vary:
+            data_fixed.append(profile)
+            pnames_fixed.extend(pnames)
+            continue
+
         for data_cluster, pnames_cluster, pnames_vary_cluster in clusters:
 
             if pnames_vary & pnames_vary_cluster:
@@ -142,21 +319,62 @@ def find_independent_clusters(data, params):
                 parameters.ParamName.from_fname(pnames_vary_cluster.pop())
             )
 
-        params_cluster = lmfit.Parameters()
+        params_cluster = get_cluster_params(params, pnames_cluster)
 
-        for pname in pnames_cluster:
-            param = params[pname]
-            params[pname]._delay_asteval = True
-            params_cluster[pname] = param
+        clusters_.append((name_cluster, data_cluster, params_cluster))
 
-        for param in params_cluster.values():
-            param._delay_asteval = False
+    clusters_ = sorted(clusters_)
 
-        params_cluster.update_constraints()
+    if data_fixed:
+        params_cluster = get_cluster_params(params, pnames_fixed)
+        clusters_.append((parameters.ParamName(), data_fixed, params_cluster))
 
-        clusters_.append((name_cluster, data_cluster, params_cluster))
+    return clusters_
+
+
+def get_cluster_params(params, pnames_cluster):
+    """Return the parameters of a cluster, shared with 'params'."""
+
+    params_cluster = lmfit.Parameters()
+
+    for pname in pnames_cluster:
+        param = params[pname]
+        params[pname]._delay_asteval = True
+        params_cluster[pname] = param
+
+    for param in params_cluster.values():
+        param._delay_asteval = False
 
-    return sorted(clusters_)
+    params_cluster.update_constraints()
+
+    return params_cluster
+
+
+def write_minima(minima, path):
+    """Write the distinct minima found by the 'multistart' method to a file."""
+
+    filename = path / "minima.fit"
+
+    cfg = configparser.ConfigParser()
+    cfg.optionxform = str
+
+    indexes = {}
+
+    for minimum in minima:
+        cluster = minimum["cluster"]
+        indexes[cluster] = indexes.get(cluster, 0) + 1
+        section = f"MINIMUM {indexes[cluster]}"
+        if cluster:
+            section = f"{cluster}, {section}"
+        cfg.add_section(section)
+        cfg.set(section, "chi-square", f"{minimum['chisqr']:.5e}")
+        cfg.set(section, "starts", str(minimum["count"]))
+        for name, value in minimum["values"].items():
+            cfg.set(section, str(parameters.ParamName.from_fname(name)), f"{value:.5e}")
+
+    with open(filename, "w") as f:
+        print(f"  * {filename}")
+        cfg.write(f)
 
 
 def write_statistics(result, path):
@@ -0,0 +1,297 @@
+"""The multistart module contains the global optimization engine used by the
+'multistart' fitting method.
+
+Local least-squares refinements are run from several starting points, drawn by
+Latin hypercube sampling within the bounds of the varying parameters or taken
+from a coarse grid search, possibly in several worker processes. The distinct
+minima found are kept, and the best one is refined once more with the
+Levenberg-Marquardt algorithm, which also provides the uncertainties of the
+parameters.
+
+"""
+import concurrent.futures
+import copy
+import sys
+
+import lmfit
+import numpy as np
+
+from chemex import brute
+from chemex import checkpoint as cp
+
+# Default number of starting points
+NSTARTS = 20
+# Ways of drawing the starting points
+STARTS = ("lhs", "brute")
+# Local method used to refine the starting points
+LOCAL_METHOD = "least_squares"
+# Relative tolerance below which two minima are considered identical (on the
+# chi-square, and on the parameters scaled by their range)
+TOLERANCE = 1e-3
+
+_refiner = None
+
+
+class LocalRefiner:
+    """Refine the varying parameters from a starting point with a local
+    method."""
+
+    def __init__(self, data, params, names, deadline=None, maxfev=None):
+        self.data = data
+        self.params = params
+        self.names = names
+        self.deadline = deadline
+        self.maxfev = maxfev
+
+    def __call__(self, start):
+        """Return the refined values, the chi-square and the number of function
+        evaluations. A refinement stopped by the time budget or by 'maxfev'
+        returns the best point met."""
+
+        params = copy.deepcopy(self.params)
+
+        for name, value in zip(self.names, start):
+            params[name].value = value
+
+        tracker = cp.Checkpoint(deadline=self.deadline)
+        minimizer = lmfit.Minimizer(
+            self.data.calculate_residuals,
+            params,
+            fcn_kws={"verbose": False},
+            iter_cb=tracker.iter_cb,
+        )
+
+        try:
+            result = minimizer.minimize(method=LOCAL_METHOD, max_nfev=self.maxfev)
+        except ValueError:  # e.g., residuals that are not finite
+            return np.asarray(start), np.inf, 0
+
+        chisqr = result.chisqr
+
+        if result.aborted:
+            tracker.restore_best(result.params)
+            chisqr = tracker.best[0]
+
+        values = np.array([result.params[name].value for name in self.names])
+
+        return values, chisqr, result.nfev
+
+
+def get_starts_lhs(params, names, nstarts, seed=None):
+    """Draw the starting points by Latin hypercube sampling within the bounds
+    of the parameters. The parameters with no bounds keep their initial value,
+    and the initial values of all the parameters are used as the first point."""
+
+    generator = np.random.default_rng(seed)
+    initial = np.array([params[name].value for name in names])
+    starts = np.tile(initial, (nstarts, 1))
+    bounded = False
+
+    for index, name in enumerate(names):
+        lower, upper = params[name].min, params[name].max
+
+        if np.isfinite(lower) and np.isfinite(upper):
+            strata = generator.permutation(nstarts - 1) + generator.random(nstarts - 1)
+            starts[1:, index] = lower + (upper - lower) * strata / (nstarts - 1)
+            bounded = True
+
+    if not bounded:
+        sys.exit(
+            "\nERROR: The starting points of the 'multistart' method are drawn "
+            "within the bounds of the parameters. Please specify bounds for at "
+            "least one of the fitted parameters.\n"
+        )
+
+    return starts
+
+
+def get_starts_brute(data, params, names, nstarts, workers=1, deadline=None):
+    """Take the starting points among the best points of a grid search."""
+
+    result = brute.run_brute(data, params, workers, keep=nstarts, deadline=deadline)
+
+    return np.array(
+        [
+            [candidate.params[name].value for name in names]
+            for candidate in result.candidates
+        ]
+    )
+
+
+def find_minima(refined, scales, tolerance=TOLERANCE):
+    """Group the refined points that converged to the same minimum, sorted by
+    increasing chi-square."""
+
+    minima = []
+
+    for values, chisqr in sorted(refined, key=lambda item: item[1]):
+        if not np.isfinite(chisqr):
+            continue
+
+        for minimum in minima:
+            if is_same_minimum(minimum, values, chisqr, scales, tolerance):
+                minimum["count"] += 1
+                break
+        else:
+            minima.append({"values": values, "chisqr": chisqr, "count": 1})
+
+    return minima
+
+
+def is_same_minimum(minimum, values, chisqr, scales, tolerance=TOLERANCE):
+    """Check whether the point converged to 'minimum'. The parameters with no
+    finite range are compared relative to their value."""
+
+    scales = np.where(np.isfinite(scales), scales, abs(minimum["values"]))
+
+    return abs(chisqr - minimum["chisqr"]) <= tolerance * minimum["chisqr"] and all(
+        abs(values - minimum["values"]) <= tolerance * scales
+    )
+
+
+def run_multistart(
+    data,
+    params,
+    nstarts=NSTARTS,
+    starts="lhs",
+    workers=1,
+    seed=None,
+    deadline=None,
+    maxfev=None,
+):
+    """Refine the parameters from several starting points and return an
+    lmfit-like result for the best minimum.
+
+    The result has the additional attribute 'minima', the list of the distinct
+    minima found (chi-square, number of starting points that converged to it and
+    values of the varying parameters).
+
+    Each local refinement is limited to 'maxfev' evaluations, and no starting
+    point is refined once 'maxfev' evaluations are done in total or the time
+    'deadline' is passed. In the latter case, the result is marked as
+    'aborted'.
+
+    """
+    from chemex import fitting
+
+    names = [name for name, param in params.items() if param.vary and not param.expr]
+
+    if starts not in STARTS:
+        sys.exit(
+            f"\nERROR: The starting points of the 'multistart' method should be "
+            f"drawn from one of {STARTS}, not '{starts}'.\n"
+        )
+
+    if nstarts < 2:
+        sys.exit("\nERROR: The 'multistart' method needs at least 2 starting points.\n")
+
+    if starts == "brute":
+        points = get_starts_brute(data, params, names, nstarts, workers, deadline)
+    else:
+        points = get_starts_lhs(params, names, nstarts, seed)
+
+    refiner = LocalRefiner(data, copy.deepcopy(params), names, deadline, maxfev)
+    refined = []
+    nfev = 0
+
+    def exhausted():
+        return cp.is_expired(deadline) or (maxfev is not None and nfev >= maxfev)
+
+    print(f"Starting points: {len(points)} ({LOCAL_METHOD} refinements)")
+
+    try:
+        if workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=_set_refiner, initargs=(refiner,)
+            ) as executor:
+                # The points are submitted in waves, so that the budgets are
+                # checked during the search
+                for start in range(0, len(points), workers):
+                    if exhausted():
+                        break
+                    wave = points[start : start + workers]
+                    for values, chisqr, a_nfev in executor.map(_refine, wave):
+                        refined.append((values, chisqr))
+                        nfev += a_nfev
+                        print_refined(len(refined), len(points), chisqr, a_nfev)
+        else:
+            for point in points:
+                if exhausted():
+                    break
+                values, chisqr, a_nfev = refiner(point)
+                refined.append((values, chisqr))
+                nfev += a_nfev
+                print_refined(len(refined), len(points), chisqr, a_nfev)
+
+    except KeyboardInterrupt:
+        sys.stderr.write("\n -- Keyboard Interrupt: multistart search stopped\n")
+
+    if len(refined) < len(points):
+        print(f"\nStarting points refined: {len(refined)}/{len(points)}")
+
+    ranges = np.array([params[name].max - params[name].min for name in names])
+    minima = find_minima(refined, ranges)
+
+    params = copy.deepcopy(params)
+
+    if minima:
+        for name, value in zip(names, minima[0]["values"]):
+            params[name].value = value
+
+    print_minima(minima)
+
+    if cp.is_expired(deadline):
+        result = fitting.make_result(data, params, method="multistart")
+        result.nfev = 0
+        result.aborted = True
+    else:
+        print("\nRefinement of the best minimum:")
+
+        tracker = cp.Checkpoint(deadline=deadline)
+        minimizer = lmfit.Minimizer(
+            data.calculate_residuals, params, iter_cb=tracker.iter_cb
+        )
+        result = minimizer.minimize(method="leastsq", max_nfev=maxfev)
+
+        if result.aborted:
+            tracker.restore_best(result.params)
+            a_nfev = result.nfev
+            result = fitting.make_result(data, result.params, method="multistart")
+            result.nfev = a_nfev
+            result.aborted = cp.is_expired(deadline)
+
+    result.method = "multistart"
+    result.nfev += nfev
+    result.minima = [
+        {
+            "chisqr": minimum["chisqr"],
+            "count": minimum["count"],
+            "values": dict(zip(names, minimum["values"])),
+        }
+        for minimum in minima
+    ]
+
+    return result
+
+
+def print_refined(index, total, chisqr, nfev):
+    print(f"  * {index:>3d}/{total}: {chisqr:.3e} ({nfev} evaluations)")
+
+
+def print_minima(minima):
+    print(f"\nDistinct minima: {len(minima)}")
+
+    for index, minimum in enumerate(minima, 1):
+        print(
+            f"  {index:>3d}. chi2 = {minimum['chisqr']:.3e} "
+            f"(starts: {minimum['count']})"
+        )
+
+
+def _set_refiner(refiner):
+    global _refiner
+    _refiner = refiner
+
+
+def _refine(start):
+    return _refiner(start)
@@ -336,9 +336,14 @@ def create_params(data):
 
 def set_params_from_config_file(params, config_filename):
     """Read the parameter file and set initial values and optional bounds and brute
-    step size."""
+    step size. 'config_filename' can also be a dictionary of sections, the files
+    it refers to being relative to the working directory."""
 
-    print(f"File Name: {config_filename}", end="\n\n")
+    if isinstance(config_filename, dict):
+        working_dir = pathlib.Path.cwd()
+    else:
+        print(f"File Name: {config_filename}", end="\n\n")
+        working_dir = config_filename.parent
 
     config = util.read_cfg_file(config_filename)
 
@@ -369,9 +374,7 @@ def set_params_from_config_file(params, config_filename):
                 if "file" in key:
                     for filename in value.split():
                         filename_ = pathlib.Path(filename)
-                        filename_ = util.normalize_path(
-                            config_filename.parent, filename_
-                        )
+                        filename_ = util.normalize_path(working_dir, filename_)
                         pairs.extend(get_pairs_from_file(filename_, name))
 
                 elif peaks.RE_PEAK_NAME.match(key):
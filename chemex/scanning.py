@@ -0,0 +1,274 @@
+"""The scanning module contains the code for scanning the chi-square along one
+or two parameters (e.g., 'pb' and 'kex_ab').
+
+At each grid point, the scanned parameters are fixed and the other varying
+parameters are refitted (profile likelihood). The refits are warm-started from
+the solution at the neighbouring grid point: the points of the first column of
+the grid are fitted in turn, then each row of the grid is fitted from its first
+point, the rows being distributed over the worker processes. Without refit,
+the chi-square is calculated for all the grid points in batches.
+
+"""
+import concurrent.futures
+import copy
+import sys
+
+import lmfit
+import numpy as np
+
+from chemex import brute
+from chemex import parameters
+
+# Thresholds of the chi-square increase for the 68.3% and 95.4% confidence
+# regions of one and two parameters
+DELTA_CHISQR = {1: (1.0, 4.0), 2: (2.3, 6.18)}
+
+
+def get_scans(params, scans):
+    """Return the names of the parameters matching each scanned parameter and
+    the values of the scanned parameters on the grid."""
+
+    if not 1 <= len(scans) <= 2:
+        sys.exit("\nERROR: One or two parameters can be scanned.\n")
+
+    names, axes = [], []
+
+    for name, lower, upper, number in scans:
+        name_re = parameters.ParamName.from_section(name).to_re()
+        matches = [name_full for name_full in params if name_re.match(name_full)]
+
+        if not matches:
+            sys.exit(f"\nERROR: No parameter matches '{name}'.\n")
+
+        if any(params[name_full].expr for name_full in matches):
+            sys.exit(f"\nERROR: The parameter '{name}' is constrained.\n")
+
+        names.append(matches)
+        axes.append(np.linspace(float(lower), float(upper), int(number)))
+
+    return names, axes
+
+
+def set_point(params, names, point):
+    """Fix the scanned parameters to the values of the grid point."""
+
+    for matches, value in zip(names, point):
+        for name in matches:
+            params[name].set(value=value, vary=False)
+
+    params.update_constraints()
+
+
+def refit(data, params):
+    """Refit the varying parameters, with the independent clusters of profiles
+    fitted separately, and return the chi-square and number of evaluations.
+    The clusters with no varying parameter left are only calculated."""
+    from chemex import fitting
+
+    nfev = 0
+
+    for _, c_data, c_params in fitting.find_independent_clusters(
+        data, copy.deepcopy(params)
+    ):
+        if not any(param.vary and not param.expr for param in c_params.values()):
+            continue
+
+        minimizer = lmfit.Minimizer(
+            c_data.calculate_residuals, c_params, fcn_kws={"verbose": False}
+        )
+        result = minimizer.minimize(method="leastsq")
+        nfev += result.nfev
+
+        for name, param in result.params.items():
+            if param.vary and not param.expr:
+                params[name].value = param.value
+
+    params.update_constraints()
+    residuals = data.calculate_residuals(params, verbose=False)
+
+    return residuals.dot(residuals), nfev
+
+
+def fit_chain(data, params, names, points, keep_all=False):
+    """Refit the parameters at a sequence of grid points, each refit starting
+    from the solution at the previous point.
+
+    Return the chi-squares, the number of evaluations and the parameters at
+    each point ('keep_all') or at the best point.
+
+    """
+
+    params = copy.deepcopy(params)
+    chisqrs, nfev, solutions = [], 0, []
+
+    for point in points:
+        set_point(params, names, point)
+        chisqr, a_nfev = refit(data, params)
+        nfev += a_nfev
+
+        if keep_all or not chisqrs or chisqr < min(chisqrs):
+            solutions = solutions if keep_all else []
+            solutions.append(copy.deepcopy(params))
+
+        chisqrs.append(chisqr)
+
+    return chisqrs, nfev, solutions
+
+
+def run_scan(data, params, scans, workers=1, fixed=False):
+    """Scan the chi-square on the grid of the scanned parameters.
+
+    'scans' is a list of (name, lower bound, upper bound, number of points).
+    Return the values of the scanned parameters on the grid, the chi-square at
+    each grid point and the parameters at the best grid point.
+
+    """
+
+    names, axes = get_scans(params, scans)
+    labels = [scan[0] for scan in scans]
+    shape = tuple(axis.size for axis in axes)
+
+    print(f"Grid points: {int(np.prod(shape))} ({' x '.join(map(str, shape))})")
+
+    if fixed:
+        chisqrs, best = scan_fixed(data, params, names, axes)
+    else:
+        chisqrs, best = scan_refit(data, params, names, axes, labels, workers)
+
+    return axes, chisqrs, best
+
+
+def scan_refit(data, params, names, axes, labels, workers=1):
+    """Refit the parameters at each grid point, with warm starts."""
+
+    chisqrs = np.full(tuple(axis.size for axis in axes), np.inf)
+    best, nfev = (np.inf, params), 0
+
+    try:
+        # The solutions along the first column of the grid are the starting
+        # points of the rows
+        column = [(value, *[axis[0] for axis in axes[1:]]) for value in axes[0]]
+        column_chisqrs, nfev, seeds = fit_chain(data, params, names, column, True)
+
+        for index, (point, chisqr, seed) in enumerate(
+            zip(column, column_chisqrs, seeds)
+        ):
+            print_point(labels, point, chisqr)
+            chisqrs[(index, *[0] * (len(axes) - 1))] = chisqr
+            best = min(best, (chisqr, seed), key=get_chisqr)
+
+        if len(axes) == 2 and axes[1].size > 1:
+            rows = [[(value0, value1) for value1 in axes[1][1:]] for value0 in axes[0]]
+            tasks = [(data, seed, names, row) for seed, row in zip(seeds, rows)]
+
+            results = map_chains(tasks, workers)
+
+            for index, (row, (row_chisqrs, row_nfev, solutions)) in enumerate(
+                zip(rows, results)
+            ):
+                for point, chisqr in zip(row, row_chisqrs):
+                    print_point(labels, point, chisqr)
+                chisqrs[index, 1:] = row_chisqrs
+                nfev += row_nfev
+                best = min(best, (min(row_chisqrs), solutions[0]), key=get_chisqr)
+
+    except KeyboardInterrupt:
+        sys.stderr.write("\n -- Keyboard Interrupt: scan stopped\n")
+
+    print(f"\nFunction evaluations: {nfev}")
+
+    return chisqrs, best[1]
+
+
+def map_chains(tasks, workers=1):
+    """Fit the chains of grid points, possibly in worker processes."""
+
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            yield from executor.map(_fit_chain, tasks)
+    else:
+        yield from map(_fit_chain, tasks)
+
+
+def get_chisqr(item):
+    return item[0]
+
+
+def scan_fixed(data, params, names, axes):
+    """Calculate the chi-square at each grid point, the other parameters being
+    fixed, with the grid points calculated in batches."""
+
+    shape = tuple(axis.size for axis in axes)
+    npoints = int(np.prod(shape))
+    chisqrs = np.full(npoints, np.inf)
+    params = copy.deepcopy(params)
+
+    def iter_params(indexes):
+        for point in zip(*np.unravel_index(indexes, shape)):
+            set_point(params, names, [axis[i] for axis, i in zip(axes, point)])
+            yield params
+
+    try:
+        for start in range(0, npoints, brute.CHUNK_SIZE):
+            indexes = np.arange(start, min(start + brute.CHUNK_SIZE, npoints))
+            residuals = data.calculate_residuals_batch(iter_params(indexes))
+            chisqrs[indexes] = np.einsum("ij,ij->i", residuals, residuals)
+
+    except KeyboardInterrupt:
+        sys.stderr.write("\n -- Keyboard Interrupt: scan stopped\n")
+
+    chisqrs[~np.isfinite(chisqrs)] = np.inf
+    chisqrs = chisqrs.reshape(shape)
+
+    best = np.unravel_index(np.argmin(chisqrs), shape)
+    set_point(params, names, [axis[i] for axis, i in zip(axes, best)])
+
+    return chisqrs, params
+
+
+def _fit_chain(task):
+    return fit_chain(*task)
+
+
+def print_point(labels, point, chisqr):
+    values = ", ".join(f"{label} = {value:.4g}" for label, value in zip(labels, point))
+    print(f"  * {values}: {chisqr:.3e}")
+
+
+def get_intervals(axis, chisqrs, delta=DELTA_CHISQR[1][0]):
+    """Return the range of values of a 1-D scan within 'delta' of the minimum
+    of the chi-square, linearly interpolated between the grid points (None if
+    the range reaches the edges of the grid)."""
+
+    threshold = chisqrs.min() + delta
+    inside = np.flatnonzero(chisqrs <= threshold)
+    lower, upper = inside.min(), inside.max()
+
+    def interpolate(index_in, index_out):
+        fraction = (threshold - chisqrs[index_in]) / (
+            chisqrs[index_out] - chisqrs[index_in]
+        )
+        return axis[index_in] + fraction * (axis[index_out] - axis[index_in])
+
+    return (
+        interpolate(lower, lower - 1) if lower > 0 else None,
+        interpolate(upper, upper + 1) if upper < axis.size - 1 else None,
+    )
+
+
+def write_scan(scans, axes, chisqrs, path):
+    """Write the chi-square at each grid point to a file."""
+
+    filename = path / "scan.dat"
+    grid = np.meshgrid(*axes, indexing="ij")
+    columns = [values.ravel() for values in grid]
+    columns += [chisqrs.ravel(), chisqrs.ravel() - chisqrs.min()]
+
+    header = " ".join(
+        f"{name:>15s}"
+        for name in [scan[0].upper() for scan in scans] + ["CHI2", "DELTA_CHI2"]
+    )
+
+    print(f"  * {filename}")
+
+    np.savetxt(filename, np.transpose(columns), fmt="%15.6e", header=header[2:])
@@ -0,0 +1,343 @@
+"""The server module contains the code of 'chemex serve', which keeps the
+datasets, their Liouvillians and the cache of the calculated profiles in memory
+between fits.
+
+The server listens on a Unix socket. The requests and replies are JSON
+objects, one per line. Each request has a 'command' and optionally an 'id',
+copied into the replies. While a job runs, its messages are streamed back as
+{"event": "progress", "line": ...} replies, and the job ends with a single
+{"event": "result", ...} or {"event": "error", "message": ...} reply.
+
+Commands:
+
+- load: {"command": "load", "session": NAME, "experiments": [FILE, ...],
+  "parameters": [FILE or sections, ...], "model": MODEL, "include": [ID, ...],
+  "exclude": [ID, ...]} reads the data and parameters of a session.
+- fit: {"command": "fit", "session": NAME, "method": FILE or sections,
+  "parameters": [FILE or sections, ...], "fitmethod": ..., "update": BOOL}
+  fits the data of a session, from its parameters updated with the optional
+  'parameters'. With 'update', the fitted parameters become the parameters of
+  the session.
+- scan: {"command": "scan", "session": NAME, "scans": [[NAME, MIN, MAX, N],
+  ...], "method": FILE or sections, "fixed": BOOL} scans the chi-square.
+- plot: {"command": "plot", "session": NAME, "parameters": [...], "profiles":
+  BOOL} calculates the profiles and the statistics without fitting.
+- sessions, drop: list the sessions, drop a session.
+- shutdown: stop the server.
+
+The relative paths are relative to the working directory of the server. The
+jobs run one at a time, in a worker thread; the 'brute', 'multistart' and
+'alternating' methods and the scans use 'workers' processes.
+
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import copy
+import io
+import json
+import pathlib
+import sys
+
+import numpy as np
+
+from chemex import api
+from chemex import checkpoint as cp
+from chemex import parameters
+from chemex import util
+
+# Default path of the socket
+SOCKET = "chemex.sock"
+
+
+def serve(args):
+    """Run the server until a 'shutdown' request or a keyboard interrupt."""
+
+    server = Server(args.workers)
+    path = args.socket
+
+    if path.exists():
+        sys.exit(f"\nERROR: The socket '{path}' already exists.\n")
+
+    loop = asyncio.get_event_loop()
+
+    try:
+        loop.run_until_complete(server.run(path))
+    except KeyboardInterrupt:
+        sys.stderr.write("\n -- Keyboard Interrupt: server stopped\n")
+    finally:
+        if path.exists():
+            path.unlink()
+
+
+class Server:
+    """Keep the sessions (data and parameters) in memory and run the jobs."""
+
+    def __init__(self, workers=1):
+        self.workers = workers
+        self.sessions = {}
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.stopped = None
+
+    async def run(self, path):
+        self.stopped = asyncio.Event()
+        server = await asyncio.start_unix_server(self.handle, path=str(path))
+
+        util.header1("Serving")
+        print(f"\nListening on '{path}' (workers: {self.workers})")
+
+        try:
+            await self.stopped.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            self.executor.shutdown()
+
+    async def handle(self, reader, writer):
+        """Answer the requests of a connection, one at a time."""
+
+        while not self.stopped.is_set():
+            line = await reader.readline()
+
+            if not line:
+                break
+
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                await send(writer, {"event": "error", "message": f"{error}"})
+                continue
+
+            await self.answer(request, writer)
+
+        writer.close()
+
+    async def answer(self, request, writer):
+        if not isinstance(request, dict):
+            message = "The request must be a JSON object"
+            await send(writer, {"event": "error", "message": message})
+            return
+
+        reply = {"id": request.get("id")}
+        command = request.get("command")
+        handler = getattr(self, f"do_{command}", None)
+
+        if handler is None:
+            message = f"Unknown command '{command}'"
+            await send(writer, {**reply, "event": "error", "message": message})
+            return
+
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        stream = ProgressStream(loop, queue)
+        job = loop.run_in_executor(self.executor, run_job, handler, request, stream)
+
+        while True:
+            line = await queue.get()
+            if line is None:
+                break
+            await send(writer, {**reply, "event": "progress", "line": line})
+
+        try:
+            result = await job
+        except Exception as error:
+            message = f"{type(error).__name__}: {error}"
+            await send(writer, {**reply, "event": "error", "message": message})
+        else:
+            await send(writer, {**reply, "event": "result", **result})
+
+        if command == "shutdown":
+            self.stopped.set()
+
+    def get_session(self, request):
+        name = request.get("session", "default")
+
+        if name not in self.sessions:
+            raise api.ChemexError(f"No session '{name}': send a 'load' request first")
+
+        return self.sessions[name]
+
+    def do_load(self, request):
+        filenames = [pathlib.Path(name) for name in request["experiments"]]
+        configs = [get_config(config) for config in request.get("parameters", [])]
+
+        data = api.read_data(filenames, request.get("model"), verbose=True)
+        data.filter(request.get("include"), request.get("exclude"))
+
+        if not data.datasets:
+            raise api.ChemexError("No profile left after the residue selection")
+
+        params = api.create_params(data, configs, verbose=True)
+
+        name = request.get("session", "default")
+        self.sessions[name] = {"data": data, "params": params}
+
+        return {"session": name, "profiles": len(data.datasets)}
+
+    def do_fit(self, request):
+        session = self.get_session(request)
+        data, params = session["data"], self.get_params(session, request)
+
+        result = api.fit(
+            data,
+            params,
+            get_config(request.get("method")),
+            request.get("fitmethod", "leastsq"),
+            request.get("workers", self.workers),
+            request.get("seed"),
+            verbose=True,
+        )
+
+        if request.get("update"):
+            session["params"] = result.params
+
+        return get_summary(result, request.get("profiles", False))
+
+    def do_scan(self, request):
+        session = self.get_session(request)
+        data, params = session["data"], self.get_params(session, request)
+
+        # Apply the constraints and fitting status of the method, if any
+        if request.get("method") is not None:
+            method = util.read_cfg_file(get_config(request["method"]))
+            for section in method.sections():
+                parameters.set_param_status(params, method.items(section))
+
+        axes, chisqrs, best = api.scan(
+            data,
+            params,
+            request["scans"],
+            request.get("workers", self.workers),
+            request.get("fixed", False),
+            verbose=True,
+        )
+
+        return {
+            "axes": [axis.tolist() for axis in axes],
+            "chisqr": chisqrs.tolist(),
+            "params": cp.dump_params(best),
+        }
+
+    def do_plot(self, request):
+        session = self.get_session(request)
+        data, params = session["data"], self.get_params(session, request)
+        result = api.calculate(data, params, verbose=True)
+        return get_summary(result, request.get("profiles", True))
+
+    def do_sessions(self, request):
+        return {
+            "sessions": {
+                name: len(session["data"].datasets)
+                for name, session in self.sessions.items()
+            }
+        }
+
+    def do_drop(self, request):
+        self.get_session(request)
+        del self.sessions[request.get("session", "default")]
+        return {}
+
+    def do_shutdown(self, request):
+        return {}
+
+    def get_params(self, session, request):
+        """Return a copy of the parameters of the session, updated with the
+        parameters of the request."""
+
+        params = copy.deepcopy(session["params"])
+        configs = [get_config(config) for config in request.get("parameters", [])]
+
+        if configs:
+            api.update_params(session["data"], params, configs, verbose=True)
+
+        return params
+
+
+class ProgressStream(io.TextIOBase):
+    """Text stream sending the complete lines written to it to an asyncio
+    queue, from the worker thread."""
+
+    def __init__(self, loop, queue):
+        super().__init__()
+        self.loop = loop
+        self.queue = queue
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        for line in lines:
+            self.put(line)
+        return len(text)
+
+    def put(self, line):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, line)
+
+    def close(self):
+        if self.buffer:
+            self.put(self.buffer)
+        self.put(None)
+        super().close()
+
+
+def run_job(handler, request, stream):
+    """Run a job in the worker thread, its messages being streamed back."""
+
+    try:
+        with contextlib.redirect_stdout(stream):
+            return handler(request)
+    except SystemExit as error:
+        raise api.ChemexError(str(error.code).strip()) from None
+    finally:
+        stream.close()
+
+
+def get_config(config):
+    """Return a dictionary of sections as is, or the path of a file."""
+    if config is None or isinstance(config, dict):
+        return config
+    return pathlib.Path(config)
+
+
+def get_summary(result, profiles=False):
+    summary = {
+        "method": result.method,
+        "chisqr": result.chisqr,
+        "redchi": result.redchi,
+        "ndata": result.ndata,
+        "nvarys": result.nvarys,
+        "nfev": result.nfev,
+        "params": cp.dump_params(result.params),
+    }
+
+    if result.minima:
+        summary["minima"] = result.minima
+
+    if profiles:
+        summary["profiles"] = [
+            {
+                "experiment": experiment,
+                "profile": name,
+                **{field: values[field].tolist() for field in values.dtype.names},
+            }
+            for (experiment, name), values in result.profiles.items()
+        ]
+
+    return summary
+
+
+async def send(writer, message):
+    writer.write(json.dumps(message, default=to_json).encode() + b"\n")
+    await writer.drain()
+
+
+def to_json(value):
+    """Convert the numpy values to their Python equivalents."""
+
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
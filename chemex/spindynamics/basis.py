@@ -7,12 +7,15 @@
         2IxSx, 2IxSy, 2IySx, 2IySy,
         2IzSz}
 """
+import functools
 import itertools
 
 import numpy as np
+from numpy.polynomial import hermite_e
 from scipy import linalg
-from scipy import stats
+from scipy.sparse import csgraph
 
+from chemex import cache
 from chemex.spindynamics import constants
 
 COMPONENTS = {
@@ -74,10 +77,23 @@ ZEROS_M_FULL = np.zeros((N_FULL, N_FULL))
 ZEROS_V_SINGLE = np.zeros((N_SINGLE, 1))
 ZEROS_V_FULL = np.zeros((N_FULL, 1))
 
+B1_INH_TOL = 1e-4
+B1_INH_RES_MAX = 64
+WEIGHT_TOL = 1e-5
+# Smallest Liouvillian for which the blocks are diagonalized separately (below
+# that, the overhead of the additional calls outweighs the gain)
+BLOCK_SIZE_MIN = 40
+# Memory budget of the propagator cache (in MB)
+PROPAGATOR_CACHE_MB = 64
+
 
 class Liouvillian:
     """TODO"""
 
+    # Propagators are indexed by the content of the Liouvillian, so the cache can
+    # be shared by all the instances
+    propagator_cache = cache.Cache(PROPAGATOR_CACHE_MB * 2 ** 20)
+
     def __init__(self, system, state_nb, atoms, h_larmor_frq, equilibrium=True):
 
         if atoms is None:
@@ -89,25 +105,31 @@ class Liouvillian:
         }
 
         self._vectors, matrices = build_basis(system, state_nb, equilibrium)
+        self._basis_name = f"{system}_{state_nb}_{equilibrium}"
         self._matrices = add_cs_and_carrier(matrices, self.ppms)
 
-        self.identity = np.identity(self._matrices["cs_i_a"].shape[-1])
+        self.size = self._matrices["cs_i_a"].shape[-1]
+        self.identity = np.identity(self.size)
+        self.propagator_count = 0
 
         self.detect = {name: vector.T for name, vector in self._vectors.items()}
 
         self.perfect180 = make_perfect180(self._vectors)
 
+        self._state_indexes, self._equilibrium_index = get_state_indexes(self._vectors)
+        self._blocks = None
+        self._batch = None
+
         self._carrier_i = None
         self._carrier_s = None
         self._j_eff_i = None
-        self._j_eff_i_weights = None
+        self._j_eff_i_weights = np.ones(1)
         self._l_carrier_i = None
         self._l_carrier_s = None
         self._l_j_eff_i = None
         self._w1_i = None
         self._w1_s = None
-        self._w1_i_weights = 1.0
-        self._w1_s_weights = 1.0
+        self._weights = np.ones(1)
         self._w1_i_inh = 0.0
         self._w1_s_inh = 0.0
         self._w1_i_inh_res = 11
@@ -151,25 +173,8 @@ class Liouvillian:
 
     @w1_i.setter
     def w1_i(self, value):
-
         self._w1_i = value
-
-        if self._w1_i_inh not in (0.0, np.inf) and self._w1_i_inh_res > 1:
-            dist = np.linspace(-2.0, 2.0, self._w1_i_inh_res)
-            w1_i_inh = self._w1_i_inh
-        else:
-            dist = np.array(0.0)
-            w1_i_inh = 0.0
-
-        dist = dist.reshape(-1, 1, 1)
-
-        w1_i_dist = (dist * w1_i_inh + 1.0) * self._w1_i
-
-        self._w1_i_weights = stats.norm.pdf(dist)
-        self._w1_i_weights /= self._w1_i_weights.sum()
-
-        self._l_w1x_i = self._matrices.get("w1x_i", 0.0) * w1_i_dist
-        self._l_w1y_i = self._matrices.get("w1y_i", 0.0) * w1_i_dist
+        self._set_distribution()
 
     @property
     def w1_i_inh(self):
@@ -178,7 +183,7 @@ class Liouvillian:
     @w1_i_inh.setter
     def w1_i_inh(self, value):
         self._w1_i_inh = value
-        self.w1_i = self._w1_i
+        self._set_distribution()
 
     @property
     def w1_i_inh_res(self):
@@ -187,7 +192,7 @@ class Liouvillian:
     @w1_i_inh_res.setter
     def w1_i_inh_res(self, value):
         self._w1_i_inh_res = value
-        self.w1_i = self._w1_i
+        self._set_distribution()
 
     @property
     def w1_s(self):
@@ -195,25 +200,8 @@ class Liouvillian:
 
     @w1_s.setter
     def w1_s(self, value):
-
         self._w1_s = value
-
-        if self._w1_s_inh not in (0.0, np.inf) and self._w1_s_inh_res > 1:
-            dist = np.linspace(-2.0, 2.0, self._w1_s_inh_res)
-            w1_s_inh = self._w1_s_inh
-        else:
-            dist = np.array(0.0)
-            w1_s_inh = 0.0
-
-        dist = dist.reshape(-1, 1, 1)
-
-        w1_s_dist = (dist * w1_s_inh + 1.0) * self._w1_s
-
-        self._w1_s_weights = stats.norm.pdf(dist)
-        self._w1_s_weights /= self._w1_s_weights.sum()
-
-        self._l_w1x_s = self._matrices.get("w1x_s", 0.0) * w1_s_dist
-        self._l_w1y_s = self._matrices.get("w1y_s", 0.0) * w1_s_dist
+        self._set_distribution()
 
     @property
     def w1_s_inh(self):
@@ -222,7 +210,7 @@ class Liouvillian:
     @w1_s_inh.setter
     def w1_s_inh(self, value):
         self._w1_s_inh = value
-        self.w1_s = self._w1_s
+        self._set_distribution()
 
     @property
     def w1_s_inh_res(self):
@@ -231,56 +219,190 @@ class Liouvillian:
     @w1_s_inh_res.setter
     def w1_s_inh_res(self, value):
         self._w1_s_inh_res = value
-        self.w1_s = self._w1_s
+        self._set_distribution()
 
     @property
     def j_eff_i(self):
-        return self._j_eff_i.reshape(-1)
+        return self._j_eff_i
 
     @j_eff_i.setter
     def j_eff_i(self, value):
-        self._j_eff_i = np.asarray(value).reshape(-1, 1, 1, 1, 1)
-        self._l_j_eff_i = self._matrices.get("j_eff_i", 0.0) * self._j_eff_i
+        self._j_eff_i = np.asarray(value, dtype=float).reshape(-1)
+        self._set_distribution()
 
     @property
     def j_eff_i_weights(self):
-        return self._j_eff_i_weights.reshape(-1)
+        return self._j_eff_i_weights
 
     @j_eff_i_weights.setter
     def j_eff_i_weights(self, value):
-        self._j_eff_i_weights = np.asarray(value).reshape(-1, 1, 1, 1, 1)
+        self._j_eff_i_weights = np.asarray(value, dtype=float).reshape(-1)
+        self._set_distribution()
+
+    def _set_distribution(self):
+        """Combine the J-multiplet and B1 distributions into a single axis of
+        quadrature points, and set the corresponding Liouvillian terms."""
+
+        if self._w1_i is None or self._w1_s is None or self._j_eff_i is None:
+            return
+
+        dist_w1_i = get_b1_distribution(self._w1_i_inh, self._w1_i_inh_res)
+        dist_w1_s = get_b1_distribution(self._w1_s_inh, self._w1_s_inh_res)
+        dist_j_eff_i = (
+            self._j_eff_i,
+            np.broadcast_to(self._j_eff_i_weights, self._j_eff_i.shape),
+        )
+
+        (j_eff_i, w1_i, w1_s), self._weights = merge_distributions(
+            dist_j_eff_i, dist_w1_i, dist_w1_s
+        )
+
+        j_eff_i = j_eff_i.reshape(-1, 1, 1)
+        w1_i_dist = (w1_i.reshape(-1, 1, 1) + 1.0) * self._w1_i
+        w1_s_dist = (w1_s.reshape(-1, 1, 1) + 1.0) * self._w1_s
+
+        self._l_j_eff_i = self._matrices.get("j_eff_i", 0.0) * j_eff_i
+        self._l_w1x_i = self._matrices.get("w1x_i", 0.0) * w1_i_dist
+        self._l_w1y_i = self._matrices.get("w1y_i", 0.0) * w1_i_dist
+        self._l_w1x_s = self._matrices.get("w1x_s", 0.0) * w1_s_dist
+        self._l_w1y_s = self._matrices.get("w1y_s", 0.0) * w1_s_dist
 
     def compute_mag_eq(self, parvals, term="iz"):
-        parvals_ = dict(parvals)
+        parvals_ = self._get_parvals(parvals)
         return sum(
             self._vectors.get(name1, 0.0) * parvals_.get(name2, 0.0)
             for name1, name2 in POP_PAIRS[term]
         )
 
     def update(self, parvals):
-        self._l_free = sum(
+        """Update the free-precession part of the Liouvillian.
+
+        The values of the parameters may also be 1-D arrays of the same size G,
+        in which case a stack of G Liouvillians is built along a new leading
+        axis, and all the propagators and magnetizations calculated afterwards
+        have this extra axis (see 'collapse').
+
+        """
+        parvals = self._get_parvals(parvals)
+        sizes = {np.size(parval) for parval in parvals.values() if np.ndim(parval)}
+        self._batch = sizes.pop() if sizes else None
+        l_free = sum(
             self._matrices[name] * parval
-            for name, parval in parvals
+            for name, parval in parvals.items()
             if name in self._matrices
         )
+        self._l_free = self._prune_empty_states(l_free, parvals)
+        self._blocks = self._find_blocks()
+
+    @staticmethod
+    def _get_parvals(parvals):
+        return {
+            name: np.reshape(parval, (-1, 1, 1, 1)) if np.ndim(parval) else parval
+            for name, parval in dict(parvals).items()
+        }
+
+    def _prune_empty_states(self, l_free, parvals):
+        """Return the Liouvillian without the exchange out of the states with no
+        population and no incoming exchange, which never get any magnetization.
+        This decouples them from the other states (see '_find_blocks')."""
+
+        states = self._state_indexes
+        every = np.arange(self.size)
+        pruned = l_free
+
+        for state, index in states.items():
+            population = parvals.get(f"p{state}")
+            if np.ndim(population) or population != 0.0:
+                continue
+            others = np.setdiff1d(every, index)
+            if not pruned[(...,) + np.ix_(index, others)].any():
+                if pruned is l_free:
+                    pruned = l_free.copy()
+                pruned[(...,) + np.ix_(others, index)] = 0.0
+
+        return pruned
+
+    def _find_blocks(self):
+        """Find the groups of states that are not coupled by chemical exchange,
+        whose propagators can be calculated independently."""
+
+        states = self._state_indexes
+
+        if len(states) < 2 or self.size < BLOCK_SIZE_MIN or self._batch:
+            return None
+
+        l_free = self._l_free
+
+        names = list(states)
+        coupled = np.array(
+            [
+                [l_free[np.ix_(states[name1], states[name2])].any() for name2 in names]
+                for name1 in names
+            ]
+        )
+
+        block_nb, labels = csgraph.connected_components(coupled, directed=False)
+
+        if block_nb == 1:
+            return None
+
+        return [
+            np.concatenate(
+                [states[name] for name, label in zip(names, labels) if label == block]
+                + [self._equilibrium_index]
+            )
+            for block in range(block_nb)
+        ]
 
     def collapse(self, vector):
-        weights = (
-            self._w1_i_weights * self._w1_s_weights * self._j_eff_i_weights
-        ).reshape(-1, 1, 1)
-        vector_ = vector.reshape(-1, *vector.shape[-2:])
-        return (vector_ * weights).sum()
+        """Sum the magnetization over the quadrature points, and over any extra
+        leading axis (e.g., phase cycling). For a stack of Liouvillians (see
+        'update'), the sums are returned for each of them."""
+        size = vector.shape[-3] if vector.ndim > 2 else 1
+        if self._batch is None:
+            vector_ = vector.reshape(-1, size)
+            vector_ = np.broadcast_to(vector_, (len(vector_), self._weights.size))
+            return np.einsum("ij,j->", vector_, self._weights)
+        vector_ = vector.reshape(-1, self._batch, size)
+        vector_ = np.broadcast_to(vector_, (*vector_.shape[:2], self._weights.size))
+        return np.einsum("ijk,k->j", vector_, self._weights)
+
+    def _calculate_propagators(self, liouv, times, dephasing=False):
+        key = cache.make_key(liouv, times, dephasing)
+        propagators = self.propagator_cache.get(key)
+
+        if propagators is None:
+            propagators = calculate_propagators(liouv, times, dephasing, self._blocks)
+            self.propagator_count += propagators.size // self.size ** 2
+            self.propagator_cache.put(key, propagators)
+
+        return propagators
+
+    def _calculate_propagated(self, liouv, times, mag, dephasing=False):
+        mags = calculate_propagated(liouv, times, mag, dephasing, self._blocks)
+        self.propagator_count += mags.size // (self.size * mags.shape[-1])
+        return mags
 
     def delays(self, times):
         liouv = self._l_free + self._l_carrier_i + self._l_carrier_s + self._l_j_eff_i
-        return calculate_propagators(liouv, times)
+        return self._calculate_propagators(liouv, times)
 
     def pulse_i(self, times, phase, dephasing=False):
+        liouv = self._liouvillian_pulse_i(phase)
+        return self._calculate_propagators(liouv, times, dephasing)
+
+    def pulse_i_mag(self, mag, times, phase, dephasing=False):
+        """Same as 'pulse_i', but only calculate the magnetization obtained by
+        applying the propagators to 'mag'."""
+        liouv = self._liouvillian_pulse_i(phase)
+        return self._calculate_propagated(liouv, times, mag, dephasing)
+
+    def _liouvillian_pulse_i(self, phase):
         l_w1_i = self._l_w1x_i * np.cos(phase * np.pi * 0.5) + self._l_w1y_i * np.sin(
             phase * np.pi * 0.5
         )
 
-        liouv = (
+        return (
             self._l_free
             + self._l_carrier_i
             + self._l_carrier_s
@@ -288,10 +410,7 @@ class Liouvillian:
             + l_w1_i
         )
 
-        return calculate_propagators(liouv, times, dephasing)
-
     def pulses_90_180_i(self):
-        pulses = {}
         liouv = (
             self._l_free
             + self._l_carrier_i
@@ -300,16 +419,8 @@ class Liouvillian:
             + self._l_w1x_i
         )
         t90 = 0.5 * np.pi / self._w1_i
-        pulses["90px"] = calculate_propagators(liouv, t90)
         rot90zp, rot90zm = self._rot90zp_i, self._rot90zm_i
-        pulses["90py"] = rot90zp @ pulses["90px"] @ rot90zm
-        pulses["90mx"] = rot90zp @ pulses["90py"] @ rot90zm
-        pulses["90my"] = rot90zp @ pulses["90mx"] @ rot90zm
-        pulses["180px"] = pulses["90px"] @ pulses["90px"]
-        pulses["180py"] = pulses["90py"] @ pulses["90py"]
-        pulses["180mx"] = pulses["90mx"] @ pulses["90mx"]
-        pulses["180my"] = pulses["90my"] @ pulses["90my"]
-        return pulses
+        return self._calculate_pulses_90_180(liouv, t90, rot90zp, rot90zm, "i")
 
     def pulse_s(self, times, phase, dephasing=False):
         l_w1_s = self._l_w1x_s * np.cos(phase * np.pi * 0.5) + self._l_w1y_s * np.sin(
@@ -322,14 +433,23 @@ class Liouvillian:
             + self._l_j_eff_i
             + l_w1_s
         )
-        return calculate_propagators(liouv, times, dephasing)
+        return self._calculate_propagators(liouv, times, dephasing)
 
     def pulses_90_180_s(self):
-        pulses = {}
         liouv = self._l_free + self._l_j_eff_i + self._l_w1x_s
         t90 = 0.5 * np.pi / self._w1_s
         rot90zp, rot90zm = self._rot90zp_s, self._rot90zm_s
-        pulses["90px"] = calculate_propagators(liouv, t90)
+        return self._calculate_pulses_90_180(liouv, t90, rot90zp, rot90zm, "s")
+
+    def _calculate_pulses_90_180(self, liouv, t90, rot90zp, rot90zm, spin):
+        key = cache.make_key(f"90_180_{spin}_{self._basis_name}", liouv, t90)
+        pulses = self.propagator_cache.get(key)
+
+        if pulses is not None:
+            return pulses
+
+        pulses = {}
+        pulses["90px"] = self._calculate_propagators(liouv, t90)
         pulses["90py"] = rot90zp @ pulses["90px"] @ rot90zm
         pulses["90mx"] = rot90zp @ pulses["90py"] @ rot90zm
         pulses["90my"] = rot90zp @ pulses["90mx"] @ rot90zm
@@ -337,16 +457,26 @@ class Liouvillian:
         pulses["180py"] = pulses["90py"] @ pulses["90py"]
         pulses["180mx"] = pulses["90mx"] @ pulses["90mx"]
         pulses["180my"] = pulses["90my"] @ pulses["90my"]
-        return pulses
+        return self.propagator_cache.put(key, pulses)
 
     def pulse_is(self, times, phase_i, phase_s, dephasing=False):
+        liouv = self._liouvillian_pulse_is(phase_i, phase_s)
+        return self._calculate_propagators(liouv, times, dephasing)
+
+    def pulse_is_mag(self, mag, times, phase_i, phase_s, dephasing=False):
+        """Same as 'pulse_is', but only calculate the magnetization obtained by
+        applying the propagators to 'mag'."""
+        liouv = self._liouvillian_pulse_is(phase_i, phase_s)
+        return self._calculate_propagated(liouv, times, mag, dephasing)
+
+    def _liouvillian_pulse_is(self, phase_i, phase_s):
         l_w1_i = self._l_w1x_i * np.cos(phase_i * np.pi * 0.5) + self._l_w1y_i * np.sin(
             phase_i * np.pi * 0.5
         )
         l_w1_s = self._l_w1x_s * np.cos(phase_s * np.pi * 0.5) + self._l_w1y_s * np.sin(
             phase_s * np.pi * 0.5
         )
-        liouv = (
+        return (
             self._l_free
             + self._l_carrier_i
             + self._l_carrier_s
@@ -354,7 +484,6 @@ class Liouvillian:
             + l_w1_i
             + l_w1_s
         )
-        return calculate_propagators(liouv, times, dephasing)
 
 
 def build_4st_is_spin_system():
@@ -514,29 +643,185 @@ def add_cs_and_carrier(matrices, ppms):
     return matrices_
 
 
-def calculate_propagators(liouvillian, delays, dephasing=False):
-    """TODO: function docstring."""
+def calculate_propagators(liouvillian, delays, dephasing=False, blocks=None):
+    """Calculate the propagators of the Liouvillian(s) for each delay.
+
+    All the Liouvillians of the stack are diagonalized in a single call. If
+    provided, 'blocks' is a list of indexes of independent blocks of the
+    Liouvillian (that may share the equilibrium component), whose propagators are
+    calculated separately.
+
+    """
 
     delays_ = np.asarray(delays).reshape(-1)
     shape = liouvillian.shape
+    liouvillian_ = liouvillian.reshape(-1, *shape[-2:])
+
+    if blocks is None:
+        propagators = _calculate_propagators(liouvillian_, delays_, dephasing)
+    else:
+        propagators = np.zeros((delays_.size, *liouvillian_.shape))
+        for block in blocks:
+            mesh = np.ix_(block, block)
+            propagators[(Ellipsis, *mesh)] = _calculate_propagators(
+                liouvillian_[(Ellipsis, *mesh)], delays_, dephasing
+            )
+
+    return propagators.reshape(-1, *shape)
+
+
+def _calculate_propagators(liouvillian, delays, dephasing=False):
+    s, vr = np.linalg.eig(liouvillian)
+    vri = np.linalg.inv(vr)
+    exp_st = _calculate_exp_st(s, delays, dephasing)
+    return ((vr * exp_st) @ vri).real
+
+
+def _calculate_exp_st(s, delays, dephasing=False):
+    """Return the exponentials of the eigenvalues 's' (stacked along the first
+    axis) for each delay, broadcastable against the eigenvectors. With
+    'dephasing', the oscillating components are removed."""
+
+    exp_st = np.exp(delays.reshape(-1, 1, 1) * s)
+
+    if dephasing:
+        exp_st *= abs(s.imag) < 1e-6
+
+    return exp_st[..., np.newaxis, :]
+
+
+def get_b1_distribution(inh, res):
+    """Return the relative deviations from the nominal B1 field and the weights of
+    the Gauss-Hermite quadrature used to average over a Gaussian distribution of
+    B1 field with a relative standard deviation 'inh'."""
+
+    if inh in (0.0, np.inf) or res < 2:
+        return np.array([0.0]), np.array([1.0])
+
+    nodes, weights = hermite_e.hermegauss(res)
+
+    return nodes * inh, weights / weights.sum()
+
+
+def merge_distributions(*distributions, tol=WEIGHT_TOL):
+    """Combine distributions, given as (values, weights) pairs, into a single
+    axis of quadrature points.
 
-    propagators = []
+    The points of the tensor product of the distributions with identical values
+    are merged, and the points with the smallest weights are dropped as long as
+    their total weight stays below 'tol'. Return the values of each distribution
+    at the remaining points and their normalized weights.
 
-    for a_liouvillian in liouvillian.reshape(-1, *shape[-2:]):
-        s, vr = linalg.eig(a_liouvillian)
-        vri = linalg.inv(vr)
+    """
 
-        if dephasing:
-            sl = np.where(abs(s.imag) < 1e-6)[0]
-            vr, s, vri = vr[:, sl], s[sl], vri[sl, :]
+    values = np.meshgrid(*(values for values, _ in distributions), indexing="ij")
+    values = np.stack([value.reshape(-1) for value in values], axis=-1)
 
-        d = np.asarray([np.diag(np.exp(s * t)) for t in delays_])
+    weights = np.ones(1)
+    for _, weights_ in distributions:
+        weights = np.multiply.outer(weights, weights_).reshape(-1)
+    weights = weights / weights.sum()
 
-        propagators.append((vr @ d @ vri).real)
+    values, inverse = np.unique(values.round(12), axis=0, return_inverse=True)
+    weights = np.bincount(inverse.reshape(-1), weights=weights)
+
+    order = np.argsort(weights)
+    dropped = order[np.cumsum(weights[order]) < tol]
+    kept = np.setdiff1d(np.arange(weights.size), dropped)
+
+    values, weights = values[kept], weights[kept]
+
+    return values.T, weights / weights.sum()
+
+
+@functools.lru_cache()
+def estimate_b1_inh_res(w1, inh, time, tol=B1_INH_TOL):
+    """Estimate the number of quadrature nodes needed to average the magnetization
+    over the B1 distribution.
+
+    The magnetization nutates with an angle whose spread over the B1 distribution
+    is 'a = inh * w1 * time', and its Gaussian average scales as exp(-a^2 / 2).
+    The number of nodes is the smallest for which the quadrature error on the
+    average of cos(s * x) is below 'tol' for all the spreads 's' up to 'a' (and
+    at most 'B1_INH_RES_MAX'). Return the number of nodes and the quadrature
+    error.
+
+    """
+
+    if inh in (0.0, np.inf):
+        return 1, 0.0
+
+    spreads = np.linspace(0.0, abs(inh * w1 * time), 64)
+    exact = np.exp(-0.5 * spreads ** 2)
+
+    for res in range(1, B1_INH_RES_MAX + 1):
+        nodes, weights = hermite_e.hermegauss(res)
+        approx = np.cos(np.outer(spreads, nodes)) @ weights / weights.sum()
+        error = np.max(abs(approx - exact))
+        if error < tol:
+            break
+
+    return res, error
+
+
+def calculate_propagated(liouvillian, delays, mag, dephasing=False, blocks=None):
+    """Calculate the magnetization obtained by applying the propagators to 'mag',
+    without calculating the propagators themselves.
+
+    Only the eigendecomposition of the Liouvillian and the projection of 'mag' on
+    its eigenvectors are needed, which avoids the inversion of the eigenvector
+    matrix and the matrix products of 'calculate_propagators'. 'mag' may be a
+    stack of vectors broadcastable against the stack of Liouvillians. See
+    'calculate_propagators' for 'blocks'.
+
+    """
+
+    delays_ = np.asarray(delays).reshape(-1)
+    shape = np.broadcast(liouvillian[..., 0, 0], mag[..., 0, 0]).shape
+    liouvillian_ = np.broadcast_to(liouvillian, (*shape, *liouvillian.shape[-2:]))
+    liouvillian_ = liouvillian_.reshape(-1, *liouvillian.shape[-2:])
+    mag_ = np.broadcast_to(mag, (*shape, *mag.shape[-2:])).reshape(-1, *mag.shape[-2:])
+
+    if blocks is None:
+        mags = _calculate_propagated(liouvillian_, delays_, mag_, dephasing)
+    else:
+        mags = np.zeros((delays_.size, *mag_.shape))
+        for block in blocks:
+            mags[..., block, :] = _calculate_propagated(
+                liouvillian_[(Ellipsis, *np.ix_(block, block))],
+                delays_,
+                mag_[..., block, :],
+                dephasing,
+            )
+
+    return mags.reshape(-1, *shape, *mag.shape[-2:])
+
+
+def _calculate_propagated(liouvillian, delays, mag, dephasing=False):
+    s, vr = np.linalg.eig(liouvillian)
+    coefs = np.linalg.solve(vr, mag)
+    exp_st = _calculate_exp_st(s, delays, dephasing)
+    return ((vr * exp_st) @ coefs).real
+
+
+def get_state_indexes(vectors):
+    """Return the indexes of the basis components of each state, and the index of
+    the equilibrium component (empty if absent)."""
+
+    state_indexes = {}
+
+    for name, vector in vectors.items():
+        if name[-2:] in ("_a", "_b", "_c", "_d"):
+            index = np.nonzero(vector.reshape(-1))[0]
+            state_indexes.setdefault(name[-1], set()).update(index)
+
+    state_indexes = {
+        state: np.array(sorted(index)) for state, index in sorted(state_indexes.items())
+    }
 
-    propagators = np.asarray(propagators).swapaxes(0, 1).reshape(-1, *shape)
+    equilibrium_index = np.nonzero(vectors.get("identity", np.zeros(0)).reshape(-1))[0]
 
-    return propagators
+    return state_indexes, equilibrium_index
 
 
 def make_perfect180(vectors):
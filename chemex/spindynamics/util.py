@@ -7,6 +7,8 @@ from scipy import linalg
 
 SIGN = np.array([1.0, -1.0])
 
+Model = collections.namedtuple("Model", ["name", "state_nb", "kind"])
+
 
 def compute_propagator_standard(liouvillian, time):
     """TODO: function docstring."""
@@ -106,7 +108,6 @@ def correct_intensities(
 
 
 def parse_model(name):
-    Model = collections.namedtuple("Model", ["name", "state_nb", "kind"])
     match = re.match("(\d)st\.(\w+)", name, re.IGNORECASE)
     if match:
         state_nb = int(match.group(1))
@@ -0,0 +1,86 @@
+"""The timings module contains the code for recording the time spent in the
+different stages of a calculation."""
+import contextlib
+import cProfile
+import json
+import time
+
+from chemex import __version__
+
+
+class Timings:
+    """Timings class for recording the wall and CPU times of nested stages.
+
+    Each stage is recorded as a dictionary with its name, wall and CPU times
+    (in seconds) and the list of its (optional) sub-stages. Additional
+    information (e.g., the number of function evaluations) can be added to the
+    dictionary returned by the 'stage' context manager. When disabled, nothing
+    is recorded.
+
+    """
+
+    def __init__(self, enabled=True, cprofile=False):
+        self.enabled = enabled or cprofile
+        self.root = {"name": "chemex"}
+        self._stack = [self.root]
+        self._profiler = cProfile.Profile() if cprofile else None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Record the wall and CPU times spent in the enclosed block."""
+
+        record = {"name": name, "wall": 0.0, "cpu": 0.0}
+
+        if not self.enabled:
+            yield record
+            return
+
+        self._stack[-1].setdefault("stages", []).append(record)
+        self._stack.append(record)
+
+        wall, cpu = time.perf_counter(), time.process_time()
+
+        try:
+            yield record
+        finally:
+            record["wall"] = time.perf_counter() - wall
+            record["cpu"] = time.process_time() - cpu
+            self._stack.pop()
+
+    @contextlib.contextmanager
+    def profile(self):
+        """Run the enclosed block with the optional cProfile profiler."""
+
+        if self._profiler is None:
+            yield
+            return
+
+        self._profiler.enable()
+
+        try:
+            yield
+        finally:
+            self._profiler.disable()
+
+    def to_dict(self):
+        """Return the recorded timings as a dictionary."""
+
+        return {"version": __version__, "stages": self.root.get("stages", [])}
+
+    def write(self, path):
+        """Write the timings to 'timings.json' and the optional cProfile
+        statistics to 'timings.prof'."""
+
+        path.mkdir(parents=True, exist_ok=True)
+
+        filename = path / "timings.json"
+
+        print(f"  * {filename}")
+
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+        if self._profiler is not None:
+            filename_prof = path / "timings.prof"
+            print(f"  * {filename_prof}")
+            self._profiler.dump_stats(str(filename_prof))
@@ -0,0 +1,158 @@
+"""Estimate the positions of the major and minor dips of CEST profiles, used as
+initial values of 'cs_a' and 'dw_ab'.
+
+The profiles of each residue (possibly recorded with several B1 fields) are
+interpolated on a common grid of chemical shifts, so that all the profiles are
+smoothed at once. The dips are then picked as the most prominent peaks of the
+smoothed saturation profiles, relative to the noise of the profiles.
+
+"""
+import sys
+
+import numpy as np
+from scipy import ndimage
+from scipy import signal
+
+from chemex import datasets
+from chemex import peaks
+from chemex.experiments.cest import base_cest
+
+# Minimum prominence of a dip, in units of the noise of the profile
+NSIGMA = 3.0
+# Number of grid points per data point of the common grid of chemical shifts
+OVERSAMPLING = 4
+
+
+def guess_cest(args):
+    """Estimate 'cs_a' and 'dw_ab' from the CEST profiles and write them to a
+    parameter file."""
+
+    data = datasets.read_data(args.experiments)
+
+    if not all(isinstance(profile, base_cest.ProfileCEST) for profile in data):
+        sys.exit(
+            "\nError: The command 'chemex guess' only works with CEST experiments.\n"
+        )
+
+    names, grid, depths, noises = get_depths(data)
+    guesses = find_dips(grid, depths, noises)
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    filename = args.out_dir / "guess.cfg"
+
+    print_guesses(names, guesses)
+    write_guesses(names, guesses, filename)
+
+    print(f"\nFile(s):\n  * {filename}")
+
+
+def get_depths(data):
+    """Return the residue names, the common grid of chemical shifts, and the
+    saturation profiles (1 - I/I0) on the grid and their noise, averaged over
+    the profiles of each residue."""
+
+    curves = {}
+
+    for profile in data:
+        name = profile.peak.names["i"]
+        curves.setdefault(name, []).append(get_curve(profile))
+
+    ppms = [curve[0] for residue in curves.values() for curve in residue]
+    spacing = min(np.median(np.diff(np.sort(ppm))) for ppm in ppms if ppm.size > 1)
+    ppms = np.concatenate(ppms)
+    step = spacing / OVERSAMPLING
+    grid = np.arange(ppms.min(), ppms.max() + step, step)
+
+    names = sorted(curves, key=peaks.Peak)
+    depths = np.zeros((len(names), grid.size))
+    noises = np.zeros(len(names))
+
+    for index, name in enumerate(names):
+        for ppm, depth, noise in curves[name]:
+            order = np.argsort(ppm)
+            depths[index] += np.interp(grid, ppm[order], depth[order])
+            noises[index] += noise ** 2
+        depths[index] /= len(curves[name])
+        noises[index] = np.sqrt(noises[index]) / len(curves[name])
+
+    # All the profiles are smoothed at once, over about one data point spacing
+    depths = ndimage.gaussian_filter1d(depths, OVERSAMPLING / 2.0, axis=1)
+
+    return names, grid, depths, noises
+
+
+def get_curve(profile):
+    """Return the chemical shifts, the saturation and its noise for a CEST
+    profile, normalized by the reference intensity."""
+
+    ref = profile.reference
+    points = ~ref & profile.mask
+    intensities = profile.data["intensity"]
+
+    if ref.any():
+        intensity_ref = np.mean(intensities[ref])
+    else:
+        intensity_ref = np.max(intensities[points])
+
+    ppm = profile.offsets_to_ppm()[points]
+    depth = 1.0 - intensities[points] / intensity_ref
+    noise = np.median(profile.data["error"][points]) / abs(intensity_ref)
+
+    return ppm, depth, noise
+
+
+def find_dips(grid, depths, noises, nsigma=NSIGMA):
+    """Return the positions of the major dip and of the most prominent minor
+    dip (None if not detected) of each saturation profile."""
+
+    guesses = []
+
+    for depth, noise in zip(depths, noises):
+        positions, properties = signal.find_peaks(depth, prominence=nsigma * noise)
+
+        if not positions.size:
+            guesses.append((grid[np.argmax(depth)], None))
+            continue
+
+        major = positions[np.argmax(depth[positions])]
+        others = positions != major
+
+        if others.any():
+            prominences = properties["prominences"][others]
+            minor = positions[others][np.argmax(prominences)]
+            guesses.append((grid[major], grid[minor]))
+        else:
+            guesses.append((grid[major], None))
+
+    return guesses
+
+
+def print_guesses(names, guesses):
+    print("\n{:<10s} {:>10s} {:>10s}".format("Residue", "cs_a", "dw_ab"))
+    print("{:<10s} {:>10s} {:>10s}".format("-------", "----", "-----"))
+
+    for name, (cs_a, cs_b) in zip(names, guesses):
+        dw_ab = "-" if cs_b is None else f"{cs_b - cs_a:.3f}"
+        print(f"{name.upper():<10s} {cs_a:>10.3f} {dw_ab:>10s}")
+
+    nminor = sum(cs_b is not None for _, cs_b in guesses)
+    print(f"\nMinor dips detected: {nminor}/{len(guesses)}")
+
+
+def write_guesses(names, guesses, filename):
+    """Write the estimates in the format of the parameter files. 'dw_ab' is
+    only written for the profiles with a minor dip."""
+
+    lines = ["[cs_a]"]
+    lines.extend(
+        f"{name.upper():<10s} = {cs_a:8.3f}" for name, (cs_a, _) in zip(names, guesses)
+    )
+    lines.extend(["", "[dw_ab]"])
+    lines.extend(
+        f"{name.upper():<10s} = {cs_b - cs_a:8.3f}"
+        for name, (cs_a, cs_b) in zip(names, guesses)
+        if cs_b is not None
+    )
+
+    with filename.open("w") as file_:
+        file_.write("\n".join(lines) + "\n")
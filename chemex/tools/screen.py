@@ -0,0 +1,210 @@
+"""Screen the profiles for measurable exchange before a fit.
+
+- CPMG: the R2eff values are calculated from the intensities normalized by the
+  reference intensity, and tested against a flat dispersion profile (chi-square
+  test, the significance being the matching number of standard deviations).
+  The exchange contribution (Rex) is the difference between the R2eff values at
+  the lowest and highest CPMG frequencies.
+- CEST: the minor dip is searched for as in 'chemex guess', the significance
+  being its depth (prominence) relative to the noise.
+
+The profiles sharing the same number and values of CPMG frequencies are
+calculated at once. The names of the included and excluded profiles are
+written to files that can be passed to the other commands (e.g.,
+'chemex fit ... @Output/include.txt').
+
+"""
+import sys
+
+import numpy as np
+from scipy import signal
+from scipy import stats
+
+from chemex import datasets
+from chemex import peaks
+from chemex.experiments.cest import base_cest
+from chemex.experiments.cpmg import base_cpmg
+from chemex.tools import guess_cest
+
+
+def screen(args):
+    """Classify the profiles as exchanging or flat and write the residue
+    filters."""
+
+    data = datasets.read_data(args.experiments)
+
+    scores = {}
+
+    profiles_cpmg = [
+        profile for profile in data if isinstance(profile, base_cpmg.ProfileCPMG1)
+    ]
+    profiles_cest = [
+        profile for profile in data if isinstance(profile, base_cest.ProfileCEST)
+    ]
+
+    if len(profiles_cpmg) + len(profiles_cest) < len(data.datasets):
+        sys.exit(
+            "\nError: The command 'chemex screen' only works with CPMG and CEST "
+            "experiments.\n"
+        )
+
+    for name, score in screen_cpmg(profiles_cpmg, args.nsigma):
+        add_score(scores, name, score)
+
+    for name, score in screen_cest(profiles_cest, args.nsigma):
+        add_score(scores, name, score)
+
+    names = sorted(scores, key=peaks.Peak)
+    included = [name for name in names if scores[name]["exchange"]]
+    excluded = [name for name in names if not scores[name]["exchange"]]
+
+    print_scores(names, scores)
+
+    print(f"\nProfiles with exchange: {len(included)}/{len(names)}")
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+
+    print("\nFile(s):")
+
+    write_filter(included, "+r", args.out_dir / "include.txt")
+    write_filter(excluded, "-r", args.out_dir / "exclude.txt")
+
+
+def screen_cpmg(profiles, nsigma=guess_cest.NSIGMA):
+    """Yield the name and the exchange statistics of the CPMG profiles."""
+
+    groups = {}
+
+    for profile in profiles:
+        ncycs = tuple(profile.data["ncycs"])
+        key = (ncycs, profile.time_t2)
+        groups.setdefault(key, []).append(profile)
+
+    for (ncycs, time_t2), group in groups.items():
+        ncycs = np.array(ncycs)
+        reference = ncycs == 0
+        intensities = np.array([profile.data["intensity"] for profile in group])
+        errors = np.array([profile.data["error"] for profile in group])
+
+        if reference.any():
+            intensity_ref = intensities[:, reference].mean(axis=1, keepdims=True)
+        else:
+            intensity_ref = intensities.max(axis=1, keepdims=True)
+        intensities = intensities[:, ~reference] / intensity_ref
+        errors = errors[:, ~reference] / abs(intensity_ref)
+        ncycs = ncycs[~reference]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r2s = -np.log(intensities) / time_t2
+            r2_errors = errors / (abs(intensities) * time_t2)
+
+        weights = np.where(np.isfinite(r2s), r2_errors ** -2, 0.0)
+        r2s = np.where(weights > 0.0, r2s, 0.0)
+
+        # Chi-square of a flat profile (weighted mean of the R2eff values)
+        r2_mean = (weights * r2s).sum(axis=1, keepdims=True) / weights.sum(
+            axis=1, keepdims=True
+        )
+        chisqrs = (weights * (r2s - r2_mean) ** 2).sum(axis=1)
+        dofs = (weights > 0.0).sum(axis=1) - 1
+
+        # Rex: weighted R2eff at the lowest minus at the highest CPMG frequency
+        low = ncycs == ncycs.min()
+        high = ncycs == ncycs.max()
+        r2_low = (weights * r2s)[:, low].sum(axis=1) / weights[:, low].sum(axis=1)
+        r2_high = (weights * r2s)[:, high].sum(axis=1) / weights[:, high].sum(axis=1)
+        rexs = r2_low - r2_high
+
+        pvalues = np.where(dofs > 0, stats.chi2.sf(chisqrs, np.maximum(dofs, 1)), 1.0)
+        zscores = stats.norm.isf(np.maximum(pvalues, np.finfo(float).tiny))
+
+        for profile, zscore, rex in zip(group, zscores, rexs):
+            yield profile.name, {
+                "type": "cpmg",
+                "amplitude": rex,
+                "significance": zscore,
+                "exchange": zscore >= nsigma and rex > 0.0,
+            }
+
+
+def screen_cest(profiles, nsigma=guess_cest.NSIGMA):
+    """Yield the name and the exchange statistics of the CEST profiles, from the
+    depth of the minor dip."""
+
+    if not profiles:
+        return
+
+    names, grid, depths, noises = guess_cest.get_depths(profiles)
+    guesses = guess_cest.find_dips(grid, depths, noises, nsigma)
+
+    # The profiles are grouped by residue in 'get_depths'
+    profile_names = {}
+    for profile in profiles:
+        profile_names.setdefault(profile.peak.names["i"], set()).add(profile.name)
+
+    for name, (_, cs_b), depth, noise in zip(names, guesses, depths, noises):
+        # Depth of the minor dip relative to the surrounding baseline
+        if cs_b is None:
+            amplitude = 0.0
+        else:
+            index = np.argmin(abs(grid - cs_b))
+            amplitude = signal.peak_prominences(depth, [index])[0][0]
+        for profile_name in sorted(profile_names[name]):
+            yield profile_name, {
+                "type": "cest",
+                "amplitude": amplitude,
+                "significance": amplitude / noise,
+                "exchange": cs_b is not None,
+            }
+
+
+def add_score(scores, name, score):
+    """Keep the most significant score of the profiles of the same name (e.g.,
+    recorded at several fields)."""
+
+    def key(score):
+        return score["exchange"], score["significance"]
+
+    if name not in scores or key(score) > key(scores[name]):
+        scores[name] = score
+
+
+def print_scores(names, scores):
+    print(
+        "\n{:<15s} {:>6s} {:>12s} {:>12s} {:>10s}".format(
+            "Profile", "Type", "Amplitude", "Significance", "Exchange"
+        )
+    )
+    print(
+        "{:<15s} {:>6s} {:>12s} {:>12s} {:>10s}".format(
+            "-------", "----", "---------", "------------", "--------"
+        )
+    )
+
+    for name in names:
+        score = scores[name]
+        exchange = "yes" if score["exchange"] else "no"
+        print(
+            f"{name.upper():<15s} {score['type']:>6s} {score['amplitude']:>12.3e} "
+            f"{score['significance']:>12.3e} {exchange:>10s}"
+        )
+
+
+def write_filter(names, option, filename):
+    """Write the residue filter as command-line arguments, one per line.
+
+    An empty filter would select all the profiles: no file is written (and the
+    file of a previous run is removed) when there is no profile to select.
+
+    """
+
+    if not names:
+        if filename.exists():
+            filename.unlink()
+        print(f"  * {filename} (not written: no profile to select)")
+        return
+
+    with filename.open("w") as file_:
+        file_.write("\n".join([option] + [name.upper() for name in names]) + "\n")
+
+    print(f"  * {filename}")
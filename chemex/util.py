@@ -2,13 +2,24 @@
 import configparser
 import sys
 
+import numpy as np
+
 
 def read_cfg_file(filename):
-    """Read and parse the experiment configuration file with configparser."""
+    """Read and parse the experiment configuration file with configparser.
+
+    'filename' can also be a dictionary of sections (e.g., {"global": {"pb":
+    0.1}}), read as if it were the content of a file.
+
+    """
 
     config = configparser.ConfigParser(inline_comment_prefixes=("#", ";"))
     config.optionxform = str
 
+    if isinstance(filename, dict):
+        config.read_dict(filename)
+        return config
+
     try:
         out = config.read(str(filename))
 
@@ -27,6 +38,24 @@ def read_cfg_file(filename):
     return config
 
 
+def to_structured(values, dtype):
+    """Convert the data of a profile to a structured array: 'values' is either a
+    structured array or an array with one column per field of 'dtype'."""
+
+    values = np.asarray(values)
+
+    if values.dtype.names:
+        return values.astype(dtype)
+
+    values = np.atleast_2d(values)
+    data = np.zeros(len(values), dtype=dtype)
+
+    for index, (name, _) in enumerate(dtype):
+        data[name] = values[:, index]
+
+    return data
+
+
 def normalize_path(working_dir, filename):
     """Normalize the path of a filename relative to a specific directory."""
 
@@ -0,0 +1,9 @@
+#!/bin/sh
+
+chemex fit -e Experiments/cest_n15*.cfg \
+           -p Parameters/params_n15_brute.cfg \
+           -m Methods/method_n15_multistart.cfg \
+           -d 2st.pb_kex \
+           +r 50N-HN \
+           --workers 4 \
+           -o Output/multistart
@@ -25,10 +25,10 @@ setup(
     packages=find_packages(exclude=["tests"]),
     setup_requires=["setuptools_scm"],
     install_requires=[
-        "numpy>=1.0",
+        "numpy>=1.17",
         "scipy>=1.0",
         "matplotlib>=2.0",
-        "lmfit>=0.9.11",
+        "lmfit>=1.0",
         "asteval>=0.9.11",
     ],
     python_requires=">=3.6",
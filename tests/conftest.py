@@ -0,0 +1,52 @@
+"""Shared fixtures: small datasets read from the examples."""
+import pathlib
+
+import pytest
+
+from chemex import api
+from chemex import cache
+from chemex.spindynamics import basis
+
+EXAMPLES = pathlib.Path(__file__).resolve().parents[1] / "examples"
+
+
+def read_example(path, model, names, configs=()):
+    """Read the profiles 'names' of an example and create their parameters."""
+
+    path = EXAMPLES / path
+    data = api.read_data(sorted((path / "Experiments").glob("*.cfg")), model)
+    data.filter(names)
+    params = api.create_params(data, [path / config for config in configs])
+
+    return data, params
+
+
+@pytest.fixture
+def cpmg():
+    """N15 CPMG data of two residues recorded at two fields."""
+    return read_example(
+        "CPMG/N15_CW",
+        "2st.pb_kex",
+        ["08N-HN", "09N-HN"],
+        ["Parameters/params_n15.cfg"],
+    )
+
+
+@pytest.fixture
+def cest():
+    """N15 CEST data of two residues recorded with two B1 fields."""
+    return read_example(
+        "CEST/N15_InPhase",
+        "2st.pb_kex",
+        ["13N-HN", "68N-HN"],
+        ["Parameters/params_n15.cfg"],
+    )
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    """Start each test with empty caches, so that the results are calculated
+    and not read from a previous test."""
+
+    cache.profiles.clear()
+    basis.Liouvillian.propagator_cache.clear()
@@ -0,0 +1,100 @@
+"""Tests of the Python API: errors raised instead of exiting, and results
+returned in memory."""
+import copy
+
+import numpy as np
+import pytest
+
+from chemex import api
+
+
+def test_read_missing_file(tmp_path):
+    with pytest.raises(api.ChemexError, match="does not exist"):
+        api.read_data([tmp_path / "missing.cfg"])
+
+
+def test_create_data_errors():
+    with pytest.raises(api.ChemexError, match="No data to fit"):
+        api.create_data([])
+
+    with pytest.raises(api.ChemexError, match="'type'"):
+        api.create_data([({"experiment": {}}, {})])
+
+
+def test_create_params_missing_file(cpmg, tmp_path):
+    data, _ = cpmg
+
+    with pytest.raises(api.ChemexError, match="does not exist"):
+        api.create_params(data, [tmp_path / "missing.cfg"])
+
+
+def test_fit_errors(cpmg, tmp_path):
+    data, params = cpmg
+
+    with pytest.raises(api.ChemexError, match="The fitting method 'nope'"):
+        api.fit(data, params, fitmethod="nope")
+
+    with pytest.raises(api.ChemexError, match="does not exist"):
+        api.fit(data, params, method=tmp_path / "missing.cfg")
+
+    data.filter([])
+
+    with pytest.raises(api.ChemexError, match="No data to fit"):
+        api.fit(data, params)
+
+
+def test_fit(cpmg, capsys):
+    data, params = cpmg
+    params_copy = copy.deepcopy(params)
+
+    result = api.fit(data, params, {"step 1": {"dw_ab": "fit"}})
+
+    # Silenced, and the parameters are not modified
+    assert capsys.readouterr().out == ""
+    assert all(
+        param.value == params_copy[name].value or np.isnan(param.value)
+        for name, param in params.items()
+        if not param.expr
+    )
+
+    calculated = api.calculate(data, result.params)
+
+    assert calculated.chisqr == pytest.approx(result.chisqr)
+    assert set(result.profiles) == {
+        (profile.experiment_name, profile.name) for profile in data
+    }
+    for values in result.profiles.values():
+        assert np.all(np.isfinite(values["intensity_calc"]))
+
+
+def test_create_data_from_arrays(cpmg):
+    """A dataset created from arrays gives the profiles read from the files."""
+
+    data, params = cpmg
+    profile = next(
+        profile for profile in data if profile.experiment_name == "cpmg_n15_500"
+    )
+    config = {
+        "experiment": {"name": "cpmg_n15_500", "type": "cpmg.x_ip"},
+        "experimental_parameters": {
+            "h_larmor_frq": 500.0,
+            "time_t2": 30.0e-3,
+            "temperature": 25.0,
+            "carrier": 118.559,
+            "pw90": 40.6625e-6,
+            "time_equil": 2.0e-3,
+        },
+    }
+    columns = [profile.data[name] for name in ("ncycs", "intensity", "error")]
+    data_arrays = api.create_data([(config, {profile.name: np.transpose(columns)})])
+    params_arrays = api.create_params(data_arrays)
+
+    for name in params_arrays:
+        if name in params and not params[name].expr:
+            params_arrays[name].value = params[name].value
+    params_arrays.update_constraints()
+
+    np.testing.assert_allclose(
+        data_arrays.datasets[0].calculate_profile(params_arrays),
+        profile.calculate_profile(params),
+    )
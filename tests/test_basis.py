@@ -0,0 +1,158 @@
+"""Tests of the calculation of the propagators."""
+import numpy as np
+import pytest
+
+from chemex.spindynamics import basis
+
+DELAYS = np.array([0.0, 1e-3, 1e-2, 5e-2])
+
+
+def make_liouvillian(pc=0.1, kac=0.0, kca=0.0):
+    """Return a 3-state Liouvillian, large enough for its exchange blocks to be
+    calculated separately, and its equilibrium magnetization. The state C
+    exchanges with A through 'kac' and 'kca' only."""
+
+    liouv = basis.Liouvillian("ixyzsxyz", 3, {"i": "n", "s": "h"}, 500.0)
+    assert liouv.size >= basis.BLOCK_SIZE_MIN
+
+    parvals = {"pa": 0.85 - pc, "pb": 0.15, "pc": pc, "kab": 15.0, "kba": 85.0}
+    parvals.update({"kac": kac, "kca": kca, "kbc": 0.0, "kcb": 0.0})
+
+    for index, state in enumerate("abc"):
+        parvals.update(
+            {
+                f"r1_i_{state}": 1.5,
+                f"r2_i_{state}": 10.0 + 5.0 * index,
+                f"r1_s_{state}": 1.0,
+                f"r2_s_{state}": 8.0,
+                f"cs_i_{state}": 120.0 + 2.0 * index,
+                f"cs_s_{state}": 8.0 + 0.2 * index,
+                f"j_{state}": -93.0,
+            }
+        )
+
+    liouv.update(parvals)
+
+    return liouv, liouv.compute_mag_eq(parvals, term="iz")
+
+
+def calculate_without_blocks(liouv, delays):
+    liouv._blocks = None
+    liouv.propagator_cache.clear()
+    return liouv.delays(delays)
+
+
+def test_uncoupled_states_are_split():
+    liouv, _ = make_liouvillian()
+
+    assert len(liouv._blocks) == 2
+
+    propagators = liouv.delays(DELAYS)
+    expected = calculate_without_blocks(liouv, DELAYS)
+
+    np.testing.assert_allclose(propagators, expected, rtol=1e-8, atol=1e-12)
+
+
+def test_coupled_states_are_not_split():
+    liouv, _ = make_liouvillian(kac=2.0, kca=14.0)
+
+    assert liouv._blocks is None
+
+
+def test_empty_state_is_split():
+    """A state with no population and no incoming exchange is decoupled, which
+    does not change the magnetization."""
+
+    liouv, mag = make_liouvillian(pc=0.0, kca=10.0)
+
+    assert len(liouv._blocks) == 2
+
+    mags = liouv.delays(DELAYS) @ mag
+    expected = calculate_without_blocks(liouv, DELAYS) @ mag
+
+    np.testing.assert_allclose(mags, expected, rtol=1e-8, atol=1e-12)
+
+
+def test_empty_state_is_pruned_below_block_size():
+    """The exchange out of an empty state is removed whatever the size of the
+    Liouvillian, only the splitting into blocks depending on the size."""
+
+    liouv = basis.Liouvillian("ixyz", 3, {"i": "n"}, 500.0)
+    assert liouv.size < basis.BLOCK_SIZE_MIN
+
+    parvals = {"pa": 0.85, "pb": 0.15, "pc": 0.0, "kab": 15.0, "kba": 85.0}
+    parvals.update({"kca": 10.0, "r2_i_a": 10.0, "r2_i_c": 20.0, "cs_i_c": 2.0})
+    liouv.update(parvals)
+
+    index = liouv._state_indexes["c"]
+    others = np.setdiff1d(np.arange(liouv.size), index)
+
+    assert liouv._blocks is None
+    assert not liouv._l_free[np.ix_(others, index)].any()
+    assert liouv._l_free[np.ix_(index, index)].any()
+
+
+@pytest.mark.parametrize("dephasing", [False, True])
+def test_blocks_of_random_matrix(dephasing):
+    """Two blocks sharing the equilibrium component (the last one)."""
+
+    generator = np.random.default_rng(0)
+    size = 9
+    blocks = [np.array([0, 1, 2, 3, 8]), np.array([4, 5, 6, 7, 8])]
+
+    liouvillian = np.zeros((size, size))
+    for block in blocks:
+        liouvillian[np.ix_(block[:-1], block)] = generator.normal(size=(4, 5))
+    mag = generator.normal(size=(size, 1))
+    mag[-1] = 1.0
+
+    propagators = basis.calculate_propagators(liouvillian, DELAYS, dephasing, blocks)
+    expected = basis.calculate_propagators(liouvillian, DELAYS, dephasing)
+
+    np.testing.assert_allclose(propagators, expected, rtol=1e-8, atol=1e-12)
+
+    mags = basis.calculate_propagated(liouvillian, DELAYS, mag, dephasing, blocks)
+
+    np.testing.assert_allclose(mags, expected @ mag, rtol=1e-8, atol=1e-12)
+
+
+@pytest.mark.parametrize("res", [2, 5, 11])
+def test_b1_distribution_moments(res):
+    """The Gauss-Hermite quadrature integrates exactly the moments of the
+    Gaussian distribution up to the order 2 * res - 1."""
+
+    inh = 0.1
+    values, weights = basis.get_b1_distribution(inh, res)
+
+    assert weights.sum() == pytest.approx(1.0)
+    assert weights.dot(values) == pytest.approx(0.0, abs=1e-15)
+    assert weights.dot(values ** 2) == pytest.approx(inh ** 2)
+    if res > 2:
+        assert weights.dot(values ** 4) == pytest.approx(3.0 * inh ** 4)
+
+
+@pytest.mark.parametrize("inh", [0.0, np.inf])
+def test_b1_estimate_without_distribution(inh):
+    assert basis.estimate_b1_inh_res(2.0 * np.pi * 25.0, inh, 0.5) == (1, 0.0)
+
+
+@pytest.mark.parametrize("b1_frq, time", [(13.0, 0.5), (26.0, 0.5), (50.0, 0.1)])
+def test_b1_estimate_accuracy(b1_frq, time):
+    """The estimated number of nodes is the smallest giving the average of the
+    nutation over the B1 distribution within the tolerance."""
+
+    w1, inh = 2.0 * np.pi * b1_frq, 0.1
+    res, error = basis.estimate_b1_inh_res(w1, inh, time)
+
+    assert error < basis.B1_INH_TOL
+
+    spreads = np.linspace(0.0, inh * w1 * time, 200)
+    exact = np.exp(-0.5 * spreads ** 2)
+
+    def get_error(res):
+        values, weights = basis.get_b1_distribution(inh, res)
+        approx = np.cos(np.outer(spreads, values / inh)) @ weights
+        return np.max(abs(approx - exact))
+
+    assert get_error(res) < 2.0 * basis.B1_INH_TOL
+    assert get_error(res - 1) > basis.B1_INH_TOL
@@ -0,0 +1,86 @@
+"""Tests of the calculation of batches of parameter sets: stacked Liouvillians
+and grid search in chunks."""
+import copy
+
+import numpy as np
+import pytest
+
+from chemex import api
+from chemex import brute
+from chemex import cache
+from chemex import parameters
+from chemex.spindynamics import basis
+
+POINTS = [(0.02, 200.0), (0.05, 400.0), (0.1, 1000.0)]
+
+
+def make_params(data, params, pb, kex_ab):
+    params = copy.deepcopy(params)
+    api.update_params(data, params, [{"global": {"pb": pb, "kex_ab": kex_ab}}])
+    params.update_constraints()
+    return params
+
+
+@pytest.mark.parametrize("example", ["cpmg", "cest"])
+def test_batch_matches_loop(example, request):
+    """The residuals calculated with a stack of Liouvillians are those
+    calculated one parameter set at a time."""
+
+    data, params = request.getfixturevalue(example)
+    params_list = [make_params(data, params, pb, kex_ab) for pb, kex_ab in POINTS]
+
+    residuals = data.calculate_residuals_batch(params_list)
+
+    cache.profiles.clear()
+    basis.Liouvillian.propagator_cache.clear()
+
+    expected = [
+        data.calculate_residuals(params_, verbose=False) for params_ in params_list
+    ]
+
+    assert residuals.shape == np.shape(expected)
+    np.testing.assert_allclose(residuals, expected, rtol=1e-8, atol=1e-8)
+
+
+def test_batch_of_one(cpmg):
+    data, params = cpmg
+    params = make_params(data, params, *POINTS[1])
+
+    residuals = data.calculate_residuals_batch([params])
+    expected = data.calculate_residuals(params, verbose=False)
+
+    np.testing.assert_allclose(residuals[0], expected, rtol=1e-8, atol=1e-8)
+
+
+def test_brute_chunks(cpmg):
+    """The grid search gives the same result whatever the size of the
+    chunks."""
+
+    data, params = cpmg
+    configs = [
+        {"global": {"pb": "0.05 [0.02, 0.1, 0.02]", "kex_ab": "400 [100, 1000, 200]"}}
+    ]
+    params = api.update_params(data, params, configs)
+    for param in params.values():
+        param.vary = False
+    parameters.set_param_status(params, [("pb", "fit"), ("kex_ab", "fit")])
+
+    results = [
+        brute.run_brute(data, params, chunk_size=chunk_size)
+        for chunk_size in (3, brute.CHUNK_SIZE)
+    ]
+
+    assert results[0].nfev == results[1].nfev == 20
+    assert results[0].chisqr == pytest.approx(results[1].chisqr, rel=1e-10)
+    np.testing.assert_allclose(results[0].brute_x0, results[1].brute_x0)
+
+    for minima0, minima1 in zip(
+        results[0].brute_minima.values(), results[1].brute_minima.values()
+    ):
+        np.testing.assert_allclose(minima0, minima1, rtol=1e-10)
+
+    # The best grid point is the one with the smallest chi-square on the grid
+    assert results[0].chisqr == pytest.approx(results[0].candidates[0].score)
+    assert results[0].chisqr == pytest.approx(
+        min(minima.min() for minima in results[0].brute_minima.values())
+    )
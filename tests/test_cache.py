@@ -0,0 +1,124 @@
+"""Tests of the memory-bounded caches of the propagators and profiles."""
+import numpy as np
+import pytest
+
+from chemex import cache
+from chemex.spindynamics import basis
+
+
+def make_array(value, size=100):
+    return np.full(size, float(value))
+
+
+def test_eviction_order():
+    """The least recently used entries are evicted first."""
+
+    nbytes = make_array(0).nbytes + 16
+    a_cache = cache.Cache(3 * nbytes)
+
+    keys = [cache.make_key(str(index)) for index in range(4)]
+
+    for key in keys[:3]:
+        a_cache.put(key, make_array(0))
+
+    assert a_cache.get(keys[0]) is not None
+
+    a_cache.put(keys[3], make_array(3))
+
+    assert len(a_cache) == 3
+    assert keys[1] not in a_cache
+    assert all(key in a_cache for key in (keys[0], keys[2], keys[3]))
+    assert a_cache.nbytes == 3 * nbytes
+
+    a_cache.resize(nbytes)
+
+    assert list(a_cache._entries) == [keys[3]]
+    assert a_cache.nbytes == nbytes
+
+
+def test_put_and_get():
+    a_cache = cache.Cache(2 ** 20)
+    key = cache.make_key("key")
+    value = make_array(1)
+
+    assert a_cache.get(key) is None
+    assert a_cache.put(key, value) is value
+    assert a_cache.get(key) is value
+    assert a_cache.stats == {
+        "hits": 1,
+        "misses": 1,
+        "entries": 1,
+        "nbytes": value.nbytes + len(key),
+    }
+
+    # The values are shared, hence read-only
+    with pytest.raises(ValueError):
+        value[0] = 0.0
+
+
+def test_value_larger_than_budget():
+    a_cache = cache.Cache(100)
+    value = make_array(1)
+
+    a_cache.put(cache.make_key("key"), value)
+
+    assert len(a_cache) == 0
+    assert a_cache.nbytes == 0
+    assert value.flags.writeable
+
+
+def test_dictionary_values():
+    a_cache = cache.Cache(2 ** 20)
+    value = {"a": make_array(1), "b": make_array(2, 50)}
+
+    a_cache.put(cache.make_key("key"), value)
+
+    assert a_cache.nbytes == 150 * 8 + 16
+    assert not any(array.flags.writeable for array in value.values())
+
+
+def test_make_key():
+    array = np.arange(6.0)
+
+    assert cache.make_key(array, 1.0, "a") == cache.make_key(array.copy(), 1.0, "a")
+    assert cache.make_key(array) != cache.make_key(array.reshape(2, 3))
+    assert cache.make_key(array) != cache.make_key(array.astype(np.float32))
+    assert cache.make_key(array, "a") != cache.make_key(array, "b")
+    assert cache.make_key(array) != cache.make_key(array + 1e-12)
+
+
+def test_propagators_shared():
+    """The propagators are indexed by the content of the Liouvillian, and
+    shared by all the Liouvillians."""
+
+    liouvs = [basis.Liouvillian("ixyz", 2, {"i": "n"}, 500.0) for _ in range(2)]
+    parvals = {"pa": 0.9, "pb": 0.1, "kab": 10.0, "kba": 90.0, "r2_i_a": 10.0}
+
+    for liouv in liouvs:
+        liouv.update(parvals)
+
+    propagators = liouvs[0].delays([0.01, 0.02])
+
+    assert liouvs[1].delays([0.01, 0.02]) is propagators
+    assert liouvs[0].propagator_count == 2
+    assert liouvs[1].propagator_count == 0
+
+    liouvs[1].update({**parvals, "r2_i_a": 20.0})
+
+    assert liouvs[1].delays([0.01, 0.02]) is not propagators
+    assert liouvs[1].propagator_count == 2
+
+
+def test_profiles_cache(cpmg):
+    """A profile calculated again with the same parameters is read from the
+    cache."""
+
+    data, params = cpmg
+    params.update_constraints()
+    profile = data.datasets[0]
+
+    values = profile.calculate_unscaled_values(params)
+
+    assert profile.calculate_unscaled_values(params) is values
+    assert profile.cost["calls"] == 2
+    assert profile.cost["hits"] == 1
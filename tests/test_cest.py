@@ -0,0 +1,79 @@
+"""Tests of the averaging of the CEST profiles over the B1 inhomogeneity."""
+import pathlib
+
+import numpy as np
+
+from chemex import api
+
+EXAMPLE = pathlib.Path(__file__).resolve().parents[1] / "examples/CEST/N15_InPhase"
+
+
+def read_cest(tmp_path, b1_inh=None, b1_inh_res=None):
+    """Read a profile of the N15 CEST example with the given B1 inhomogeneity
+    options."""
+
+    filename = EXAMPLE / "Experiments/cest_n15_500ms_26Hz.cfg"
+    lines = filename.read_text().splitlines()
+
+    # The options of the example are commented out
+    lines = [line for line in lines if not line.startswith(";b1_inh")]
+    index = lines.index("[experimental_parameters]") + 1
+    if b1_inh is not None:
+        lines.insert(index, f"b1_inh = {b1_inh}")
+    if b1_inh_res is not None:
+        lines.insert(index, f"b1_inh_res = {b1_inh_res}")
+
+    # The paths of the data are relative to the experiment file
+    lines = [
+        line.replace("../Data", str(EXAMPLE / "Data"))
+        if line.startswith("path")
+        else line
+        for line in lines
+    ]
+
+    filename = tmp_path / filename.name
+    filename.write_text("\n".join(lines))
+
+    data = api.read_data([filename], "2st.pb_kex")
+    data.filter(["13N-HN"])
+    params = api.create_params(data, [EXAMPLE / "Parameters/params_n15.cfg"])
+    params.update_constraints()
+
+    return data.datasets[0], params
+
+
+def test_b1_inh_estimate(tmp_path):
+    """With the estimated number of points, the profile matches the one
+    calculated with many more points."""
+
+    profile, params = read_cest(tmp_path, b1_inh=0.1)
+    reference, _ = read_cest(tmp_path, b1_inh=0.1, b1_inh_res=64)
+
+    assert 1 < profile.liouv.w1_i_inh_res < 64
+    assert profile.b1_inh_error < 1e-4
+    assert not profile.dephasing
+
+    values = profile.calculate_unscaled_values(params)
+    expected = reference.calculate_unscaled_values(params)
+
+    np.testing.assert_allclose(values, expected, atol=1e-4 * abs(expected).max())
+
+
+def test_b1_inh_res_explicit(tmp_path):
+    """An explicit number of points is used as is, without dephasing."""
+
+    profile, _ = read_cest(tmp_path, b1_inh=0.1, b1_inh_res=5)
+
+    assert profile.liouv.w1_i_inh_res == 5
+    assert profile.b1_inh_error is None
+    assert not profile.dephasing
+
+
+def test_b1_inh_default(tmp_path):
+    """Without 'b1_inh', the B1 field is homogeneous and the magnetization
+    dephases."""
+
+    profile, _ = read_cest(tmp_path)
+
+    assert profile.liouv.w1_i_inh_res == 1
+    assert profile.dephasing
@@ -0,0 +1,195 @@
+"""Tests of the checkpoints of the fits: resuming and time budget."""
+import copy
+import itertools
+import json
+import time
+
+import pytest
+
+from chemex import chemex
+from chemex import checkpoint as cp
+from chemex import fitting
+
+METHOD = {
+    "step 1": {"pb": "fix", "kex_ab": "fix", "dw_ab": "fit"},
+    "step 2": {"pb": "fit", "kex_ab": "fit"},
+}
+METHOD_BRUTE = {
+    "step 1": {
+        "fitmethod": "brute",
+        "pb": "fit",
+        "kex_ab": "fit",
+        "dw_ab": "fix",
+        "r2_a": "fix",
+    }
+}
+
+
+def run_fit(data, params, checkpoint=None, method=METHOD):
+    params = copy.deepcopy(params)
+    return fitting.run_fit(method, params, data, "leastsq", checkpoint=checkpoint)
+
+
+def get_values(params):
+    return {name: param.value for name, param in params.items()}
+
+
+def test_resume_finished(cpmg, tmp_path, capsys):
+    """Resuming a run with all the sections finished restores the parameters
+    without fitting."""
+
+    data, params = cpmg
+    result = run_fit(data, params, cp.Checkpoint(tmp_path))
+
+    state = json.loads((tmp_path / cp.FILENAME).read_text())
+    assert list(state["sections"]) == ["1: step 1", "2: step 2"]
+    assert not state["clusters"]
+
+    capsys.readouterr()
+    result_resumed = run_fit(data, params, cp.Checkpoint(tmp_path, resume=True))
+
+    assert capsys.readouterr().out.count("Restored from the checkpoint") == 2
+    assert get_values(result_resumed.params) == pytest.approx(get_values(result.params))
+    assert result_resumed.chisqr == pytest.approx(result.chisqr)
+
+    for name, param in result.params.items():
+        assert result_resumed.params[name].stderr == param.stderr
+
+
+def test_resume_expired(cpmg, tmp_path):
+    """A run stopped by the time budget is resumed where it stopped, and gives
+    the result of an uninterrupted run."""
+
+    data, params = cpmg
+
+    checkpoint = cp.Checkpoint(tmp_path, deadline=time.monotonic() - 1.0)
+    run_fit(data, params, checkpoint)
+
+    assert checkpoint.stopped
+    assert not checkpoint.state["sections"]
+
+    checkpoint = cp.Checkpoint(tmp_path, resume=True)
+    result_resumed = run_fit(data, params, checkpoint)
+    result = run_fit(data, params)
+
+    assert not checkpoint.stopped
+    assert len(checkpoint.state["sections"]) == 2
+    assert result_resumed.chisqr == pytest.approx(result.chisqr, rel=1e-6)
+    assert get_values(result_resumed.params) == pytest.approx(
+        get_values(result.params), rel=1e-4
+    )
+
+
+class CheckpointStopped(cp.Checkpoint):
+    """Checkpoint whose time budget is used up once a cluster is fitted."""
+
+    def set_cluster(self, section, cluster, params):
+        super().set_cluster(section, cluster, params)
+        self.deadline = time.monotonic() - 1.0
+
+
+def test_resume_clusters(cpmg, tmp_path, capsys):
+    """The clusters fitted before a run stopped are restored, and the others
+    are fitted."""
+
+    data, params = cpmg
+
+    checkpoint = CheckpointStopped(tmp_path)
+    run_fit(data, params, checkpoint)
+
+    assert checkpoint.stopped
+    assert not checkpoint.state["sections"]
+    assert len(checkpoint.state["clusters"]["1: step 1"]) == 1
+
+    capsys.readouterr()
+    checkpoint = cp.Checkpoint(tmp_path, resume=True)
+    result_resumed = run_fit(data, params, checkpoint)
+    result = run_fit(data, params)
+
+    assert capsys.readouterr().out.count("Restored from the checkpoint") == 1
+    assert len(checkpoint.state["sections"]) == 2
+    assert result_resumed.chisqr == pytest.approx(result.chisqr, rel=1e-6)
+
+
+def set_grid(params):
+    """Set the bounds of the grid search of 'METHOD_BRUTE' (20 x 20 points)."""
+
+    for name, param in params.items():
+        if "_pb_" in name:
+            param.set(min=0.01, max=0.1)
+        elif "_kex_ab_" in name:
+            param.set(min=50.0, max=500.0)
+
+
+def test_resume_brute(cpmg, tmp_path, capsys):
+    """A grid search restored from the checkpoint has no surface to plot, and
+    the plot is skipped."""
+
+    data, params = cpmg
+    set_grid(params)
+    result = run_fit(data, params, cp.Checkpoint(tmp_path), METHOD_BRUTE)
+
+    assert hasattr(result, "brute_axes")
+
+    result_resumed = run_fit(
+        data, params, cp.Checkpoint(tmp_path, resume=True), METHOD_BRUTE
+    )
+
+    assert result_resumed.chisqr == pytest.approx(result.chisqr)
+
+    capsys.readouterr()
+    chemex.plot_results(result_resumed, data, tmp_path)
+
+    assert "No grid search to plot" in capsys.readouterr().out
+    assert not (tmp_path / "results_brute.pdf").exists()
+
+
+def test_expired_brute(cpmg, tmp_path, monkeypatch):
+    """A grid search stopped by the time budget keeps its surface."""
+
+    data, params = cpmg
+    set_grid(params)
+
+    # The budget is used up once the first chunk of the grid is evaluated
+    calls = itertools.count()
+    monkeypatch.setattr(cp, "is_expired", lambda deadline=None: next(calls) >= 2)
+
+    checkpoint = cp.Checkpoint(tmp_path, deadline=0.0)
+    result = run_fit(data, params, checkpoint, METHOD_BRUTE)
+
+    assert checkpoint.stopped
+    assert 0 < result.nfev < result.brute_axes[0].size * result.brute_axes[1].size
+    assert result.chisqr == pytest.approx(
+        fitting.make_result(data, result.params, "brute").chisqr
+    )
+
+
+def test_seed(tmp_path):
+    checkpoint = cp.Checkpoint(tmp_path)
+    seed = checkpoint.get_seed()
+
+    assert isinstance(seed, int)
+    assert cp.Checkpoint(tmp_path, resume=True).get_seed(resume=True) == seed
+    assert cp.Checkpoint(tmp_path, resume=True).get_seed(seed, resume=True) == seed
+
+    with pytest.raises(SystemExit):
+        cp.Checkpoint(tmp_path, resume=True).get_seed(seed + 1, resume=True)
+
+    # Without resuming, the seed is replaced
+    assert cp.Checkpoint(tmp_path).get_seed(seed + 1) == seed + 1
+
+
+def test_dump_load_params(cpmg):
+    _, params = cpmg
+    params.update_constraints()
+    params_copy = copy.deepcopy(params)
+
+    for param in params.values():
+        if not param.expr:
+            param.value *= 2.0
+            param.stderr = 0.1
+
+    cp.load_params(params_copy, json.loads(json.dumps(cp.dump_params(params))))
+
+    assert get_values(params_copy) == pytest.approx(get_values(params), nan_ok=True)
+    assert all(param.stderr == 0.1 for param in params_copy.values() if not param.expr)
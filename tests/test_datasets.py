@@ -0,0 +1,82 @@
+"""Tests of the bootstrap replicates of the datasets."""
+import numpy as np
+
+from chemex import datasets
+
+
+def get_indexes(data, replicate):
+    """Return the indexes of the points of the profiles of 'data' drawn in the
+    profiles of 'replicate', identified by their intensities."""
+
+    indexes = []
+
+    for profile, profile_bs in zip(data, replicate):
+        intensities = list(profile.data["intensity"])
+        assert len(set(intensities)) == len(intensities)
+        indexes.append(
+            np.array(
+                [intensities.index(value) for value in profile_bs.data["intensity"]]
+            )
+        )
+
+    return indexes
+
+
+def test_bs_pools(cpmg):
+    """The reference and other points of each profile are resampled
+    separately, and the replicates have the size of the profiles."""
+
+    data, _ = cpmg
+
+    for replicate in data.iter_bs_datasets(5, seed=0):
+        assert len(replicate) == len(data)
+        for profile, profile_bs, indexes in zip(
+            data, replicate, get_indexes(data, replicate)
+        ):
+            assert len(profile_bs) == len(profile)
+            assert np.all(np.diff(indexes) >= 0)
+            np.testing.assert_array_equal(profile_bs.data, profile.data[indexes])
+            np.testing.assert_array_equal(profile_bs.mask, profile.mask[indexes])
+            assert profile.reference[indexes].sum() == profile.reference.sum()
+
+
+def test_bs_uniform(cpmg):
+    """Each point is drawn once per replicate on average."""
+
+    data, _ = cpmg
+    nreplicates = 400
+
+    counts = [np.zeros(len(profile)) for profile in data]
+
+    for replicate in data.iter_bs_datasets(nreplicates, seed=1):
+        for count, indexes in zip(counts, get_indexes(data, replicate)):
+            np.add.at(count, indexes, 1)
+
+    for count in counts:
+        np.testing.assert_allclose(count / nreplicates, 1.0, atol=0.25)
+
+
+def test_bs_seed(cpmg):
+    """The replicates only depend on the seed and their index, whatever the
+    number of replicates and the size of the batches."""
+
+    data, _ = cpmg
+    nreplicates = datasets.REPLICATE_BATCH + 3
+
+    def get_all_indexes(replicates):
+        return [
+            np.concatenate(get_indexes(data, replicate)) for replicate in replicates
+        ]
+
+    indexes = get_all_indexes(data.iter_bs_datasets(nreplicates, seed=2))
+    indexes_head = get_all_indexes(data.iter_bs_datasets(3, seed=2))
+    indexes_other = get_all_indexes(data.iter_bs_datasets(3, seed=3))
+
+    np.testing.assert_array_equal(indexes[:3], indexes_head)
+    assert not np.array_equal(indexes[:3], indexes_other)
+    assert len({tuple(a_indexes) for a_indexes in indexes}) == nreplicates
+
+    replicate = data.make_bs_dataset(seed=2)
+    np.testing.assert_array_equal(
+        np.concatenate(get_indexes(data, replicate)), indexes[0]
+    )
@@ -0,0 +1,84 @@
+"""Tests of the decomposition of the fits into clusters, and of the fitting
+engines."""
+import copy
+
+import lmfit
+import pytest
+
+from chemex import alternating
+from chemex import brute
+from chemex import fitting
+from chemex import parameters
+from chemex.experiments.base import plotting
+
+GLOBAL_ONLY = {"pb": "fit", "kex_ab": "fit", "dw_ab": "fix", "r2_a": "fix"}
+
+
+def find_names(params, section):
+    regex = parameters.ParamName.from_section(section).to_re()
+    return [name for name in params if regex.match(name)]
+
+
+def test_clusters_without_varying_parameters(cpmg):
+    """The profiles depending on no varying parameter are gathered in a last
+    cluster."""
+
+    data, params = cpmg
+    parameters.set_param_status(
+        params,
+        [
+            ("pb", "fix"),
+            ("kex_ab", "fix"),
+            ("dw_ab, NUC->08N", "fix"),
+            ("r2_a, NUC->08N", "fix"),
+        ],
+    )
+
+    clusters = fitting.find_independent_clusters(data, params)
+    names = [str(name) for name, _, _ in clusters]
+
+    assert len(names) == 2
+    assert "NUC->9N" in names[0]
+    assert names[1] == ""
+    assert sum(len(c_data) for _, c_data, _ in clusters) == len(data)
+    assert not any(param.vary for param in clusters[-1][2].values())
+
+
+def test_alternating_global_only(cpmg):
+    """With only global parameters varying, the local fits are empty and the
+    'alternating' method gives the result of 'leastsq'."""
+
+    data, params = cpmg
+    parameters.set_param_status(params, GLOBAL_ONLY.items())
+
+    result_alternating = alternating.run_alternating(data, copy.deepcopy(params))
+
+    minimizer = lmfit.Minimizer(data.calculate_residuals, params)
+    result = minimizer.minimize(method="leastsq")
+
+    assert result_alternating.chisqr == pytest.approx(result.chisqr, rel=1e-6)
+
+    for name in find_names(params, "pb") + find_names(params, "kex_ab"):
+        param = result.params[name]
+        param_alternating = result_alternating.params[name]
+        assert param_alternating.value == pytest.approx(param.value, rel=1e-3)
+        assert param_alternating.stderr == pytest.approx(param.stderr, rel=1e-2)
+
+
+def test_brute_without_finite_point(cpmg, tmp_path, capsys):
+    """A grid search with no grid point evaluated is not plotted."""
+
+    data, params = cpmg
+    parameters.set_param_status(params, GLOBAL_ONLY.items())
+    for name in find_names(params, "pb") + find_names(params, "kex_ab"):
+        params[name].set(min=0.5 * params[name].value, max=2.0 * params[name].value)
+
+    result = brute.run_brute(data, params, maxfev=0)
+
+    assert result.nfev == 0
+
+    output = tmp_path / "results_brute.pdf"
+    plotting.plot_results_brute(result, output=output)
+
+    assert "not plotted" in capsys.readouterr().out
+    assert not output.exists()
@@ -0,0 +1,37 @@
+"""Tests of the scans of the chi-square."""
+import copy
+
+import numpy as np
+import pytest
+
+from chemex import parameters
+from chemex import scanning
+
+STATUS = [
+    ("pb", "fix"),
+    ("kex_ab", "fix"),
+    ("r2_a, NUC->08N", "fix"),
+]
+
+
+def test_scan_cluster_without_free_parameter(cpmg):
+    """Fixing the scanned parameter leaves a cluster with no free parameter,
+    which is calculated and not fitted."""
+
+    data, params = cpmg
+    parameters.set_param_status(params, STATUS)
+
+    scans = [("dw_ab, NUC->08N", 0.0, 4.0, 5)]
+    axes, chisqrs, best = scanning.run_scan(data, params, scans)
+
+    assert chisqrs.shape == (5,)
+    assert np.all(np.isfinite(chisqrs))
+
+    # The chi-square at the best point is the one of the refitted parameters
+    names, _ = scanning.get_scans(params, scans)
+    params_best = copy.deepcopy(params)
+    scanning.set_point(params_best, names, (axes[0][np.argmin(chisqrs)],))
+    chisqr, _ = scanning.refit(data, params_best)
+
+    assert chisqr == pytest.approx(chisqrs.min())
+    assert best[names[0][0]].value == pytest.approx(axes[0][np.argmin(chisqrs)])
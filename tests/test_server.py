@@ -0,0 +1,43 @@
+"""Tests of the answers of the server to malformed requests."""
+import asyncio
+import json
+
+import pytest
+
+from chemex import server
+
+
+class Writer:
+    """Stream collecting the messages sent by the server."""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(json.loads(line))
+
+    async def drain(self):
+        pass
+
+
+@pytest.mark.parametrize("request_", [[1], "x", 1, None])
+def test_request_not_an_object(request_):
+    writer = Writer()
+    a_server = server.Server()
+
+    asyncio.run(a_server.answer(request_, writer))
+
+    assert writer.lines == [
+        {"event": "error", "message": "The request must be a JSON object"}
+    ]
+
+
+def test_unknown_command():
+    writer = Writer()
+    a_server = server.Server()
+
+    asyncio.run(a_server.answer({"id": 3, "command": "nope"}, writer))
+
+    assert writer.lines == [
+        {"id": 3, "event": "error", "message": "Unknown command 'nope'"}
+    ]